@@ -13,14 +13,13 @@ import pyzabbix.api as zapi
 import re
 import json
 from urllib.parse import quote
-# from pyzabbix.sender import ZabbixSender
-import subprocess as sp
+from pyzabbix.sender import ZabbixMetric
+from zabbixSender import TrapperSender
 import logging
 import logging.config
 import traceback
 import yaml
 from i18n import _
-import locale
 
 #
 # Make you configuration here, but don't forget to backup the file first
@@ -90,8 +89,6 @@ dConfig = yaml.load("""
 
 
 # CONST
-ZABBIX_ENCODING = 'utf-8'
-ZABBIX_SENDER = '/usr/bin/zabbix_sender'
 ZBX_SENDER_TIMEOUT = 120
 
 
@@ -201,7 +198,7 @@ class InventoryHost:
 
 
 class BufferedSender:
-    """Bufferized interface to 'zabbix_sender' program to make a list of items and send all the data at once
+    """Buffered interface to Zabbix trapper to make a list of items and send all the data at once
     """
     def __init__(self, s_zbx_svr_name='127.0.0.1', i_zbx_port=10051):
         """s_zbx_svr_name = Zabbix server name or IP
@@ -209,46 +206,28 @@ class BufferedSender:
         """
         self.s_zbx_srv = s_zbx_svr_name
         self.i_zbx_port = i_zbx_port
-        self.s_sender_prog = ZABBIX_SENDER
-        self.ls_sendlist = []
+        self.o_sender = TrapperSender(s_zbx_svr_name, i_zbx_port, iTimeout=ZBX_SENDER_TIMEOUT)
+        self.lo_sendlist = []
         return
 
     def add_item_value(self, o_item, s_value):
-        """Add an line to senf buffer. Parameters: o_item: Zabbix item object
+        """Add a value to send buffer. Parameters: o_item: Zabbix item object
         (zabbixItem from zabbixInterface.py), s_value is a value as string or integer
         """
-        s_tmpl = '"{0}"\t{1}\t"{2}"'
-        if str(s_value) != '':
-            # Escape of quotes and backslash in the s_value
-            if ('\\' in s_value):
-                s_value = s_value.replace('\\', r'\\')
-            if ('"' in s_value):
-                s_value = s_value.replace('"', r'\"')
-            if o_item:
-                s_ln = s_tmpl.format(o_item.host.name, o_item.key, str(s_value))
-                self.ls_sendlist.append(s_ln)
-            # oLog.debug('*DBG* Stored line: {}'.format(s_ln))
+        if str(s_value) != '' and o_item:
+            self.lo_sendlist.append(ZabbixMetric(o_item.host.name, o_item.key, s_value))
         return
 
     def send_values(self):
-        l_args = [ZABBIX_SENDER, '-z', self.s_zbx_srv, '-p', str(self.i_zbx_port), '-i', '-']
-        o_proc = sp.Popen(l_args, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE, universal_newlines=False)
-        s_data = '\n'.join(self.ls_sendlist)
-        b_data = s_data.encode(ZABBIX_ENCODING)
-        # oLog.debug('*DBG* Data to send:')
-        # oLog.debug('*CONT*' + s_data)
-        with open('/tmp/zbx_send.bin', 'wb') as f_out:
-            f_out.write(b_data)
         try:
-            locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
-            (b_stdout, b_stderr) = o_proc.communicate(b_data, timeout=ZBX_SENDER_TIMEOUT)
-        except sp.TimeoutExpired as e:
-            o_proc.kill()
-            oLog.error('Error calling zabbix_sender, Timeout expired')
-        if o_proc.returncode != 0:
-            oLog.error('*ERR* Non-zero return code from subprocess\n' +
-                       '*        stdout is ' +  b_stdout.decode(ZABBIX_ENCODING) + '\n' +
-                       '*        stderr is ' + b_stderr.decode(ZABBIX_ENCODING))
+            o_resp = self.o_sender.send(self.lo_sendlist)
+            if o_resp.failed:
+                oLog.error('*ERR* Zabbix server did not accept some values: {}'.format(o_resp))
+            else:
+                oLog.debug('Values sent to Zabbix: {}'.format(o_resp))
+        except OSError as e:
+            oLog.error('Error sending data to Zabbix server {}: {}'.format(self.s_zbx_srv, e))
+        self.lo_sendlist = []
         return
 
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registration of access information of devices and of Zabbix by the discovery programs
+(discovery-info.py, servers_discovery.py), which Zabbix runs for every LLD rule of every host.
+The information is the same in almost all the runs, so it is written to Redis only when its
+digest is changed; otherwise only TTLs are refreshed, once per 1/REFRESH_SHARE of the TTL.
+Digests and refresh times are kept in a compact hash '<prefix>Registry': {device: 'digest time'},
+the Zabbix access information shared by all the devices has its own field named after its key.
+The write rate follows changes of the configuration instead of the LLD polling frequency
+"""
+
+try:
+    # the C module of CPython: hashlib loads OpenSSL at import, it takes a few ms
+    from _blake2 import blake2b
+except ImportError:
+    from hashlib import blake2b
+import time
+
+REGISTRY_KEY = "Registry"
+REFRESH_SHARE = 4           # TTLs are refreshed after 1/4 of the TTL
+D_JSON_ESCAPES = {'"': '\\"', '\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+
+
+def _sJSONString(sValue):
+    lsRet = []
+    for sChar in sValue:
+        if sChar in D_JSON_ESCAPES:
+            lsRet.append(D_JSON_ESCAPES[sChar])
+        elif ' ' <= sChar <= '~':
+            lsRet.append(sChar)
+        else:
+            iCode = ord(sChar)
+            if iCode > 0xFFFF:
+                # a surrogate pair
+                iCode -= 0x10000
+                lsRet.append('\\u{:04x}\\u{:04x}'.format(0xD800 | (iCode >> 10), 0xDC00 | (iCode & 0x3FF)))
+            else:
+                lsRet.append('\\u{:04x}'.format(iCode))
+    return '"' + ''.join(lsRet) + '"'
+
+
+def _sJSON(oData):
+    """json.dumps(oData, sort_keys=True) of access information (dictionaries and lists of strings,
+    numbers, booleans and None) without the json module: it imports re, too slow for the discovery programs"""
+    if isinstance(oData, dict):
+        return '{' + ', '.join('{}: {}'.format(_sJSONString(k), _sJSON(v)) for k, v in sorted(oData.items())) + '}'
+    if isinstance(oData, (list, tuple)):
+        return '[' + ', '.join(_sJSON(o) for o in oData) + ']'
+    if isinstance(oData, str):
+        return _sJSONString(oData)
+    if oData is None:
+        return 'null'
+    if isinstance(oData, bool):
+        return 'true' if oData else 'false'
+    if isinstance(oData, (int, float)):
+        return repr(oData)
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(oData).__name__))
+
+
+def _sDigest(*lsParts):
+    return blake2b('\n'.join(lsParts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class AccessRegistry:
+    """
+    Access information of devices in hash sAccessHash {device: JSON} and of Zabbix in key sZabbixKey,
+    both with TTL iTTL.  oRedis: redis-py or redisLite connection
+    """
+    def __init__(self, oRedis, sPrefix, sAccessHash, sZabbixKey, iTTL):
+        self.oRedis = oRedis
+        self.sRegistry = sPrefix + REGISTRY_KEY
+        self.sAccessHash = sAccessHash
+        self.sZabbixKey = sZabbixKey
+        self.iTTL = iTTL
+        return
+
+    def _lRegister(self, sName, sAccess, sZabbix, ltReads=()):
+        """
+        register access information (JSON strings) of device sName.  ltReads: (command, arguments...)
+        of reads made in the same round trip, returns their results
+        """
+        sDigest = _sDigest(sAccess, str(self.iTTL))
+        sZabbixDigest = _sDigest(sZabbix, str(self.iTTL))
+        oPipe = self.oRedis.pipeline(transaction=False)
+        oPipe.hget(self.sRegistry, sName)
+        oPipe.hget(self.sRegistry, self.sZabbixKey)
+        # the data can disappear without the registry (manual cleanup)
+        oPipe.hexists(self.sAccessHash, sName)
+        oPipe.exists(self.sZabbixKey)
+        for tRead in ltReads:
+            getattr(oPipe, tRead[0])(*tRead[1:])
+        lResults = oPipe.execute()
+        bEntry, bZabbixEntry, bAccessExists, iZabbixExists = lResults[:4]
+        fNow = time.time()
+        bAccessWrite, bAccessRefresh = self._tCheck(bEntry, sDigest, bAccessExists, fNow)
+        bZabbixWrite, bZabbixRefresh = self._tCheck(bZabbixEntry, sZabbixDigest, iZabbixExists, fNow)
+        if bAccessWrite or bAccessRefresh or bZabbixWrite or bZabbixRefresh:
+            oPipe = self.oRedis.pipeline(transaction=True)
+            if bAccessWrite:
+                oPipe.hset(self.sAccessHash, sName, sAccess)
+            if bAccessWrite or bAccessRefresh:
+                oPipe.expire(self.sAccessHash, self.iTTL)
+                oPipe.hset(self.sRegistry, sName, '{} {}'.format(sDigest, int(fNow)))
+            if bZabbixWrite:
+                # the last device registering Zabbix access information wins
+                oPipe.set(self.sZabbixKey, sZabbix, ex=self.iTTL)
+            elif bZabbixRefresh:
+                oPipe.expire(self.sZabbixKey, self.iTTL)
+            if bZabbixWrite or bZabbixRefresh:
+                oPipe.hset(self.sRegistry, self.sZabbixKey, '{} {}'.format(sZabbixDigest, int(fNow)))
+            oPipe.expire(self.sRegistry, self.iTTL)
+            oPipe.execute()
+        return lResults[4:]
+
+    def _tCheck(self, bEntry, sDigest, bExists, fNow):
+        """compares a registry entry 'digest time' with sDigest, returns (data must be written,
+        only TTL must be refreshed)"""
+        sStoredDigest, fStoredTime = '', 0.0
+        if bEntry:
+            sStoredDigest, _, sTime = bEntry.decode('utf-8').partition(' ')
+            fStoredTime = float(sTime or 0)
+        bWrite = sStoredDigest != sDigest or not bExists
+        return (bWrite, not bWrite and fNow - fStoredTime >= self.iTTL / REFRESH_SHARE)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
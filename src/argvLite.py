@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal command line parser for short-lived programs started by Zabbix for every LLD rule
+of every host (discovery-info.py, servers_discovery.py): importing argparse (with re, enum,
+shutil, gettext) takes a third of the whole run of such a program.  ArgvParser takes the same
+declarations as argparse.ArgumentParser: options with a value (type, default, choices, required),
+set_defaults() and one level of sub-commands.  On -h/--help and on any error the arguments are
+parsed again by argparse built from the same declarations, for its messages and exit codes
+"""
+
+import sys
+
+
+class ArgvError(Exception):
+    pass
+
+
+class Namespace:
+    """parsed arguments as attributes, like argparse.Namespace"""
+    def __repr__(self):
+        return 'Namespace({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in sorted(vars(self).items())))
+
+
+class SubParsers:
+    """sub-commands of ArgvParser: sub-command name -> (parser, add_parser() arguments)"""
+    def __init__(self, dKwargs):
+        self.dKwargs = dKwargs
+        self.dParsers = {}
+        return
+
+    def add_parser(self, sName, **dKwargs):
+        oParser = ArgvParser(**dKwargs)
+        self.dParsers[sName] = (oParser, dKwargs)
+        return oParser
+
+
+def _sDest(lsNames, dKwargs):
+    """attribute name of an option, like argparse: the first long name without dashes"""
+    if 'dest' in dKwargs:
+        return dKwargs['dest']
+    lsLong = [s for s in lsNames if s.startswith('--')]
+    return (lsLong or lsNames)[0].lstrip('-').replace('-', '_')
+
+
+class ArgvParser:
+    """subset of argparse.ArgumentParser, see the module docstring"""
+    def __init__(self, **dKwargs):
+        self.dKwargs = dKwargs
+        self.ltArguments = []       # (option names, add_argument() keyword arguments)
+        self.dDefaults = {}
+        self.oSubParsers = None
+        return
+
+    def add_argument(self, *lsNames, **dKwargs):
+        self.ltArguments.append((lsNames, dKwargs))
+        return
+
+    def set_defaults(self, **dKwargs):
+        self.dDefaults.update(dKwargs)
+        return
+
+    def add_subparsers(self, **dKwargs):
+        self.oSubParsers = SubParsers(dKwargs)
+        return self.oSubParsers
+
+    def parse_args(self, lsArgs=None):
+        if lsArgs is None:
+            lsArgs = sys.argv[1:]
+        try:
+            return self._oParse(lsArgs, Namespace())
+        except ArgvError:
+            # argparse prints the usage or the error and exits
+            return self._oArgparse().parse_args(lsArgs)
+
+    def _oParse(self, lsArgs, oArgs):
+        dOptions = {}
+        ssRequired = set()
+        for lsNames, dKwargs in self.ltArguments:
+            if set(dKwargs) - {'help', 'type', 'default', 'choices', 'required', 'dest'}:
+                raise ArgvError('Unsupported option parameters of {}'.format(lsNames))
+            sDest = _sDest(lsNames, dKwargs)
+            for sName in lsNames:
+                dOptions[sName] = (sDest, dKwargs)
+            setattr(oArgs, sDest, dKwargs.get('default'))
+            if dKwargs.get('required'):
+                ssRequired.add(sDest)
+        for sName, oValue in self.dDefaults.items():
+            setattr(oArgs, sName, oValue)
+        if self.oSubParsers is not None and self.oSubParsers.dKwargs.get('dest'):
+            setattr(oArgs, self.oSubParsers.dKwargs['dest'], None)
+        iArg = 0
+        while iArg < len(lsArgs):
+            sArg = lsArgs[iArg]
+            iArg += 1
+            if self.oSubParsers is not None and sArg in self.oSubParsers.dParsers:
+                if ssRequired:
+                    raise ArgvError('Required options are missing')
+                if self.oSubParsers.dKwargs.get('dest'):
+                    setattr(oArgs, self.oSubParsers.dKwargs['dest'], sArg)
+                return self.oSubParsers.dParsers[sArg][0]._oParse(lsArgs[iArg:], oArgs)
+            if sArg.startswith('--'):
+                sName, sEq, sValue = sArg.partition('=')
+                bValue = bool(sEq)
+            elif sArg.startswith('-') and len(sArg) > 1:
+                sName, sValue = sArg[:2], sArg[2:]
+                bValue = bool(sValue)
+            else:
+                raise ArgvError('Unexpected argument {}'.format(sArg))
+            if sName not in dOptions or sName in ('-h', '--help'):
+                raise ArgvError('Unknown option {}'.format(sName))
+            if not bValue:
+                if iArg >= len(lsArgs):
+                    raise ArgvError('No value of {}'.format(sName))
+                sValue = lsArgs[iArg]
+                iArg += 1
+            sDest, dKwargs = dOptions[sName]
+            try:
+                oValue = dKwargs.get('type', str)(sValue)
+            except ValueError:
+                raise ArgvError('Invalid value of {}'.format(sName))
+            if 'choices' in dKwargs and oValue not in dKwargs['choices']:
+                raise ArgvError('Invalid choice of {}'.format(sName))
+            setattr(oArgs, sDest, oValue)
+            ssRequired.discard(sDest)
+        if ssRequired:
+            raise ArgvError('Required options are missing')
+        return oArgs
+
+    def _oArgparse(self):
+        import argparse
+        oParser = argparse.ArgumentParser(**self.dKwargs)
+        self._Declare(oParser)
+        return oParser
+
+    def _Declare(self, oParser):
+        """repeat the declarations on argparse parser oParser"""
+        if self.oSubParsers is not None:
+            oSubParsers = oParser.add_subparsers(**self.oSubParsers.dKwargs)
+            for sName, (oSubParser, dKwargs) in self.oSubParsers.dParsers.items():
+                oSubParser._Declare(oSubParsers.add_parser(sName, **dKwargs))
+        for lsNames, dKwargs in self.ltArguments:
+            oParser.add_argument(*lsNames, **dKwargs)
+        if self.dDefaults:
+            oParser.set_defaults(**self.dDefaults)
+        return
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
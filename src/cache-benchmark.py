@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the command cache (commandCache) on a synthetic HP EVA with 1000 disks: outputs of
+the SSSU commands HP_EVA_Class runs ('ls disk full xml', 'ls diskshelf full xml', per-shelf XML
+etc.) are stored and looked up by CachedCommandRunner without compression and with every
+algorithm available here.  Reported: size of the values in Redis (STRLEN; used_memory of a real
+Redis too), median time of storing and of looking up all the outputs (one pipeline each).
+Runs against a local stand-in Redis server or a real one (-r)
+"""
+
+import argparse as ap
+import random
+import statistics
+import time
+import commandCache as cc
+from redis_utils import _oConnect2Redis, _oPipeline
+from local import CACHE_COMPRESS_MIN
+from standInRedis import _sStartServer
+
+DEVICE_PREFIX = 'bench-eva-'
+SLOTS_PER_SHELF = 24
+
+
+def _sHex(oRandom, iGroups):
+    return '-'.join('{:04x}'.format(oRandom.getrandbits(16)) for i in range(iGroups))
+
+
+def _lsDiskXML(oRandom, iDisk, sShelf, iBay):
+    """'ls disk full xml' lines of one disk"""
+    sName = 'Disk {:04d}'.format(iDisk)
+    return [
+        '<object>',
+        '<objecttype>disk</objecttype>',
+        '<objectname>\\Disk Groups\\Default Disk Group\\{}</objectname>'.format(sName),
+        '<objectid>{}</objectid>'.format(_sHex(oRandom, 5).replace('-', '')),
+        '<objectwwn>{}</objectwwn>'.format(_sHex(oRandom, 4)),
+        '<objecthexuid>{}</objecthexuid>'.format(_sHex(oRandom, 8)),
+        '<objectparenthexuid>6005-08b4-0010-4f2b-0000-7000-0025-0000</objectparenthexuid>',
+        '<uid>{}</uid>'.format(_sHex(oRandom, 8)),
+        '<diskname>{}</diskname>'.format(sName),
+        '<diskgroupname>\\Disk Groups\\Default Disk Group</diskgroupname>',
+        '<operationalstate>good</operationalstate>',
+        '<operationalstatedetail>initialized_ok</operationalstatedetail>',
+        '<migrationstate>none</migrationstate>',
+        '<shelfnumber>{}</shelfnumber>'.format(sShelf.split()[-1]),
+        '<diskbaynumber>{}</diskbaynumber>'.format(iBay),
+        '<formattedcapacity>{}</formattedcapacity>'.format(oRandom.choice([585937500, 1171875000])),
+        '<occupancy>{}</occupancy>'.format(oRandom.randint(100000, 500000)),
+        '<firmwareversion>HPD{}</firmwareversion>'.format(oRandom.randint(1, 9)),
+        '<manufacturer>HP</manufacturer>',
+        '<modelnumber>{}</modelnumber>'.format(oRandom.choice(['BF300DA47B', 'BF6008A4B7', 'AG300DA47B'])),
+        '<serialnumber>{}</serialnumber>'.format(''.join(oRandom.choice('0123456789ABCDEFGHJKLMNPQRSTUVWXYZ')
+                                                         for i in range(12))),
+        '<disktype>online</disktype>',
+        '<diskdrivetype>fc</diskdrivetype>',
+        '<actualusage>Ungrouped</actualusage>',
+        '<requestedusage>Member</requestedusage>',
+        '<loopa><nodewwid>{}</nodewwid><portnumber>{}</portnumber><state>online</state></loopa>'.format(
+            _sHex(oRandom, 4), iBay),
+        '<loopb><nodewwid>{}</nodewwid><portnumber>{}</portnumber><state>online</state></loopb>'.format(
+            _sHex(oRandom, 4), iBay),
+        '<predictivefailure>no</predictivefailure>',
+        '<comments></comments>',
+        '</object>']
+
+
+def _lsShelfXML(oRandom, sShelf, lsDiskUIDs):
+    """'ls diskshelf xml' lines of one disk shelf"""
+    lsRet = ['<object>',
+             '<objecttype>diskshelf</objecttype>',
+             '<objectname>\\Hardware\\Rack 1\\{}</objectname>'.format(sShelf),
+             '<diskshelfname>{}</diskshelfname>'.format(sShelf),
+             '<serialnumber>{}</serialnumber>'.format(_sHex(oRandom, 3).replace('-', '').upper()),
+             '<productid>HSV300-S</productid>',
+             '<productnum>AG638B</productnum>',
+             '<operationalstate>good</operationalstate>',
+             '<powersupplies>']
+    for i in (1, 2):
+        lsRet.append('<powersupply><name>Power Supply {}</name><state>good</state>'
+                     '<outputvoltage>12.1</outputvoltage></powersupply>'.format(i))
+    lsRet.append('</powersupplies>')
+    lsRet.append('<diskslots>')
+    for iBay in range(1, SLOTS_PER_SHELF + 1):
+        sUID = lsDiskUIDs[iBay - 1] if iBay <= len(lsDiskUIDs) else '0000-0000-0000-0000-0000-0000-0000-0000'
+        lsRet.append('<diskslot><name>Disk Bay {}</name><state>{}</state><diskstatus>normal</diskstatus>'
+                     '<diskwwn>{}</diskwwn></diskslot>'.format(
+                         iBay, 'installed' if sUID[0] != '0' else 'not_installed', sUID))
+    lsRet += ['</diskslots>', '</object>']
+    return lsRet
+
+
+def _dEvaOutputs(iDisks, iSeed=1):
+    """{SSSU command: output} of a synthetic EVA, lines joined by '\\n' like HP_EVA_Class caches them"""
+    oRandom = random.Random(iSeed)
+    iShelves = (iDisks + SLOTS_PER_SHELF - 1) // SLOTS_PER_SHELF
+    lsShelves = ['Disk Enclosure {}'.format(i) for i in range(1, iShelves + 1)]
+    lsHeader = ['Current storage system: bench-eva']
+    lsNames, lsDisksXML, ddUIDs = [], [], {}
+    for iDisk in range(1, iDisks + 1):
+        sShelf = lsShelves[(iDisk - 1) // SLOTS_PER_SHELF]
+        lsDisk = _lsDiskXML(oRandom, iDisk, sShelf, (iDisk - 1) % SLOTS_PER_SHELF + 1)
+        lsNames.append('\\Disk Groups\\Default Disk Group\\Disk {:04d}'.format(iDisk))
+        lsDisksXML += lsDisk
+        ddUIDs.setdefault(sShelf, []).append(lsDisk[5][len('<objecthexuid>'):-len('</objecthexuid>')])
+    dShelvesXML = {s: _lsShelfXML(oRandom, s, ddUIDs.get(s, [])) for s in lsShelves}
+    dRet = {'ls disk nofull': '\n'.join(lsHeader + lsNames),
+            'ls disk full xml': '\n'.join(lsHeader + lsDisksXML),
+            'ls diskshelf nofull': '\n'.join(lsHeader + ['\\Hardware\\Rack 1\\' + s for s in lsShelves]),
+            'ls diskshelf full xml': '\n'.join(lsHeader + [l for s in lsShelves for l in dShelvesXML[s]])}
+    for sShelf in lsShelves:
+        dRet['ls diskshelf "\\Hardware\\Rack 1\\{}" xml'.format(sShelf)] = '\n'.join(lsHeader + dShelvesXML[sShelf])
+    return dRet
+
+
+def _iUsedMemory(oRedis):
+    return oRedis.info('memory')['used_memory']
+
+
+def _dMeasure(oRedis, dOutputs, sAlgorithm, iRounds, bRealRedis):
+    """sizes and times of one algorithm (None -- without compression)"""
+    sDevice = DEVICE_PREFIX + (sAlgorithm or 'none')
+    lsCommands = list(dOutputs)
+    iMemBefore = _iUsedMemory(oRedis) if bRealRedis else 0
+    lfSet, lfGet = [], []
+    for i in range(iRounds):
+        # new runners: their memory copies of the outputs are empty
+        oRunner = cc.CachedCommandRunner(oRedis, 'EVA', sDevice, sCompression=sAlgorithm)
+        fStart = time.perf_counter()
+        oRunner._Store(dOutputs, 'config')
+        lfSet.append((time.perf_counter() - fStart) * 1000)
+        oRunner = cc.CachedCommandRunner(oRedis, 'EVA', sDevice, sCompression=sAlgorithm)
+        fStart = time.perf_counter()
+        dFound = oRunner._dLookup(lsCommands)
+        lfGet.append((time.perf_counter() - fStart) * 1000)
+        if dFound != dOutputs:
+            raise RuntimeError('{}: cached outputs differ from the stored ones'.format(sAlgorithm))
+    iMemory = _iUsedMemory(oRedis) - iMemBefore if bRealRedis else 0
+    oPipe = _oPipeline(oRedis)
+    for sCmd in lsCommands:
+        oPipe.strlen(oRunner.sPrefix + sCmd)
+    liLengths = oPipe.execute()
+    oRedis.delete(*[oRunner.sPrefix + sCmd for sCmd in lsCommands])
+    return {'bytes': sum(liLengths), 'largest': max(liLengths), 'memory': iMemory,
+            'set_ms': statistics.median(lfSet), 'get_ms': statistics.median(lfGet)}
+
+
+def _oGetCLIParser():
+    oParser = ap.ArgumentParser(description="Command cache compression on a synthetic EVA")
+    oParser.add_argument('-r', '--redis', help="Real Redis host:port or socket (default: local stand-in server)",
+                         type=str, required=False)
+    oParser.add_argument('-d', '--disks', help="Disks of the synthetic EVA", type=int, default=1000)
+    oParser.add_argument('-n', '--rounds', help="Store/lookup rounds per algorithm", type=int, default=20)
+    return oParser.parse_args()
+
+
+if __name__ == "__main__":
+    oArgs = _oGetCLIParser()
+    oRedis = _oConnect2Redis(oArgs.redis or _sStartServer())
+    dOutputs = _dEvaOutputs(oArgs.disks)
+    iRaw = sum(len(s.encode('utf-8')) for s in dOutputs.values())
+    print("EVA with {} disks: {} commands, {:.1f} KiB of output, largest {:.1f} KiB; Redis {}".format(
+        oArgs.disks, len(dOutputs), iRaw / 1024, max(len(s) for s in dOutputs.values()) / 1024,
+        oArgs.redis or 'stand-in'))
+    print("compressed values: {} bytes and longer, {} rounds, median times".format(
+        CACHE_COMPRESS_MIN, oArgs.rounds))
+    print("{:10s} {:>12s} {:>7s} {:>12s} {:>14s} {:>8s} {:>8s}".format(
+        'algorithm', 'values KiB', 'ratio', 'largest KiB', 'used_mem KiB', 'set ms', 'get ms'))
+    for sAlgorithm in [None] + sorted(cc.D_CODECS):
+        d = _dMeasure(oRedis, dOutputs, sAlgorithm, oArgs.rounds, bool(oArgs.redis))
+        print("{:10s} {:12.1f} {:7.3f} {:12.1f} {:>14s} {:8.2f} {:8.2f}".format(
+            sAlgorithm or 'none', d['bytes'] / 1024, d['bytes'] / iRaw, d['largest'] / 1024,
+            '{:.1f}'.format(d['memory'] / 1024) if oArgs.redis else '-', d['set_ms'], d['get_ms']))
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache of device command outputs in Redis, used by all the array drivers.  Every device has
+its own namespace 'pyzabbix::cache::<driver>::<device>::<command>', the TTL of a value depends
+on a class of the command (local.COMMAND_TTL_CLASSES), values are the command outputs encoded
+by _bEncode().  Lookups of several commands are batched (MGET), outputs are also kept in
+memory until their TTL, so reused array objects (daemon mode) don't ask Redis again.
+Hits, misses, errors, time of Redis and of device commands are counted per driver.
+
+Values of CACHE_COMPRESS_MIN bytes and longer are compressed (local.CACHE_COMPRESSION: zlib,
+lz4 or zstd when the module is installed).  A compressed value starts with a header: NUL byte
+and a tag of the algorithm; values without the header are plain UTF-8 (command outputs never
+start with NUL), so values written without compression or before it stay readable
+"""
+
+from logging import getLogger
+from collections import OrderedDict
+from local import COMMAND_TTL_CLASSES, REDIS_ENCODING, CACHE_COMPRESSION, CACHE_COMPRESS_MIN, CACHE_ZLIB_LEVEL
+from redis_utils import _oPipeline
+import threading
+import time
+import zlib
+
+oLog = getLogger(__name__)
+
+CACHE_PREFIX = "pyzabbix::cache::"
+
+# driver -> counters of all the runners of the driver
+ddTotals = {}
+oTotalsLock = threading.Lock()
+LS_COUNTERS = ['hits', 'misses', 'errors', 'redis_sec', 'run_sec', 'raw_bytes', 'stored_bytes']
+
+HEADER = b'\x00'
+# algorithm -> (tag after HEADER, compress, decompress)
+D_CODECS = {'zlib': (b'z', lambda b: zlib.compress(b, CACHE_ZLIB_LEVEL), zlib.decompress)}
+try:
+    import lz4.frame
+    D_CODECS['lz4'] = (b'4', lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+try:
+    import zstandard
+    # (de)compressor objects can't be shared by threads
+    D_CODECS['zstd'] = (b's', lambda b: zstandard.ZstdCompressor().compress(b),
+                        lambda b: zstandard.ZstdDecompressor().decompress(b))
+except ImportError:
+    pass
+D_DECOMPRESS = {t[0]: t[2] for t in D_CODECS.values()}
+
+
+def _sAlgorithm(sAlgorithm):
+    """an algorithm available here: zlib instead of a not installed one, None -- no compression"""
+    if sAlgorithm and sAlgorithm not in D_CODECS:
+        oLog.warning('Compression {} is not available, zlib is used'.format(sAlgorithm))
+        return 'zlib'
+    return sAlgorithm
+
+
+DEFAULT_ALGORITHM = _sAlgorithm(CACHE_COMPRESSION)
+
+
+def _bEncode(sValue, sAlgorithm=DEFAULT_ALGORITHM):
+    """command output -> Redis value, compressed when it's long enough and it helps"""
+    bValue = sValue.encode(REDIS_ENCODING)
+    if sAlgorithm and len(bValue) >= CACHE_COMPRESS_MIN:
+        bTag, fCompress, _ = D_CODECS[sAlgorithm]
+        bPacked = HEADER + bTag + fCompress(bValue)
+        if len(bPacked) < len(bValue):
+            return bPacked
+    return bValue
+
+
+def _sDecode(bValue):
+    """Redis value -> command output, None if the value is compressed by a not installed algorithm
+    or is corrupt"""
+    try:
+        if bValue[:1] == HEADER:
+            fDecompress = D_DECOMPRESS.get(bValue[1:2])
+            if fDecompress is None:
+                oLog.warning('Unknown compression of a cached value: {!r}'.format(bValue[1:2]))
+                return None
+            bValue = fDecompress(bValue[2:])
+        return bValue.decode(REDIS_ENCODING)
+    except Exception as e:
+        # zlib.error, errors of lz4/zstandard, UnicodeDecodeError
+        oLog.warning('Corrupt cached value: {}'.format(e))
+        return None
+
+
+def _iTTL(sClass):
+    return COMMAND_TTL_CLASSES.get(sClass, COMMAND_TTL_CLASSES['default'])
+
+
+class CachedCommandRunner:
+    """
+    Commands of one device.  fRun(sCommand) runs a command on the device and returns its output
+    as a string, it can be replaced in every call (e.g. by a function with an open session)
+    """
+    def __init__(self, oRedis, sDriver, sDevice, fRun=None, sCompression=DEFAULT_ALGORITHM):
+        self.oRedis = oRedis
+        self.sDriver = sDriver
+        self.sPrefix = "{}{}::{}::".format(CACHE_PREFIX, sDriver, sDevice)
+        self.fRun = fRun
+        self.sCompression = _sAlgorithm(sCompression)
+        self.dLocal = {}            # command -> (output, expiration time)
+        self.dStats = {s: 0 for s in LS_COUNTERS}
+        with oTotalsLock:
+            ddTotals.setdefault(sDriver, {s: 0 for s in LS_COUNTERS})
+        return
+
+    def _Count(self, sCounter, oValue=1):
+        self.dStats[sCounter] += oValue
+        with oTotalsLock:
+            ddTotals[self.sDriver][sCounter] += oValue
+        return
+
+    def _dLookup(self, lsCommands):
+        """{command: output} of the cached commands: memory first, then one MGET"""
+        fNow = time.time()
+        dRet = {}
+        lsMissing = []
+        for sCmd in lsCommands:
+            tLocal = self.dLocal.get(sCmd)
+            if tLocal is not None and tLocal[1] > fNow:
+                dRet[sCmd] = tLocal[0]
+            elif sCmd not in lsMissing:
+                lsMissing.append(sCmd)
+        if lsMissing:
+            fStart = time.monotonic()
+            # values and their remaining lifetimes (for the memory copies) in one round trip
+            oPipe = _oPipeline(self.oRedis)
+            oPipe.mget([self.sPrefix + s for s in lsMissing])
+            for sCmd in lsMissing:
+                oPipe.ttl(self.sPrefix + sCmd)
+            lResults = oPipe.execute()
+            self._Count('redis_sec', time.monotonic() - fStart)
+            lsBad = []
+            for sCmd, bValue, iTTL in zip(lsMissing, lResults[0], lResults[1:]):
+                sValue = None if bValue is None else _sDecode(bValue)
+                if sValue is not None:
+                    dRet[sCmd] = sValue
+                    self.dLocal[sCmd] = (sValue, fNow + max(iTTL, 0))
+                elif bValue is not None:
+                    lsBad.append(self.sPrefix + sCmd)
+            if lsBad:
+                # a miss: the commands are run again and the values replaced
+                oLog.warning('Deleting unreadable cached values: {}'.format(', '.join(lsBad)))
+                self.oRedis.delete(*lsBad)
+        return dRet
+
+    def _Store(self, dOutputs, sClass):
+        """save outputs of commands of a TTL class, one round trip"""
+        if not dOutputs:
+            return
+        iTTL = _iTTL(sClass)
+        fStart = time.monotonic()
+        oPipe = _oPipeline(self.oRedis)
+        iRaw = iStored = 0
+        for sCmd, sOutput in dOutputs.items():
+            bValue = _bEncode(sOutput, self.sCompression)
+            iRaw += len(sOutput.encode(REDIS_ENCODING))
+            iStored += len(bValue)
+            oPipe.set(self.sPrefix + sCmd, bValue, ex=iTTL)
+            self.dLocal[sCmd] = (sOutput, time.time() + iTTL)
+        oPipe.execute()
+        self._Count('redis_sec', time.monotonic() - fStart)
+        self._Count('raw_bytes', iRaw)
+        self._Count('stored_bytes', iStored)
+        return
+
+    def _dRunMany(self, lsCommands, sClass='default', fRun=None):
+        """
+        outputs of commands {command: output} in the order of lsCommands, the cached ones are looked
+        up at once, the others are run by fRun (or the runner's function) and saved.
+        Exceptions of fRun are passed to the caller, the outputs received before are saved and
+        attached to the exception as dOutputs (with the cached outputs of the following commands)
+        """
+        fRun = fRun or self.fRun
+        dCached = self._dLookup(lsCommands)
+        dRet = OrderedDict()
+        dNew = {}
+        try:
+            for sCmd in lsCommands:
+                if sCmd in dCached:
+                    self._Count('hits')
+                    dRet[sCmd] = dCached[sCmd]
+                    continue
+                self._Count('misses')
+                fStart = time.monotonic()
+                try:
+                    dRet[sCmd] = dNew[sCmd] = fRun(sCmd)
+                except Exception as e:
+                    self._Count('errors')
+                    e.dOutputs = OrderedDict((s, dRet.get(s, dCached.get(s))) for s in lsCommands
+                                             if s in dRet or s in dCached)
+                    raise
+                finally:
+                    self._Count('run_sec', time.monotonic() - fStart)
+        finally:
+            self._Store(dNew, sClass)
+        return dRet
+
+    def _sRun(self, sCommand, sClass='default', fRun=None):
+        """output of one command, from the cache or from the device"""
+        return self._dRunMany([sCommand], sClass, fRun)[sCommand]
+
+    def _Prefetch(self, lsCommands):
+        """look up commands that will be run soon in one round trip"""
+        self._dLookup(lsCommands)
+        return
+
+    def _Invalidate(self, sCommand):
+        """forget a cached output (e.g. it was wrong)"""
+        self.dLocal.pop(sCommand, None)
+        self.oRedis.delete(self.sPrefix + sCommand)
+        return
+
+    def __repr__(self):
+        return "Command cache {0}: {1}".format(self.sPrefix, _sFormatStats(self.dStats))
+
+
+def _sFormatStats(dStats):
+    iLookups = dStats['hits'] + dStats['misses']
+    return ("hits {} of {} ({:.0%}), errors {}, Redis {:.2f}s, device commands {:.2f}s, "
+            "stored {:.0f} KiB of {:.0f} KiB").format(
+        dStats['hits'], iLookups, dStats['hits'] / iLookups if iLookups else 0,
+        dStats['errors'], dStats['redis_sec'], dStats['run_sec'],
+        dStats['stored_bytes'] / 1024, dStats['raw_bytes'] / 1024)
+
+
+def _sTotals():
+    """counters of all the drivers, for the log"""
+    with oTotalsLock:
+        return '; '.join('{}: {}'.format(sDriver, _sFormatStats(dStats))
+                         for sDriver, dStats in sorted(ddTotals.items()))
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -10,14 +10,13 @@
 Интерфейс пользователя - через CLI.
 Интерфейс Zabbix - через потоки (stdin/stdout)
 """
-import argparse as ap
-import logging
-import json
-# from pathlib import Path
-from inventoryLogger import dLoggingConfig
-# from redis import StrictRedis, RedisError
-from redis_utils import _oConnect2Redis
-# from zabbixInterface import _sListOfStringsToJSON
+# Zabbix runs the program for every LLD rule of every array: only light modules are imported,
+# Redis is accessed by redisLite instead of redis-py, arguments are parsed by argvLite instead
+# of argparse, JSON is made without the json module (see startup-benchmark.py)
+from argvLite import ArgvParser
+from inventoryLogger import LazyLogger
+from redisLite import _oConnect2Redis
+from accessRegistry import AccessRegistry, _sJSON
 from local import CACHE_TIME
 # import sys         #  <--- for debugging
 
@@ -80,17 +79,15 @@ def _SendArrayInfo(oRedis, oArgs):
                      'zabbix_passwd': oArgs.zabbixpassword,
                      'zabbix_IP': oArgs.zabbixip,
                      'zabbix_port': oArgs.zabbixport}
-    oRedis.set(ZABBIX_PFX, json.dumps(dZabbixAccess), oArgs.redis_ttl)
-    oRedis.hset(ACCESS_PFX, sArrayName, json.dumps(dArrayAccess))
-    oRedis.expire(ACCESS_PFX, oArgs.redis_ttl)
-    return
+    oRegistry = AccessRegistry(oRedis, REDIS_PREFIX, ACCESS_PFX, ZABBIX_PFX, oArgs.redis_ttl)
+    # key of the array's lists of names, in the same round trip
+    return oRegistry._lRegister(sArrayName, _sJSON(dArrayAccess), _sJSON(dZabbixAccess),
+                                [('hget', REDIS_PREFIX + "ArrayKeys", sArrayName)])[0]
 
 
-def _sGetArrayData(oRedis, oArgs):
-    ARRINFO_HASHNAME = REDIS_PREFIX + "ArrayKeys"
+def _sGetArrayData(oRedis, oArgs, sArrayKey):
     sRet = ''
     try:
-        sArrayKey = oRedis.hget(ARRINFO_HASHNAME, oArgs.system)
         sJson = oRedis.hget(sArrayKey, D_KEYS[oArgs.query]).decode(REDIS_ENCODING)
         # print("*DBG* JSON from Redis: {}".format(sJson))
         if sJson:
@@ -116,14 +113,15 @@ def _sProcessArgs(oArgs):
     """Process the CLI arguments and return results as a JSON for Zabbix"""
     sRet = "Not implemented yet"
     oRedis = _oConnect2Redis(oArgs.redis)
-    _SendArrayInfo(oRedis, oArgs)
-    sRet = _sGetArrayData(oRedis, oArgs)
+    sArrayKey = _SendArrayInfo(oRedis, oArgs)
+    sRet = _sGetArrayData(oRedis, oArgs, sArrayKey)
+    oRedis.close()
     return sRet
 
 
 def _oGetCLIParser():
-    """parse CLI arguments, returns argparse.ArgumentParser object"""
-    oParser = ap.ArgumentParser(description="Storage Array-Zabbix interface program")
+    """parse CLI arguments, returns the parsed arguments (argvLite.Namespace)"""
+    oParser = ArgvParser(description="Storage Array-Zabbix interface program")
     oParser.add_argument('-t', '--type', help="Storage device type", required=True,
                          choices=ARRAYS_SUPPORTED)
     oParser.add_argument('-q', '--query', choices=STORAGE_OPS, default="ctrl-names")
@@ -148,8 +146,7 @@ def _oGetCLIParser():
     return (oParser.parse_args())
 
 if __name__ == '__main__':
-    logging.config.dictConfig(dLoggingConfig)
-    oLog = logging.getLogger('Discovery')
+    oLog = LazyLogger('Discovery')
     oLog.info('<<< Starting Discovery-info program')
     # oLog.debug(" ".join(sys.argv))
     oParser = _oGetCLIParser()
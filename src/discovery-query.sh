@@ -0,0 +1,5 @@
+#!/bin/sh
+# Client of discovery-server.py: one request '<system> <query>', prints the LLD JSON.
+# Usage: discovery-query.sh <array or server name> <query> [socket]
+# Zabbix agent: UserParameter=storage.discovery[*],/opt/zabinventory/discovery-query.sh "$1" "$2"
+printf '%s %s\n' "$1" "$2" | socat -t 5 - "UNIX-CONNECT:${3:-/tmp/zabinventory-discovery.sock}"
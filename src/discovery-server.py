@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Discovery query server: keeps the lists of names of arrays and servers (ArraysDiscovery.*,
+ServersDiscovery.* in Redis) in memory and answers LLD queries over a UNIX socket, so
+Zabbix doesn't start a Python program for every LLD rule of every host.
+
+Protocol: one request line '<system> <query>\\n' (query as in discovery-info.py: disk-names,
+ctrl-names etc.; for servers -- a field of the server's hash), the answer is the LLD JSON
+and '\\n', an empty line when there are no data.  The client is a shell one-liner,
+see discovery-query.sh, e.g. a Zabbix agent parameter:
+    UserParameter=storage.discovery[*],/opt/zabinventory/discovery-query.sh "$1" "$2"
+
+An array is reloaded when feed-data.py publishes its new snapshot (channel ArraysDiscovery.Updates).
+Lists of servers have no update notifications (servers-feed-data.py sends the data to Zabbix
+directly and doesn't write them), they are refreshed only by the complete reload every
+DISCOVERY_RELOAD seconds or on SIGHUP.
+Access information of arrays is still registered in Redis by discovery-info.py:
+at least one LLD rule of a host must run it.
+SIGHUP reloads all the data, SIGTERM/SIGINT stop the server
+"""
+
+import argparse as ap
+import logging
+import logging.config
+import os
+import signal
+import socketserver
+import threading
+import time
+import traceback
+from inventoryLogger import dLoggingConfig
+from redis_utils import _oConnect2Redis, _oPipeline
+from local import REDIS_ENCODING, DISCOVERY_SOCKET, DISCOVERY_SOCKET_MODE, DISCOVERY_RELOAD
+
+oLog = logging.getLogger('DiscoveryServer')
+
+ARRAYS_PREFIX = "ArraysDiscovery."
+SERVERS_PREFIX = "ServersDiscovery."
+# Redis prefix -> index hash of device names and their keys
+D_INDEXES = {ARRAYS_PREFIX: ARRAYS_PREFIX + "ArrayKeys",
+             SERVERS_PREFIX: SERVERS_PREFIX + "ServerKeys"}
+UPDATES_CHANNEL = "Updates"     # channel of updated device names: prefix + UPDATES_CHANNEL
+# prefixes with update notifications
+L_NOTIFIED = [ARRAYS_PREFIX]
+D_KEYS = {'ctrl-names':   'LIST_OF_CONTROLLER_NAMES',
+          'shelf-names':  'LIST OF DISK ENCLOSURE NAMES',
+          'disk-names':   'LIST OF DISK NAMES',
+          "node-names":   'LIST OF NODE NAMES',
+          "ups-names":    'LIST OF UPSes',
+          "dimm-names":   'LIST OF RAM MODULES',
+          "cf-names":     'LIST OF COMPACT FLASH MODULES',
+          "switch-names": 'LIST OF SWITCHES'}
+MAX_REQUEST = 4096          # bytes
+REQUEST_TIMEOUT = 5         # sec
+RESUBSCRIBE_DELAY = 5       # sec
+
+
+def _sDecode(b):
+    return b.decode(REDIS_ENCODING) if isinstance(b, bytes) else b
+
+
+class DiscoveryCache:
+    """Lists of names of devices: {prefix: {device name: {field: JSON}}}"""
+    def __init__(self, oRedis):
+        self.oRedis = oRedis
+        self.ddData = {sPrefix: {} for sPrefix in D_INDEXES}
+        self.dStats = {'requests': 0, 'hits': 0, 'misses': 0, 'reloads': 0, 'updates': 0}
+        return
+
+    def _Load(self):
+        """reload all the devices, two round trips per prefix"""
+        for sPrefix, sIndex in D_INDEXES.items():
+            dKeys = self.oRedis.hgetall(sIndex)
+            oPipe = _oPipeline(self.oRedis)
+            for bKey in dKeys.values():
+                oPipe.hgetall(bKey)
+            dData = {}
+            for bName, dFields in zip(dKeys.keys(), oPipe.execute()):
+                dData[_sDecode(bName)] = {_sDecode(k): _sDecode(v) for k, v in dFields.items()}
+            # replaced at once, requests are served from the old or the new data
+            self.ddData[sPrefix] = dData
+        self.dStats['reloads'] += 1
+        oLog.info('Loaded {} arrays, {} servers'.format(
+            len(self.ddData[ARRAYS_PREFIX]), len(self.ddData[SERVERS_PREFIX])))
+        return
+
+    def _Update(self, sPrefix, sName):
+        """reload one device after a change"""
+        bKey = self.oRedis.hget(D_INDEXES[sPrefix], sName)
+        dFields = self.oRedis.hgetall(bKey) if bKey else {}
+        if dFields:
+            self.ddData[sPrefix][sName] = {_sDecode(k): _sDecode(v) for k, v in dFields.items()}
+        else:
+            self.ddData[sPrefix].pop(sName, None)
+        self.dStats['updates'] += 1
+        oLog.debug('Device {}{} is updated'.format(sPrefix, sName))
+        return
+
+    def _sAnswer(self, sSystem, sQuery):
+        """LLD JSON of a query like discovery-info.py prints, '' when there are no data"""
+        self.dStats['requests'] += 1
+        if sQuery in D_KEYS:
+            sRet = self.ddData[ARRAYS_PREFIX].get(sSystem, {}).get(D_KEYS[sQuery])
+        else:
+            sRet = self.ddData[SERVERS_PREFIX].get(sSystem, {}).get(sQuery)
+        if sRet is None or sRet == "None":
+            self.dStats['misses'] += 1
+            return ''
+        self.dStats['hits'] += 1
+        return sRet
+
+    def _Listen(self, oStop):
+        """thread: reload devices published to the update channels until oStop is set"""
+        dChannels = {sPrefix + UPDATES_CHANNEL: sPrefix for sPrefix in L_NOTIFIED}
+        while not oStop.is_set():
+            try:
+                oPubSub = self.oRedis.pubsub(ignore_subscribe_messages=True)
+                oPubSub.subscribe(*dChannels)
+                # changes before the subscription are lost
+                self._Load()
+                while not oStop.is_set():
+                    dMessage = oPubSub.get_message(timeout=1.0)
+                    if dMessage and dMessage['type'] == 'message':
+                        self._Update(dChannels[_sDecode(dMessage['channel'])], _sDecode(dMessage['data']))
+            except Exception as e:
+                oLog.error('Subscription to updates failed: {}, retry in {}s'.format(e, RESUBSCRIBE_DELAY))
+                oStop.wait(RESUBSCRIBE_DELAY)
+        return
+
+    def __repr__(self):
+        return "Discovery cache: {0} arrays, {1} servers, stats {2}".format(
+            len(self.ddData[ARRAYS_PREFIX]), len(self.ddData[SERVERS_PREFIX]), self.dStats)
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    """one request '<system> <query>' and one answer per connection"""
+    timeout = REQUEST_TIMEOUT
+
+    def handle(self):
+        try:
+            sLine = self.rfile.readline(MAX_REQUEST).decode(REDIS_ENCODING).strip()
+            sSystem, _, sQuery = sLine.rpartition(' ')
+            sAnswer = self.server.oCache._sAnswer(sSystem.strip(), sQuery) if sSystem else ''
+            self.wfile.write((sAnswer + '\n').encode(REDIS_ENCODING))
+        except Exception as e:
+            oLog.error('Bad request: {}'.format(e))
+        return
+
+
+class QueryServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, sSocket, oCache, iMode=DISCOVERY_SOCKET_MODE):
+        if os.path.exists(sSocket):
+            # left by a previous run
+            os.unlink(sSocket)
+        super().__init__(sSocket, QueryHandler)
+        os.chmod(sSocket, iMode)
+        self.oCache = oCache
+        return
+
+
+def _Serve(oArgs):
+    oRedis = _oConnect2Redis(oArgs.redis)
+    oCache = DiscoveryCache(oRedis)
+    oStop = threading.Event()
+    oReload = threading.Event()
+
+    def _Stop(*args):
+        oStop.set()
+        oReload.set()
+        return
+
+    def _RequestReload(*args):
+        oReload.set()
+        return
+
+    signal.signal(signal.SIGTERM, _Stop)
+    signal.signal(signal.SIGINT, _Stop)
+    signal.signal(signal.SIGHUP, _RequestReload)
+    oServer = QueryServer(oArgs.socket, oCache, int(oArgs.mode, 8))
+    threading.Thread(target=oCache._Listen, args=(oStop,), daemon=True).start()
+    threading.Thread(target=oServer.serve_forever, daemon=True).start()
+    oLog.info('Serving discovery queries on {}'.format(oArgs.socket))
+    fLastReload = time.monotonic()
+    while not oStop.is_set():
+        oReload.wait(max(0.0, oArgs.reload - (time.monotonic() - fLastReload)))
+        if oStop.is_set():
+            break
+        oReload.clear()
+        try:
+            oCache._Load()
+        except Exception as e:
+            oLog.error('Cannot reload discovery data: {}'.format(e))
+        fLastReload = time.monotonic()
+        oLog.info(str(oCache))
+    oServer.shutdown()
+    oServer.server_close()
+    os.unlink(oArgs.socket)
+    oLog.info(str(oCache))
+    return
+
+
+def _oGetCLIParser():
+    oParser = ap.ArgumentParser(description="Discovery query server for Zabbix LLD")
+    oParser.add_argument('-r', '--redis', help="Redis database host:port or socket, default=localhost:6379",
+                         default='localhost:6379', type=str, required=False)
+    oParser.add_argument('-s', '--socket', help="UNIX socket of the server, default={}".format(DISCOVERY_SOCKET),
+                         default=DISCOVERY_SOCKET, type=str, required=False)
+    oParser.add_argument('-m', '--mode', help="Access mode of the socket (octal), default={:o}".format(
+                         DISCOVERY_SOCKET_MODE), default='{:o}'.format(DISCOVERY_SOCKET_MODE), type=str,
+                         required=False)
+    oParser.add_argument('--reload', help="Period of complete reload from Redis, seconds (default {})".format(
+                         DISCOVERY_RELOAD), type=int, default=DISCOVERY_RELOAD, required=False)
+    return (oParser.parse_args())
+
+
+if __name__ == "__main__":
+    iRetCode = 0
+    logging.config.dictConfig(dLoggingConfig)
+    oLog.info('<<< Starting discovery query server')
+    try:
+        _Serve(_oGetCLIParser())
+    except Exception as e:
+        oLog.error("Fatal error: {}".format(str(e)))
+        traceback.print_exc()
+        iRetCode = 1
+    oLog.info('>>> Discovery query server stopped')
+    exit(iRetCode)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
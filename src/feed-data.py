@@ -7,6 +7,7 @@ fill in data fields and pass these fields to Zabbix via API
 
 import redis
 import logging
+import logging.config
 import json
 import argparse as ap
 import hpeva_sssu as eva
@@ -15,13 +16,23 @@ import MySSH
 import ibm_FAStT as ibmds
 import ibm_FlashSystem_SW as IbmFS
 import ibm_XIV as xiv
-import random
-import string
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
 # import re
 from inventoryLogger import dLoggingConfig
 import zabbixInterface as zi
+from zabbixLimiter import dLimiters
+from zabbixSession import _oGetSession
+from zabbixImport import ImportDocument
 from pathlib import Path
-from local import CACHE_TIME
+from local import CACHE_TIME, DELTA_HEARTBEAT, ARRAY_DRIVER_CAPS, ARRAY_CAP_PER_MGMT_SERVER
+from local import PIPELINE_QUEUE_SIZE, DAEMON_INTERVAL, DEVICE_SESSION_MAX_AGE
+from scheduler import DeviceScheduler
+from refreshTracker import RefreshTracker
+import commandCache
+from redis_utils import _oPipeline, _PublishSnapshot
 
 # for debugging
 import traceback
@@ -39,11 +50,18 @@ D_KEYS = {'ctrl-names':   'LIST_OF_CONTROLLER_NAMES',
           "dimm-names":   'LIST OF RAM MODULES',
           "cf-names":     'LIST OF COMPACT FLASH MODULES',
           "switch-names": 'LIST OF SWITCHES'}
-RANDOM_ID_CHARS = string.ascii_uppercase + string.ascii_lowercase + string.digits
-
-
-def _sRandomString(size=8, chars=RANDOM_ID_CHARS):
-    return ''.join(random.choice(chars) for x in range(size))
+# refresh classes of the component lists (local.REFRESH_INTERVALS)
+D_CLASSES = {'ctrl-names':   'controllers',
+             'shelf-names':  'shelves',
+             'disk-names':   'disks',
+             'node-names':   'nodes',
+             'ups-names':    'ups',
+             'dimm-names':   'dimms',
+             'cf-names':     'cf',
+             'switch-names': 'switches'}
+# component lists of classic and scale-out arrays
+LS_CLASSIC_QUERIES = ['ctrl-names', 'shelf-names', 'disk-names']
+LS_SCALE_OUT_QUERIES = ['node-names', 'switch-names', 'disk-names', 'ups-names', 'dimm-names', 'cf-names']
 
 
 def _oConnect2Redis(sConnInfo):
@@ -102,12 +120,10 @@ def _dGetArrayInfo(oRedis):
     """
     ACCESS_PFX = REDIS_PREFIX + "ArrayAccess"
     lRet = {}
-    lArrayInfoDictNames = [b.decode(REDIS_ENCODING) for b in oRedis.hkeys(ACCESS_PFX)]
-    # oLog.debug("*DBG* Arrays defined: {}".format(lArrayInfoDictNames))
-    for sArrName in lArrayInfoDictNames:
-        sJson = oRedis.hget(ACCESS_PFX, sArrName)
+    # all the access records at once
+    for bName, sJson in oRedis.hgetall(ACCESS_PFX).items():
         if sJson:
-            lRet[sArrName] = json.loads(sJson.decode(REDIS_ENCODING))
+            lRet[bName.decode(REDIS_ENCODING)] = json.loads(sJson.decode(REDIS_ENCODING))
         else:
             # no data in Redis
             oLog.info("No arrays connection data in Redis")
@@ -183,53 +199,172 @@ def _fPrepareZbxConnection(sFunctionName, sArrayName, dZbxInfo):
                          dZbxInfo['zabbix_passwd'])
 
 
-def _lGetListOfDisks(sArrayName, oArray, dZbxInfo):
+class ComponentRecord:
+    """
+    Normalized data of one kind of array components, produced by the collector stage:
+    the Zabbix interface class and a list of component dictionaries for its _SendInfoToZabbix().
+    A record without a class marks the end of the array's data
+    """
+    def __init__(self, sArrName, cZabbix=None, ldInfo=None, bTimeStamp=False, sClass=None):
+        self.sArrName = sArrName
+        self.cZabbix = cZabbix
+        self.ldInfo = ldInfo or []
+        self.bTimeStamp = bTimeStamp
+        self.sClass = sClass        # refresh class, remembered as refreshed when the record is published
+        self.fTime = time.time()
+        return
+
+    def __repr__(self):
+        if self.cZabbix is None:
+            return "End of array {} data".format(self.sArrName)
+        return "{0} records of {1} for array {2}".format(len(self.ldInfo), self.cZabbix.__name__, self.sArrName)
+
+
+def _PublishRecord(oRecord, dZbxInfo, oImport=None):
+    """send a component record to Zabbix.  oImport: zabbixImport.ImportDocument of bulk provisioning"""
+    oArZabCon = _fPrepareZbxConnection(oRecord.cZabbix, oRecord.sArrName, dZbxInfo)
+    oArZabCon._SendInfoToZabbix(oRecord.sArrName, oRecord.ldInfo)
+    if oRecord.bTimeStamp:
+        if oImport is not None:
+            # component values go to the items of the array's template, only the timestamp
+            # application and item of a new array are missing: they are created by the import
+            oZbxHost = zi.ZabbixHost(oRecord.sArrName, oArZabCon.oZapi)
+            oZbxHost._UseImport(oImport)
+            oZbxHost._MakeTimeStamp(oArZabCon.oZSend)
+        else:
+            oArZabCon._MakeTimeStamp()
+    return
+
+
+class Publisher:
+    """
+    Publisher stage: sends component records to Zabbix.  With iWorkers > 0 the records go
+    through a bounded queue to worker threads, so collectors don't wait for Zabbix
+    (and block in _Put() only when the queue is full); with iWorkers = 0 records are
+    published by the collector itself.  Buffered metrics are flushed when all the
+    records of an array are published.  oTracker: RefreshTracker of the published classes,
+    oImport: ImportDocument collecting the missing objects of the arrays (see _PublishRecord)
+    """
+    def __init__(self, dZbxInfo, iWorkers=0, iQueueSize=PIPELINE_QUEUE_SIZE, oTracker=None, oImport=None):
+        self.dZbxInfo = dZbxInfo
+        self.oTracker = oTracker
+        self.oImport = oImport
+        self.oQueue = queue.Queue(iQueueSize)
+        self.oLock = threading.Lock()
+        self.dPending = {}          # array name -> records not published yet
+        self.ssCollected = set()    # arrays with all the records put
+        self.ddResults = {}         # array name -> publishing results
+        self.lThreads = [threading.Thread(target=self._Worker, name='Publisher-{}'.format(i), daemon=True)
+                         for i in range(iWorkers)]
+        for oThread in self.lThreads:
+            oThread.start()
+        return
+
+    def _Put(self, oRecord):
+        """pass a record to the publisher stage, blocks while the queue is full"""
+        with self.oLock:
+            self.ddResults.setdefault(oRecord.sArrName, {'records': 0, 'errors': [], 'time': 0.0,
+                                                         'queue_wait': 0.0})
+            self.dPending[oRecord.sArrName] = self.dPending.get(oRecord.sArrName, 0) + 1
+        if not self.lThreads:
+            self._Process(oRecord)
+            return
+        fStart = time.time()
+        self.oQueue.put(oRecord)
+        with self.oLock:
+            self.ddResults[oRecord.sArrName]['queue_wait'] += time.time() - fStart
+        return
+
+    def _Process(self, oRecord):
+        sArrName = oRecord.sArrName
+        sError = ''
+        fStart = time.time()
+        if oRecord.cZabbix is not None:
+            try:
+                _PublishRecord(oRecord, self.dZbxInfo, self.oImport)
+                if self.oTracker is not None and oRecord.sClass is not None:
+                    self.oTracker._Done(sArrName, oRecord.sClass, oRecord.fTime)
+            except Exception as e:
+                oLog.error('Cannot publish {}: {}'.format(oRecord, e))
+                traceback.print_exc()
+                sError = '{}: {}'.format(oRecord.cZabbix.__name__, e)
+        with self.oLock:
+            dRes = self.ddResults[sArrName]
+            dRes['time'] += time.time() - fStart
+            if oRecord.cZabbix is None:
+                self.ssCollected.add(sArrName)
+            elif sError:
+                dRes['errors'].append(sError)
+            else:
+                dRes['records'] += 1
+            self.dPending[sArrName] -= 1
+            bDone = sArrName in self.ssCollected and self.dPending[sArrName] == 0
+        if bDone:
+            # all the data of the array are published, send buffered values
+            zi._FlushMetricsBuffers()
+            if self.oTracker is not None:
+                self.oTracker._Commit(sArrName)
+            oLog.debug('Array {}: all the data are published'.format(sArrName))
+        return
+
+    def _Worker(self):
+        while True:
+            oRecord = self.oQueue.get()
+            if oRecord is None:
+                break
+            self._Process(oRecord)
+        return
+
+    def _Close(self):
+        """wait for the queued records to be published and stop the workers"""
+        for _ in self.lThreads:
+            self.oQueue.put(None)
+        for oThread in self.lThreads:
+            oThread.join()
+        return
+
+
+def _lGetListOfDisks(sArrayName, oArray, oPublisher):
     if 'disk-names' in oArray.dQueries:
         lRet = oArray.dQueries['disk-names']()
-        ldDisksInfo = oArray._ldGetDisksAsDicts()
-        oArZabCon = _fPrepareZbxConnection(zi.DisksToZabbix, sArrayName, dZbxInfo)
-        oArZabCon._SendInfoToZabbix(sArrayName, ldDisksInfo)
+        oPublisher._Put(ComponentRecord(sArrayName, zi.DisksToZabbix, oArray._ldGetDisksAsDicts(), sClass='disks'))
     else:
         lRet = []
     return lRet
 
 
-def _lGetListOfControllers(sArrayName, oArray, dZbxInfo):
+def _lGetListOfControllers(sArrayName, oArray, oPublisher):
     if 'ctrl-names' in oArray.dQueries:
         lRet = oArray.dQueries['ctrl-names']()
-        ldCtrlInfo = oArray._ldGetControllersInfoAsDict()
-        oArZabCon = _fPrepareZbxConnection(zi.CtrlsToZabbix, sArrayName, dZbxInfo)
-        oArZabCon._SendInfoToZabbix(sArrayName, ldCtrlInfo)
+        oPublisher._Put(ComponentRecord(sArrayName, zi.CtrlsToZabbix, oArray._ldGetControllersInfoAsDict(),
+                                        sClass='controllers'))
     else:
         lRet = []
     return lRet
 
 
-def _lGetListOfShelves(sArrayName, oArray, dZbxInfo):
+def _lGetListOfShelves(sArrayName, oArray, oPublisher):
     if 'shelf-names' in oArray.dQueries:
         lRet = oArray.dQueries['shelf-names']()
         ldShelvesInfo = oArray._ldGetShelvesAsDicts()
-        oArZabCon = _fPrepareZbxConnection(zi.EnclosureToZabbix, sArrayName, dZbxInfo)
         oLog.debug('_lGetListOfShelves: ldShelvesInfo = ' + str(ldShelvesInfo))
-        oArZabCon._SendInfoToZabbix(sArrayName, ldShelvesInfo)
+        oPublisher._Put(ComponentRecord(sArrayName, zi.EnclosureToZabbix, ldShelvesInfo, sClass='shelves'))
     else:
         lRet = []
     return lRet
 
 
-def _lGetListOfSomething(sArrayName, oArray, dZbxInfo, sParamName, oZI_Object):
+def _lGetListOfSomething(sArrayName, oArray, oPublisher, sParamName, oZI_Object):
     lRet = []
     if sParamName in oArray.dQueries:
         lRet = oArray.dQueries[sParamName]()
         ldInfoList = oArray._ldGetInfoDict(sParamName)
-        oArZabCon = _fPrepareZbxConnection(oZI_Object, sArrayName, dZbxInfo)
         # oLog.debug('_lGetListOfSomething: ldInfoList = ' + str(ldInfoList))
-        oArZabCon._SendInfoToZabbix(sArrayName, ldInfoList)
+        oPublisher._Put(ComponentRecord(sArrayName, oZI_Object, ldInfoList, sClass=D_CLASSES[sParamName]))
     return lRet
 
 
-def _GetArrayParameters(sArrayName, oArray, dZbxInfo):
-    oArZabCon = _fPrepareZbxConnection(zi.ArrayToZabbix, sArrayName, dZbxInfo)
+def _GetArrayParameters(sArrayName, oArray, oPublisher):
     ssKeys = set(oArray.dQueries.keys())
 
     ssRemovedItems = set([])
@@ -240,85 +375,357 @@ def _GetArrayParameters(sArrayName, oArray, dZbxInfo):
 
     oLog.debug('_GetArrayParameters: keys are: ' + str(ssKeys))
     dArrayInfo = oArray._dGetArrayInfoAsDict(ssKeys)
-    oArZabCon._SendInfoToZabbix(sArrayName, [dArrayInfo])  # _SendInfoToZabbox expects a LIST of DICTs
-    oArZabCon._MakeTimeStamp()
+    # _SendInfoToZabbix expects a LIST of DICTs
+    oPublisher._Put(ComponentRecord(sArrayName, zi.ArrayToZabbix, [dArrayInfo], bTimeStamp=True, sClass='system'))
     # oLog.debug('_GetArrayParameters: Array info is {}'.format(str(dArrayInfo)))
     return
 
 
-def _GetArrayData(sArrName, oArray, oRedis, dZbxParams):
+class ArrayRefresh:
+    """
+    Refresh decisions of one array in one run: a component class is refreshed when its
+    interval (local.REFRESH_INTERVALS) is over or the list of its names stored by the
+    previous run isn't in Redis anymore.  oTracker=None: everything is refreshed
+    """
+    def __init__(self, sArrName, sArrType, oRedis, oTracker):
+        self.sArrName = sArrName
+        self.sArrType = sArrType
+        self.oTracker = oTracker
+        self.dDue = {}          # query -> decision
+        self.dOldNames = {}     # Redis key of a list of names -> JSON list of the previous run
+        self.sOldKey = None
+        if oTracker is None:
+            return
+        self.dLast = oTracker._dLast(sArrName)
+        bOldKey = oRedis.hget(REDIS_PREFIX + "ArrayKeys", sArrName)
+        if bOldKey:
+            self.sOldKey = bOldKey.decode(REDIS_ENCODING)
+            self.dOldNames = {b.decode(REDIS_ENCODING): v for b, v in oRedis.hgetall(self.sOldKey).items()}
+        return
+
+    def _bDue(self, sQuery):
+        """sQuery: 'system' or a query of component names ('disk-names' etc.)"""
+        if self.oTracker is None:
+            return True
+        if sQuery not in self.dDue:
+            if sQuery != 'system' and D_KEYS[sQuery] not in self.dOldNames:
+                self.dDue[sQuery] = True
+            else:
+                self.dDue[sQuery] = self.oTracker._bDue(self.sArrType, D_CLASSES.get(sQuery, sQuery), self.dLast)
+        return self.dDue[sQuery]
+
+    def _bAnyDue(self):
+        """something must be refreshed, so the array must be queried"""
+        if not self.dOldNames:
+            return True
+        lsQueries = LS_SCALE_OUT_QUERIES if D_KEYS['node-names'] in self.dOldNames else LS_CLASSIC_QUERIES
+        return any([self._bDue(s) for s in ['system'] + lsQueries])
+
+    def _Done(self, sQuery):
+        """the array has nothing of this class, there's nothing to publish"""
+        if self.oTracker is not None:
+            self.oTracker._Done(self.sArrName, D_CLASSES.get(sQuery, sQuery), time.time())
+        return
+
+    def _KeepOldNames(self, oRedis):
+        """nothing is refreshed: the lists of names of the previous run stay"""
+        oPipe = _oPipeline(oRedis)
+        oPipe.expire(REDIS_PREFIX + "ArrayKeys", oRedis.cacheTime)
+        oPipe.expire(self.sOldKey, oRedis.cacheTime)
+        oPipe.execute()
+        return
+
+
+def _GetArrayData(sArrName, oArray, oRedis, oPublisher, oRefresh=None):
+    """collector stage: query the array, store lists of components in Redis and pass
+    the components data to the publisher.  oRefresh: ArrayRefresh, only the due classes are queried"""
+    oRefresh = oRefresh or ArrayRefresh(sArrName, '', oRedis, None)
     sRedisArrInfoHashName = REDIS_PREFIX + "ArrayKeys"
-    sArrayKey = REDIS_PREFIX + sArrName + "." + _sRandomString(8)
-    oRedis.hset(sRedisArrInfoHashName, sArrName, sArrayKey)
-    oLog.debug("Key {}, subkey {} is set to {}".format(sRedisArrInfoHashName, sArrName, sArrayKey))
-    oRedis.expire(sRedisArrInfoHashName, oRedis.cacheTime)
-    # create a new hash and set its expire time
-    oRedis.hset(sArrayKey, 'NAME', sArrName)
-    oRedis.expire(sArrayKey, oRedis.cacheTime)
+    # one snapshot of lists per array, replaced when all the lists are collected
+    sArrayKey = REDIS_PREFIX + "Snapshot." + sArrName
+    dArrayHash = {'NAME': sArrName, 'VERSION': '{:.3f}'.format(time.time())}
+
+    def _StoreNames(sQuery, fGetList):
+        """query a list of components if it's due, or keep the previous list"""
+        if oRefresh._bDue(sQuery):
+            if sQuery not in oArray.dQueries:
+                oRefresh._Done(sQuery)
+            dArrayHash[D_KEYS[sQuery]] = zi._sListOfStringsToJSON(fGetList())
+        else:
+            dArrayHash[D_KEYS[sQuery]] = oRefresh.dOldNames[D_KEYS[sQuery]]
+        return
 
     # get parameters describing a whole array and pass these parameters to Zabbix
-    _GetArrayParameters(sArrName, oArray, dZbxParams)
+    if oRefresh._bDue('system'):
+        _GetArrayParameters(sArrName, oArray, oPublisher)
+    else:
+        # only the time of update
+        oPublisher._Put(ComponentRecord(sArrName, zi.ArrayToZabbix, [], bTimeStamp=True))
 
     if 'node-names' in oArray.dQueries:
         # scale-out arrays like XIV goes here
-        # lNodes = _lGetListOfNodes(sArrName, oArray, dZbxParams)
-        lNodes = _lGetListOfSomething(sArrName, oArray, dZbxParams, 'node-names', zi.NodeToZabbix)
-        oRedis.hset(sArrayKey, D_KEYS['node-names'], zi._sListOfStringsToJSON(lNodes))
+        _StoreNames('node-names',
+                    lambda: _lGetListOfSomething(sArrName, oArray, oPublisher, 'node-names', zi.NodeToZabbix))
+        _StoreNames('switch-names',
+                    lambda: _lGetListOfSomething(sArrName, oArray, oPublisher, 'switch-names', zi.SwitchToZabbix))
+        _StoreNames('disk-names',
+                    lambda: _lGetListOfSomething(sArrName, oArray, oPublisher, 'disk-names', zi.DisksToZabbix))
+        _StoreNames('ups-names',
+                    lambda: _lGetListOfSomething(sArrName, oArray, oPublisher, 'ups-names', zi.UPSesToZabbix))
+        _StoreNames('dimm-names',
+                    lambda: _lGetListOfSomething(sArrName, oArray, oPublisher, 'dimm-names', zi.DIMMsToZabbix))
+        _StoreNames('cf-names',
+                    lambda: _lGetListOfSomething(sArrName, oArray, oPublisher, 'cf-names', zi.CFtoZabbix))
+    else:
+        # lists of controllers, disk enclosures and finally disks
+        _StoreNames('ctrl-names', lambda: _lGetListOfControllers(sArrName, oArray, oPublisher))
+        _StoreNames('shelf-names', lambda: _lGetListOfShelves(sArrName, oArray, oPublisher))
+        _StoreNames('disk-names', lambda: _lGetListOfDisks(sArrName, oArray, oPublisher))
+    _PublishSnapshot(oRedis, sArrayKey, dArrayHash, sRedisArrInfoHashName, sArrName, oRedis.cacheTime,
+                     oRefresh.sOldKey, REDIS_PREFIX + "Updates")
+    oLog.debug("Key {}, subkey {} is set to {}".format(sRedisArrInfoHashName, sArrName, sArrayKey))
+    if oLog.isEnabledFor(logging.DEBUG):
+        # test data in Redis
+        for sKey, sValue in oRedis.hgetall(sArrayKey).items():
+            oLog.debug('*DBG* stored key: {0}, value: {1}'.format(sKey, sValue))
+    return
 
-        # lSwitches = _lGetListOfSwitches(sArrName, oArray, dZbxParams)
-        lSwitches = _lGetListOfSomething(sArrName, oArray, dZbxParams, 'switch-names', zi.SwitchToZabbix)
-        oRedis.hset(sArrayKey, D_KEYS['switch-names'], zi._sListOfStringsToJSON(lSwitches))
 
-        # lDisks = _lGetListOfDisks(sArrName, oArray, dZbxParams)
-        lDisks = _lGetListOfSomething(sArrName, oArray, dZbxParams, 'disk-names', zi.DisksToZabbix)
-        oRedis.hset(sArrayKey, D_KEYS['disk-names'], zi._sListOfStringsToJSON(lDisks))
+# concurrency caps of array drivers: (type[, management server]) -> semaphore
+dDriverSemaphores = {}
+oSemaphoresLock = threading.Lock()
 
-        lUPSes = _lGetListOfSomething(sArrName, oArray, dZbxParams, 'ups-names', zi.UPSesToZabbix)
-        oRedis.hset(sArrayKey, D_KEYS['ups-names'], zi._sListOfStringsToJSON(lUPSes))
 
-        lDIMMs = _lGetListOfSomething(sArrName, oArray, dZbxParams, 'dimm-names', zi.DIMMsToZabbix)
-        oRedis.hset(sArrayKey, D_KEYS['dimm-names'], zi._sListOfStringsToJSON(lDIMMs))
+def _tDriverKey(dArrayInfo):
+    """key of the concurrency cap of an array: driver type or (type, management server)"""
+    sType = dArrayInfo['type']
+    if sType in ARRAY_CAP_PER_MGMT_SERVER:
+        return (sType, dArrayInfo['ip'])
+    return (sType,)
 
-        lCFs = _lGetListOfSomething(sArrName, oArray, dZbxParams, 'cf-names', zi.CFtoZabbix)
-        oRedis.hset(sArrayKey, D_KEYS['cf-names'], zi._sListOfStringsToJSON(lCFs))
-    else:
-        # get list of controllers and push it to Redis
-        lCtrls = _lGetListOfControllers(sArrName, oArray, dZbxParams)
-        oRedis.hset(sArrayKey, D_KEYS['ctrl-names'], zi._sListOfStringsToJSON(lCtrls))
-
-        # get list of disk enclosures and push to Redis
-        lEnclosures = _lGetListOfShelves(sArrName, oArray, dZbxParams)
-        oRedis.hset(sArrayKey, D_KEYS['shelf-names'], zi._sListOfStringsToJSON(lEnclosures))
-
-        # and finally list of disks
-        lDisks = _lGetListOfDisks(sArrName, oArray, dZbxParams)
-        oRedis.hset(sArrayKey, D_KEYS['disk-names'], zi._sListOfStringsToJSON(lDisks))
-    # test data in Redis
-    oLog.debug("Array hash name is {}".format(sArrayKey))
-    for sKey in oRedis.hkeys(sArrayKey):
-        oLog.debug('*DBG* stored key: {0}, value: {1}'.format(
-                   sKey, oRedis.hget(sArrayKey, sKey)
-                   ))
-    return
 
+def _oDriverSemaphore(dArrayInfo):
+    tKey = _tDriverKey(dArrayInfo)
+    with oSemaphoresLock:
+        if tKey not in dDriverSemaphores:
+            dDriverSemaphores[tKey] = threading.BoundedSemaphore(ARRAY_DRIVER_CAPS.get(tKey[0], 1))
+        return dDriverSemaphores[tKey]
 
-def _ProcessArgs(oArgs, oLog):
-    """ Process the CLI arguments and connect to Redis """
-    oRedis = _oConnect2Redis(oArgs.redis)
-    oRedis.cacheTime = oArgs.redis_ttl
 
-    dZbxInfo = _dGetZabbixConnectionInfo(oRedis)
-    dArrayInfo = _dGetArrayInfo(oRedis)
-    for sArrName in dArrayInfo:
-        dArrParams = dArrayInfo[sArrName]
+class ArraySessions:
+    """
+    Array objects of a daemon, with their open sessions (SSSU, SSH) and collected data.
+    An object is reused between poll cycles while the array's access parameters are the same
+    and it is younger than iMaxAge seconds; failed objects are dropped
+    """
+    def __init__(self, iMaxAge=DEVICE_SESSION_MAX_AGE):
+        self.iMaxAge = iMaxAge
+        self.dArrays = {}       # array name -> (access parameters, array object, creation time)
+        self.oLock = threading.Lock()
+        self.dStats = {'connects': 0, 'reuses': 0, 'drops': 0}
+        return
+
+    def _oGet(self, sArrName, dArrParams, oRedis):
+        with self.oLock:
+            tArray = self.dArrays.get(sArrName)
+            if tArray is not None and tArray[0] == dArrParams and time.time() - tArray[2] < self.iMaxAge:
+                self.dStats['reuses'] += 1
+                return tArray[1]
+        self._Drop(sArrName)
+        oArray = _oConnect2Array(sArrName, dArrParams, oRedis)
+        with self.oLock:
+            self.dArrays[sArrName] = (dArrParams, oArray, time.time())
+            self.dStats['connects'] += 1
+        return oArray
+
+    def _Drop(self, sArrName):
+        """forget an array object and close its session"""
+        with self.oLock:
+            tArray = self.dArrays.pop(sArrName, None)
+        if tArray is None:
+            return
+        self.dStats['drops'] += 1
+        if hasattr(tArray[1], '_Close'):
+            try:
+                tArray[1]._Close()
+            except Exception as e:
+                oLog.info('Array {}: error when closing session: {}'.format(sArrName, e))
+        return
+
+    def _Keep(self, lsArrNames):
+        """drop the objects of arrays not in the list"""
+        for sArrName in set(self.dArrays) - set(lsArrNames):
+            self._Drop(sArrName)
+        return
+
+    def __repr__(self):
+        return "Array sessions: {0} open, stats {1}".format(len(self.dArrays), self.dStats)
+
+
+def _dProcessArray(sArrName, dArrParams, oRedis, oPublisher, oSessions=None, oTracker=None):
+    """
+    collect data of one array within its driver's concurrency cap and pass it to the publisher.
+    oSessions: ArraySessions of a daemon, None for a new connection.
+    oTracker: RefreshTracker, only the due component classes are collected (None: all).
+    Returns a dictionary: 'ok' (bool), 'error' (message), 'wait' (seconds waiting for the cap),
+    'time' (seconds of collection) and 'skipped' (bool, nothing is due)
+    """
+    dRet = {'ok': False, 'error': '', 'wait': 0.0, 'time': 0.0, 'skipped': False}
+    fStart = time.time()
+    with _oDriverSemaphore(dArrParams):
+        fCollect = time.time()
+        dRet['wait'] = fCollect - fStart
         try:
-            oArray = _oConnect2Array(sArrName, dArrParams, oRedis)
-            _GetArrayData(sArrName, oArray, oRedis, dZbxInfo)
+            oRefresh = ArrayRefresh(sArrName, dArrParams['type'], oRedis, oTracker)
+            if not oRefresh._bAnyDue():
+                # don't connect to the array at all
+                oRefresh._KeepOldNames(oRedis)
+                dRet['skipped'] = True
+            elif oSessions is None:
+                oArray = _oConnect2Array(sArrName, dArrParams, oRedis)
+                _GetArrayData(sArrName, oArray, oRedis, oPublisher, oRefresh)
+            else:
+                oArray = oSessions._oGet(sArrName, dArrParams, oRedis)
+                _GetArrayData(sArrName, oArray, oRedis, oPublisher, oRefresh)
+            dRet['ok'] = True
         except Exception as e:
             oLog.error('Exception when processing array: ' + sArrName)
             oLog.error(str(e))
             traceback.print_exc()
-            continue
+            dRet['error'] = str(e)
+            if oSessions is not None:
+                oSessions._Drop(sArrName)
+        finally:
+            oPublisher._Put(ComponentRecord(sArrName))
+        dRet['time'] = time.time() - fCollect
+    return dRet
+
+
+def _lInterleaveByDriver(dArrayInfo):
+    """array names ordered round-robin by driver caps, so workers aren't all blocked by one slow driver"""
+    dByKey = {}
+    for sArrName, dArrParams in dArrayInfo.items():
+        dByKey.setdefault(_tDriverKey(dArrParams), []).append(sArrName)
+    lRet = []
+    llQueues = list(dByKey.values())
+    while llQueues:
+        lRet.extend(l.pop(0) for l in llQueues)
+        llQueues = [l for l in llQueues if l]
+    return lRet
+
+
+def _ddCollect(dArrayInfo, oRedis, dZbxInfo, oArgs, oSessions=None, oTracker=None):
+    """collect data of the arrays and send it to Zabbix, log results. Returns {array name: results}"""
+    fStart = time.time()
+    ddResults = {}
+    # the Zabbix interface objects of the arrays share this session
+    oZbxAPI = _oGetSession("http://{}/zabbix".format(dZbxInfo['zabbix_IP']), dZbxInfo['zabbix_user'],
+                           dZbxInfo['zabbix_passwd'], bAsync=oArgs.async_api)
+    if oArgs.async_api:
+        # metadata of all the arrays at once
+        zi._PrefetchHosts(oZbxAPI, list(dArrayInfo))
+    oImport = ImportDocument() if (oArgs.import_config or oArgs.dry_run) else None
+    oPublisher = Publisher(dZbxInfo, oArgs.publishers, oTracker=oTracker, oImport=oImport)
+    if oArgs.workers > 1:
+        # arrays are collected concurrently, each driver type within its cap
+        with ThreadPoolExecutor(max_workers=oArgs.workers) as oPool:
+            dFutures = {sArrName: oPool.submit(_dProcessArray, sArrName, dArrayInfo[sArrName], oRedis, oPublisher,
+                                               oSessions, oTracker)
+                        for sArrName in _lInterleaveByDriver(dArrayInfo)}
+            for sArrName, oFuture in dFutures.items():
+                ddResults[sArrName] = oFuture.result()
+    else:
+        for sArrName in dArrayInfo:
+            ddResults[sArrName] = _dProcessArray(sArrName, dArrayInfo[sArrName], oRedis, oPublisher, oSessions,
+                                                 oTracker)
+    fCollected = time.time()
+    oPublisher._Close()
+    if oImport is not None:
+        # create the missing objects of all the arrays and send values of the new items
+        oImport._Import(oZbxAPI, bDryRun=oArgs.dry_run)
+        oLog.info(str(oImport))
+        zi._FlushMetricsBuffers()
+    for sArrName, dRes in sorted(ddResults.items()):
+        dPub = oPublisher.ddResults.get(sArrName, {'records': 0, 'errors': [], 'time': 0.0, 'queue_wait': 0.0})
+        oLog.info('Array {}: {} in {:.1f}s (waited {:.1f}s){}, published {} records in {:.1f}s '
+                  '(queue wait {:.1f}s){}'.format(
+                      sArrName, 'FAILED' if not dRes['ok'] else ('not due' if dRes['skipped'] else 'done'),
+                      dRes['time'], dRes['wait'],
+                      ', error: ' + dRes['error'] if dRes['error'] else '',
+                      dPub['records'], dPub['time'], dPub['queue_wait'],
+                      ', errors: ' + '; '.join(dPub['errors']) if dPub['errors'] else ''))
+    if oArgs.publishers > 0:
+        oLog.info('Publishing finished {:.1f}s after collection'.format(time.time() - fCollected))
+    oLog.info('{} arrays ({} failed) in {:.1f}s, sum of collection times {:.1f}s'.format(
+        len(ddResults), len([d for d in ddResults.values() if not d['ok']]), time.time() - fStart,
+        sum(d['time'] for d in ddResults.values())))
+    return ddResults
+
+
+def _LogStats(oTracker):
+    oLog.info(str(oTracker))
+    oLog.info(str(zi.oAppIndex))
+    for oLimiter in dLimiters.values():
+        oLog.info(str(oLimiter))
+    for oMetaCache in zi.dMetaCaches.values():
+        oLog.info(str(oMetaCache))
+    if zi.oDeltaFilter is not None:
+        oLog.info(str(zi.oDeltaFilter))
+    oLog.info('Command cache: ' + commandCache._sTotals())
+    return
+
+
+def _oPrepare(oArgs):
+    """connect to Redis and set up Zabbix caches,
+    returns (Redis connection, Zabbix connection info, refresh tracker)"""
+    oRedis = _oConnect2Redis(oArgs.redis)
+    oRedis.cacheTime = oArgs.redis_ttl
+
+    dZbxInfo = _dGetZabbixConnectionInfo(oRedis)
+    if not oArgs.no_meta_cache:
+        zi._EnableMetadataCache(oRedis, "http://{}/zabbix".format(dZbxInfo['zabbix_IP']))
+    if oArgs.delta:
+        zi._EnableDeltaSubmission(oRedis)
+    if oArgs.async_api:
+        zi._EnableAsyncSending()
+    oTracker = RefreshTracker(oRedis, REDIS_PREFIX, bForce=oArgs.refresh_all)
+    return (oRedis, dZbxInfo, oTracker)
+
+
+def _ProcessArgs(oArgs, oLog):
+    """ Process the CLI arguments and connect to Redis """
+    oRedis, dZbxInfo, oTracker = _oPrepare(oArgs)
+    _ddCollect(_dGetArrayInfo(oRedis), oRedis, dZbxInfo, oArgs, oTracker=oTracker)
+    _LogStats(oTracker)
+    return
+
+
+def _RunDaemon(oArgs, oLog):
+    """
+    Daemon mode: Redis connection, Zabbix sessions and array sessions stay open between
+    poll cycles, every array is polled once per interval at its own time.
+    SIGHUP reloads the list of arrays and Zabbix connection info from Redis
+    """
+    oRedis, dZbxInfo, oTracker = _oPrepare(oArgs)
+    oSessions = ArraySessions()
+    oScheduler = DeviceScheduler(oArgs.interval)
+
+    def _dLoadArrays():
+        dZbxInfo.update(_dGetZabbixConnectionInfo(oRedis))
+        dArrayInfo = _dGetArrayInfo(oRedis)
+        oSessions._Keep(dArrayInfo.keys())
+        return dArrayInfo
+
+    def _Poll(dDue):
+        zi._StartRun()
+        _ddCollect(dDue, oRedis, dZbxInfo, oArgs, oSessions, oTracker)
+        _LogStats(oTracker)
+        oLog.info(str(oSessions))
+        oLog.info(str(oScheduler))
+        return
+
+    oScheduler._Run(_dLoadArrays, _Poll)
+    oSessions._Keep([])
     return
 
 
@@ -328,6 +735,29 @@ def _oGetCLIParser():
                          default='localhost:6379', type=str, required=False)
     oParser.add_argument('-t', '--redis-ttl', help="TTL of Redis-cached data", type=int,
                          default=CACHE_TIME, required=False)
+    oParser.add_argument('-w', '--workers', help="Collect data from up to WORKERS arrays concurrently "
+                         "(within per-driver caps, see local.ARRAY_DRIVER_CAPS)", type=int, default=1, required=False)
+    oParser.add_argument('-p', '--publishers', help="Send data to Zabbix by PUBLISHERS threads fed through "
+                         "a queue, 0 (default): by the collecting threads", type=int, default=0, required=False)
+    oParser.add_argument('-D', '--daemon', help="Run as a daemon polling every array once per INTERVAL, "
+                         "SIGHUP reloads the list of arrays", action='store_true', default=False, required=False)
+    oParser.add_argument('--interval', help="Poll interval of the daemon, seconds (default {})".format(
+                         DAEMON_INTERVAL), type=int, default=DAEMON_INTERVAL, required=False)
+    oParser.add_argument('-f', '--refresh-all', help="Collect all the component classes, "
+                         "ignore refresh intervals (local.REFRESH_INTERVALS)", action='store_true', default=False,
+                         required=False)
+    oParser.add_argument('-d', '--delta', help="Send only changed values (and all values every {} hours)".format(
+                         DELTA_HEARTBEAT), action='store_true', default=False, required=False)
+    oParser.add_argument('-n', '--no-meta-cache', help="Don't cache Zabbix metadata in Redis between runs",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('-a', '--async-api', help="Use asyncio Zabbix API client with a pool of connections, "
+                         "load Zabbix metadata of all the arrays at once, send values asynchronously",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('-i', '--import-config', help="Create missing objects of all the arrays (timestamp "
+                         "applications and items of new arrays) with one configuration import",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('--dry-run', help="Only log Zabbix objects missing for the configuration import",
+                         action='store_true', default=False, required=False)
     return (oParser.parse_args())
 
 
@@ -338,7 +768,10 @@ if __name__ == "__main__":
         oLog = logging.getLogger('FeedData')
         oLog.info('Starting Zabbix-Feeder program')
         oParser = _oGetCLIParser()
-        _ProcessArgs(oParser, oLog)
+        if oParser.daemon:
+            _RunDaemon(oParser, oLog)
+        else:
+            _ProcessArgs(oParser, oLog)
     except Exception as e:
         oLog.error("Fatal error: {}".format(str(e)))
         traceback.print_exc()
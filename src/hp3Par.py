@@ -6,11 +6,9 @@ import logging
 import re
 import redis  # In-memory NoSQL DB for caching
 import MySSH
-import json  # serializing/deserializing of objects to stings and files
 from collections import OrderedDict
 from inventoryObjects import ClassicArrayClass, ControllerClass, DiskShelfClass, DASD_Class
-# local constants
-from local import CACHE_TIME, REDIS_ENCODING
+from commandCache import CachedCommandRunner
 import itertools
 
 
@@ -86,7 +84,6 @@ class HP3Par(ClassicArrayClass):
 
     def __init__(self, sIP, oAuth, sSysName, oRedisConn):
         super().__init__(sIP, "3Par")
-        self.sRedisKeyPrefix = "pyzabbix::hp3Par::" + sSysName + "::"
         self.sSysName = sSysName
         self.sIP = sIP
         self.oAuthData = oAuth
@@ -104,59 +101,36 @@ class HP3Par(ClassicArrayClass):
         self.lDisks = []
         self.lControllers = []
         self.lCages = []
-        self.iRedisTimeout = CACHE_TIME
-        self.oRedisConnection = oRedisConn
+        self.oCache = CachedCommandRunner(oRedisConn, '3Par', sSysName)
         return
 
-    def __sFromArray__(self, sCommand):
+    def __sFromArray__(self, sCommand, sClass='config'):
         """runs SSH command on the array, return output"""
-        sRet = ''
-        sRedisKey = self.sRedisKeyPrefix + "__sFromArray__::" + sCommand
-        try:
-            sRet = json.loads(self.oRedisConnection.get(sRedisKey).decode(REDIS_ENCODING))
-        except AttributeError:
-            try:
-                oConn = MySSH.MySSHConnection(self.sIP, DEFAULT_SSH_PORT, self.oAuthData)
-                sRet = oConn.fsRunCmd(sCommand)
-                oConn.close()
-                # save results to Redis
-                self.oRedisConnection.set(sRedisKey,
-                                          json.dumps(sRet).encode(REDIS_ENCODING),
-                                          self.iRedisTimeout)
-            except Exception as e:
-                oLog.error("SSH failed on login.")
-                oLog.debug(e)
-        return sRet
+        return self.__dsFromArray__([sCommand], sClass).get(sCommand, '')
 
-    def __dsFromArray__(self, lsCommands):
+    def __dsFromArray__(self, lsCommands, sClass='config'):
         """
         Connects to array, runs a SERIES of commands and return results as a dictionary
-        with commands as keys and returned output as values
+        with commands as keys and returned output as values.  sClass: TTL class of the outputs
         """
         dData = OrderedDict({})
-        sRedisKey = self.sRedisKeyPrefix + "__dsFromArray__"
+        lConn = []      # SSH connection, opened only if something isn't in the cache
+
+        def _sRun(sCmd):
+            if not lConn:
+                lConn.append(MySSH.MySSHConnection(self.sIP, DEFAULT_SSH_PORT, self.oAuthData))
+            return lConn[0].fsRunCmd(sCmd)
+
         try:
-            oConn = MySSH.MySSHConnection(self.sIP, DEFAULT_SSH_PORT, self.oAuthData)
-            for sCmd in lsCommands:
-                # first try to lookup data in Redis, next ask array itself
-                try:
-                    sData = self.oRedisConnection.hget(sRedisKey, sCmd).decode(REDIS_ENCODING)
-                except AttributeError:
-                    try:
-                        # oLog.debug('__dsFromArray__: Command to run: {}'.format(sCmd))
-                        sData = oConn.fsRunCmd(sCmd)
-                        # oLog.debug('__dsFromArray__: output: {}'.format(sData))
-                    except Exception as e:
-                        oLog.error('__dsFromArray__: failed to exec command')
-                        oLog.error('__dsFromArray__: Additional info: ' + str(e))
-                        raise HP3Par_Exception
-                    self.oRedisConnection.hset(sRedisKey, sCmd, sData.encode(REDIS_ENCODING))
-                    self.oRedisConnection.expire(sRedisKey, self.iRedisTimeout)
-                dData[sCmd] = sData
-            oConn.close()
+            dData = self.oCache._dRunMany(lsCommands, sClass, _sRun)
         except Exception as e:
-            oLog.error('__dsFromArray__: SSH failed on login')
+            oLog.error('__dsFromArray__: SSH failed on login or command failed')
             oLog.debug('__dsFromArray__: Additional info: ' + str(e))
+            # the outputs received before the failure
+            dData = getattr(e, 'dOutputs', dData)
+        finally:
+            if lConn:
+                lConn[0].close()
         return dData
 
     def __FillDisks__(self):
@@ -246,8 +220,10 @@ class HP3Par(ClassicArrayClass):
                 break
         # we have list of nodes' numbers in lNodes (as strings). Now is time to get some information
         oLog.debug('There are {} nodes: {}'.format(len(lNodes), ', '.join(lNodes)))
+        # all the nodes in one SSH session
+        dsNodesInv = self.__dsFromArray__(['shownode -i -svc {}'.format(sNode) for sNode in lNodes])
         for sNode in lNodes:
-            sOutput = self.__sFromArray__('shownode -i -svc {}'.format(sNode))
+            sOutput = dsNodesInv.get('shownode -i -svc {}'.format(sNode), '')
             # try to parse 'shownode -i' output
             iterInventory = (l for l in sOutput.split('\n'))
             # rotate until the start of nodes section
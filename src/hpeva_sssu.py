@@ -7,15 +7,13 @@ import pexpect
 # for XML parsing
 import bs4      # BeautifulSoup v4
 # import redis  # In-memory NoSQL DB for caching
-import pickle   # serializing/deserializing of objects to stings and files
 
 # Storage classes
 from inventoryObjects import ClassicArrayClass, ControllerClass, DiskShelfClass, DASD_Class
 # local constants
-from local import SSSU_PATH, CACHE_TIME, REDIS_ENCODING
+from local import SSSU_PATH
+from commandCache import CachedCommandRunner
 
-import sys
-sys.setrecursionlimit(5000)   # for 'pickle' module to correctly encode/decode BeautifulSoup objects
 oLog = logging.getLogger(__name__)
 
 
@@ -182,8 +180,7 @@ class HP_EVA_Class(ClassicArrayClass):
         #   - проверка наличия кэш-файлов в каталоге кэша и
         #   - либо запрос всей информации у CV и создание нового кэша
         #   - либо загрузка кэша
-        self.sRedisKeyPrefix = "pyzabbix::hpeva_sssu::" + self.sSysName + "::"
-        self.oRedisConnection = oRedisConn
+        self.oCache = CachedCommandRunner(oRedisConn, 'EVA', self.sSysName, self.oEvaConnection._sRunCommand)
         # dictionary of available queries and methods of the object
         self.dQueries = {"name": self.getName,
                          "sn": self.getSN,
@@ -198,18 +195,20 @@ class HP_EVA_Class(ClassicArrayClass):
                          "disk-names":  self.getDiskNames,
                          "ps-amount": self.getControllerShelfPSUAmount}
 
+    def __sCommand__(self, sCommand, sSeparator="\n", sClass='config'):
+        """output of a SSSU command from the cache or from the array. The output is cached
+        with lines joined by "\\n" and returned joined by sSeparator"""
+        return self.__sJoin__(self.oCache._sRun(sCommand, sClass), sSeparator)
+
+    @staticmethod
+    def __sJoin__(sOutput, sSeparator):
+        return sOutput if sSeparator == "\n" else sSeparator.join(sOutput.split("\n"))
+
     def __sFromSystem__(self, sParam):
         """returns information from 'ls system <name>' output as a *string*"""
-        REDIS_KEY = self.sRedisKeyPrefix + "__sFromSystem__::lssystem"
         sReturn = ""
         reDots = re.compile(r"{0} \.+: ".format(sParam))
-        # try to get cached version
-        try:
-            sResult = self.oRedisConnection.get(REDIS_KEY).decode(REDIS_ENCODING)
-        except AttributeError:
-            # Redis return nothing, make a request again
-            sResult = self.oEvaConnection._sRunCommand("ls system {}".format(self.sSysName), "\n")
-            self.oRedisConnection.set(REDIS_KEY, sResult.encode(REDIS_ENCODING), CACHE_TIME)
+        sResult = self.__sCommand__("ls system {}".format(self.sSysName))
         # parameter name begins with position 0 and then a space and a row of dots follows
         lsLines = [l for l in sResult.split("\n") if reDots.search(l)]
         sReturn = lsLines[0].split(':')[1].strip()
@@ -220,14 +219,8 @@ class HP_EVA_Class(ClassicArrayClass):
 
     def __lsFromControllers__(self, sParam):
         """Returns information from EVA's controllers as a *list* object"""
-        REDIS_KEY = self.sRedisKeyPrefix + "__lsFromControllers__::lscontroller"
         reDots = re.compile(r" \.+: ")
-        try:
-            sResult = self.oRedisConnection.get(REDIS_KEY).decode("utf-8")
-        except AttributeError:
-            # Redis return nothing, make a request again
-            sResult = self.oEvaConnection._sRunCommand("ls controller full", "\n")
-            self.oRedisConnection.set(REDIS_KEY, sResult, CACHE_TIME)
+        sResult = self.__sCommand__("ls controller full")
         lsLines = [l for l in sResult.split("\n") if reDots.search(l)]
         lsRet =  [l.split(':')[-1].strip() for l in lsLines]
         return lsRet
@@ -236,35 +229,22 @@ class HP_EVA_Class(ClassicArrayClass):
         """A recursive query of elements from list lParams, first going  to lParams[0], then
         lParams[1] etc. until lParams[len(lParams)-1]. The last element(s) returns
         as a list of (list of…, list of… etc.) strings"""
-        REDIS_SUFFIX = "pyzabbix::hpeva_sssu::__lsFromControllersRecursive__::lscontroller_xml::soup"
-        REDIS_KEY = self.sRedisKeyPrefix + REDIS_SUFFIX
-
-        # XXX такое чувство, что эта функция никогда не работает - в ней явные ошибки XXX
-        oSoup = bs4.BeautifulSoup(self.oRedisConnection.get(REDIS_KEY), 'xml')
-        if not oSoup:
-            sResult = self.oEvaConnection._sRunCommand("ls controller full xml", "\n")
-            self.oRedisConnection.set(REDIS_KEY, sResult, CACHE_TIME)
-            iFirstTagPos = sResult.find('<')
-            sResult = sResult[iFirstTagPos - 1:]
-            oSoup = bs4.BeautifulSoup(sResult, 'xml')
-            self.oRedisConnection.set(REDIS_KEY, oSoup.encode(REDIS_ENCODING), CACHE_TIME)
+        sResult = self.__sCommand__("ls controller full xml")
+        iFirstTagPos = sResult.find('<')
+        sResult = sResult[iFirstTagPos - 1:]
+        oSoup = bs4.BeautifulSoup(sResult, 'xml')
         return (__lRecursiveSoupQuery__(oSoup, ['object'] + lParams))
 
     def __lsFromDiskShelf__(self, sName, sParam):
         """ Tries to find some information in the 'ls diskshelf' element.
         First, the function searches in <object> element, if the parameter isn't found,
         it is searched in child elements """
-        REDIS_KEY = "{0}__lsFromDiskShelf__::lsdiskshelf_xml::{1}::soup".format(self.sRedisKeyPrefix, sName)
-        oSoup = bs4.BeautifulSoup(self.oRedisConnection.get(REDIS_KEY), 'xml')
-        if not oSoup:
-            sResult = self.oEvaConnection._sRunCommand(
-                'ls diskshelf "%s" xml' % sName, "\n")
-            lRet = []
-            # skip sResult string to first '<'
-            iFirstTagPos = sResult.find('<')
-            sResult = sResult[iFirstTagPos - 1:]
-            oSoup = bs4.BeautifulSoup(sResult, 'xml')
-            self.oRedisConnection.set(REDIS_KEY, oSoup.encode(REDIS_ENCODING), CACHE_TIME)
+        sResult = self.__sCommand__('ls diskshelf "%s" xml' % sName)
+        lRet = []
+        # skip sResult string to first '<'
+        iFirstTagPos = sResult.find('<')
+        sResult = sResult[iFirstTagPos - 1:]
+        oSoup = bs4.BeautifulSoup(sResult, 'xml')
         # now I can parse this objects by any method
         for oDiskShelf in oSoup.find_all('object', recursive=False, limit=32):
             oElem = oDiskShelf.find(sParam, recursive=False)
@@ -280,14 +260,11 @@ class HP_EVA_Class(ClassicArrayClass):
         """ Tries to find some information in the 'ls diskshelf' element.
         First, the function searches in <object> element, if the parameter isn't found,
         it is searched in child elements """
-        REDIS_KEY = self.sRedisKeyPrefix + "__lsFromDiskShelves__::lsdiskshelf_nofull"
-        try:
-            sResult = self.oRedisConnection.get(REDIS_KEY).decode(REDIS_ENCODING)
-        except AttributeError:
-            sResult = self.oEvaConnection._sRunCommand("ls diskshelf nofull", "\n")
-            self.oRedisConnection.set(REDIS_KEY, sResult.encode(REDIS_ENCODING), CACHE_TIME)
+        sResult = self.__sCommand__("ls diskshelf nofull")
         lsDE_Names = [l for l in sResult.split("\n") if l.find("Disk Enclosure") >= 0]
         oLog.debug("Disk enclosures found: %s" % ", ".join(lsDE_Names))
+        # the outputs of all the shelves in one cache lookup
+        self.oCache._Prefetch(['ls diskshelf "%s" xml' % sDE_Name for sDE_Name in lsDE_Names])
         lRet = []
         for sDE_Name in lsDE_Names:
             lRet.append(self.__lsFromDiskShelf__(sDE_Name, sParam))
@@ -299,28 +276,17 @@ class HP_EVA_Class(ClassicArrayClass):
         список элементов, отвечающих первому имени в списке, затем в каждом
         из них ищется второй и т.д, пока список не окажется пуст - из последнего
         возвращается строковое значение"""
-        REDIS_KEY = self.sRedisKeyPrefix + "__lsFromDiskShelfRecursive__::lsdiskshelf::{0}"
-        try:
-            sResult = self.oRedisConnection.get(REDIS_KEY.format("nofull")).decode(REDIS_ENCODING)
-        except AttributeError:
-            sResult = self.oEvaConnection._sRunCommand("ls diskshelf nofull", "\n")
-            self.oRedisConnection.set(REDIS_KEY.format("nofull"), sResult.encode(REDIS_ENCODING), CACHE_TIME)
+        sResult = self.__sCommand__("ls diskshelf nofull")
         lsDE_Names = [l for l in sResult.split("\n") if l.find("Disk Enclosure") >= 0]
         oLog.debug("Disk enclosures found: %s" % ", ".join(lsDE_Names))
+        oLog.debug('Querying disk shelves for %s' % ','.join(lParams))
+        dOutputs = self.oCache._dRunMany(['ls diskshelf "%s" xml' % sDE_Name for sDE_Name in lsDE_Names], 'config')
         lRet = []
-        for sDE_Name in lsDE_Names:
-            sShelfRedisKey = REDIS_KEY.format(sDE_Name)
-            try:
-                oSoup = bs4.BeautifulSoup(self.oRedisConnection.get(sShelfRedisKey), 'xml')
-            except AttributeError:
-                oLog.debug('Querying disk shelf %s for %s' % (sDE_Name, ','.join(lParams)))
-                sRes = self.oEvaConnection._sRunCommand('ls diskshelf "%s" xml' % sDE_Name, "\n")
-                # skip sResult string to first '<'
-                iFirstTagPos = sRes.find('<')
-                sRes = sRes[iFirstTagPos - 1:]
-                oSoup = bs4.BeautifulSoup(sRes, 'xml')
-                self.oRedisConnection.set(sShelfRedisKey, oSoup.encode(REDIS_ENCODING), CACHE_TIME)
-
+        for sRes in dOutputs.values():
+            # skip sResult string to first '<'
+            iFirstTagPos = sRes.find('<')
+            sRes = sRes[iFirstTagPos - 1:]
+            oSoup = bs4.BeautifulSoup(sRes, 'xml')
             oLog.debug('Serial # of disk shelf is %s' % oSoup.object.serialnumber.string)
             lFromShelf = __lRecursiveSoupQuery__(oSoup, ['object'] + lParams)
             lRet.append(lFromShelf)
@@ -344,26 +310,13 @@ class HP_EVA_Class(ClassicArrayClass):
         return(self.__sFromSystem__('systemtype'))
 
     def getControllersAmount(self):
-        REDIS_KEY = self.sRedisKeyPrefix + "lscontroller_nofull"
-        try:
-            sRes = self.oRedisConnection.get(REDIS_KEY).decode(REDIS_ENCODING)
-        except AttributeError:
-            # request information from the array
-            sRes = self.oEvaConnection._sRunCommand("ls controller nofull")
-            self.oRedisConnection.set(REDIS_KEY, sRes.encode(REDIS_ENCODING), CACHE_TIME)
+        sRes = self.__sCommand__("ls controller nofull")
         lsLines = [l for l in sRes.split("\n") if l.find('Controller') >= 0]
         iRet = len(lsLines)
         return iRet
 
     def getControllerNames(self):
-        # redis key is the same as in previous function (getControllerAmount)
-        REDIS_KEY = self.sRedisKeyPrefix + "lscontroller_nofull"
-        try:
-            sRes = self.oRedisConnection.get(REDIS_KEY).decode(REDIS_ENCODING)
-        except AttributeError:
-            # no information in cache, request information from the array
-            sRes = self.oEvaConnection._sRunCommand("ls controller nofull")
-            self.oRedisConnection.set(REDIS_KEY, sRes.encode(REDIS_ENCODING), CACHE_TIME)
+        sRes = self.__sCommand__("ls controller nofull")
         lsLines = [l.split('\\')[-1] for l in sRes.split("\n") if l.find('Controller') >= 0]
         oLog.debug("List of controller names: %s" % lsLines)
         return lsLines
@@ -374,19 +327,14 @@ class HP_EVA_Class(ClassicArrayClass):
     def getControllerShelfPSUAmount(self):
         """Power supply amount of controller shelf. Works only for arrays
         with a controller shelf (4400?)"""
-        REDIS_KEY = self.sRedisKeyPrefix + "ls_controller_enclusure"
         iRet = -1
-        try:
-            sOut = self.oRedisConnection.get(REDIS_KEY).decode(REDIS_ENCODING)
-        except AttributeError:
-            sOut = self.oEvaConnection._sRunCommand("ls controller_enclosure")
-            if sOut.find('\\Hardware\\Controller Enclosure') >= 0:
-                sOut = self.oEvaConnection._sRunCommand("ls controller_enclosure full xml", " ")
-                iFirstTagPos = sOut.find('<') - 1
-                sOut = sOut[iFirstTagPos:]
-                self.oRedisConnection.set(REDIS_KEY, sOut.encode(REDIS_ENCODING), CACHE_TIME)
-            else:
-                sOut = ''
+        sOut = self.__sCommand__("ls controller_enclosure")
+        if sOut.find('\\Hardware\\Controller Enclosure') >= 0:
+            sOut = self.__sCommand__("ls controller_enclosure full xml", " ")
+            iFirstTagPos = sOut.find('<') - 1
+            sOut = sOut[iFirstTagPos:]
+        else:
+            sOut = ''
         # The enclosure exists
         if sOut:
             oSoup = bs4.BeautifulSoup(sOut, "xml")
@@ -401,25 +349,13 @@ class HP_EVA_Class(ClassicArrayClass):
         return iRet
 
     def getDiskShelfNames(self):
-        REDIS_KEY = self.sRedisKeyPrefix + "lsdiskshelf_nofull"
-        sOut = self.oRedisConnection.get(REDIS_KEY)  # bytes sting
-        if sOut:
-            sOut = sOut.decode(REDIS_ENCODING)
-        else:
-            sOut = self.oEvaConnection._sRunCommand("ls diskshelf nofull")
-            self.oRedisConnection.set(REDIS_KEY, sOut.encode(REDIS_ENCODING), CACHE_TIME)
+        sOut = self.__sCommand__("ls diskshelf nofull")
         lsLines = [l.split('\\')[-1] for l in sOut.split("\n") if l.find('Disk Enclosure') >= 0]
         oLog.debug('list of disk shelves names: %s' % ', '.join(lsLines))
         return lsLines
 
     def getShelvesAmount(self):
-        REDIS_KEY = self.sRedisKeyPrefix + "lsdiskshelf_nofull"
-        try:
-            sRes = self.oRedisConnection.get(REDIS_KEY).decode(REDIS_ENCODING)
-        except AttributeError:
-            # request info from the array
-            sRes = self.oEvaConnection._sRunCommand("ls diskshelf nofull")
-            self.oRedisConnection.set(REDIS_KEY, sRes.encode(REDIS_ENCODING), CACHE_TIME)
+        sRes = self.__sCommand__("ls diskshelf nofull")
         lsLines = [l.split('\\')[-1] for l in sRes.split("\n") if l.find('\\Disk Enclosure') >= 0]
         return len(lsLines)
 
@@ -461,14 +397,8 @@ class HP_EVA_Class(ClassicArrayClass):
     def getDiskNames(self, bShort=True):
         """returns a list of short disk names (like 'Disk 023'). These names are
         unique on a given array"""
-        REDIS_KEY = self.sRedisKeyPrefix + "ls_disk_nofull"
-        sFromRedis = self.oRedisConnection.get(REDIS_KEY)
-        if sFromRedis:
-            lsDiskNames = pickle.loads(sFromRedis)
-        else:
-            lsDiskNames = [d for d in self.oEvaConnection._sRunCommand("ls disk nofull", "||").split("||")
-                           if d.find("\\Disk Groups\\") >= 0]
-            self.oRedisConnection.set(REDIS_KEY, pickle.dumps(lsDiskNames), CACHE_TIME)
+        lsDiskNames = [d for d in self.__sCommand__("ls disk nofull").split("\n")
+                       if d.find("\\Disk Groups\\") >= 0]
         #
         # Make a list of all drives and drive parameters and feed them to Zabbix via TCP
         # sArrayName, sZabbixIP, iZabbixPort, sZabUser, sZabPwd
@@ -482,85 +412,48 @@ class HP_EVA_Class(ClassicArrayClass):
     def __FillListOfDisks2__(self):
         """fills a list of storage array's disks in object's dictionaries
         (dDiskByID, dDiskByName, dDiskByShelfPos)"""
-        REDIS_KEY_FORMAT = self.sRedisKeyPrefix + "__FillListOfDisks__::{0}"
-        try:
-            lDiskIDs = pickle.loads(
-                self.oRedisConnection.get(REDIS_KEY_FORMAT.format("lDiskIDs")))
-            sDisksKey = REDIS_KEY_FORMAT.format("dDiskByID")
-            for sDiskID in lDiskIDs:
-                sFromRedis = self.oRedisConnection.hget(sDisksKey, sDiskID)
-                self.dDiskByID[sDiskID] = bs4.BeautifulSoup(sFromRedis, 'xml')
-            self.dDiskByName = pickle.loads(
-                self.oRedisConnection.get(REDIS_KEY_FORMAT.format("dDiskID_ByName")))
-            self.dDiskByShelfPos = pickle.loads(
-                self.oRedisConnection.get(REDIS_KEY_FORMAT.format("dDiskByShelfPos")))
-        except TypeError:
-            # TypeError: a bytes-like object is required, not 'NoneType'
-            sDisksInfo = self.oEvaConnection._sRunCommand('ls disk full xml', ' ')
-            sShelvesInfo =  self.oEvaConnection._sRunCommand('ls diskshelf full xml', ' ')
-            # одеваем получившийся XML в корневые элементы и парсим в Beautiful Soup
-            sDiskInfo = "<diskList> " + sDisksInfo + " </diskList>"
-            sShelvesInfo = "<diskEnclosuresList> " + sShelvesInfo + " </diskEnclosuresList>"
-            oDiskSoup = bs4.BeautifulSoup(sDiskInfo, 'xml')
-            oShelvesSoup =  bs4.BeautifulSoup(sShelvesInfo, 'xml')
-            # fill dictionaries disks by IDs and name
-            for oDisk in oDiskSoup.find_all(name='object'):
-                sID = str(oDisk.objecthexuid.string)
-                oLog.debug("Found a disk with ID: <{0}>".format(sID))
-                sName = str(oDisk.objectname.string)
-                self.dDiskByID[sID] = oDisk
-                self.dDiskByName[sName] = sID
-
-            # disks for shelf position
-            for oShelf in oShelvesSoup.find_all(name='object'):
-                # iterate over disk shelves
-                sShelf = str(oShelf.objectname.string)
-                for oDiskBay in oShelf.find_all('diskslot'):
-                    # iterate over disk slots
-                    sPosition = "{0}\{1}".format(sShelf, str(oDiskBay.find('name').string))
-                    sId = str(oDiskBay.diskwwn.string)
-                    if sId in self.dDiskByID:
-                        self.dDiskByShelfPos[sPosition] = sId
-                    elif sId == '0000-0000-0000-0000-0000-0000-0000-0000':
-                        # Empty slot has UID of all zeroes
-                        oLog.debug('Empty slot {}'.format(sPosition))
-                        pass
-                    else:
-                        oLog.info(
-                            "There is a slot {0} with strange disk ID {1} that is not cataloged!".format(
-                                sPosition, sId))
-
-            # a dictionary is too large for pickle module so I'll store individual
-            # elements of this dictionary and a list of keys.
-            lDiskIDs = [str(l) for l in self.dDiskByID.keys()]
-            oLog.debug("List of disk IDs: " + ','.join(lDiskIDs))
-            # debug
-            self.oRedisConnection.set(REDIS_KEY_FORMAT.format("lDiskIDs"), pickle.dumps(lDiskIDs), CACHE_TIME)
-            sKey = REDIS_KEY_FORMAT.format("dDiskByID")
-            for sID, oSoup in self.dDiskByID.items():
-                # store disk soups in a hash structure in Redis to avoid recursion depth problems
-                self.oRedisConnection.hset(sKey, sID, oSoup.encode(REDIS_ENCODING))
-            self.oRedisConnection.expire(sKey, CACHE_TIME)
-            self.oRedisConnection.set(
-                REDIS_KEY_FORMAT.format("dDiskID_ByName"),
-                pickle.dumps(self.dDiskByName), CACHE_TIME)
-            self.oRedisConnection.set(
-                REDIS_KEY_FORMAT.format("dDiskByShelfPos"),
-                pickle.dumps(self.dDiskByShelfPos), CACHE_TIME)
+        # raw outputs of both commands in one cache lookup, parsed on every fill
+        dOutputs = self.oCache._dRunMany(['ls disk full xml', 'ls diskshelf full xml'], 'config')
+        sDisksInfo = self.__sJoin__(dOutputs['ls disk full xml'], ' ')
+        sShelvesInfo = self.__sJoin__(dOutputs['ls diskshelf full xml'], ' ')
+        # одеваем получившийся XML в корневые элементы и парсим в Beautiful Soup
+        sDiskInfo = "<diskList> " + sDisksInfo + " </diskList>"
+        sShelvesInfo = "<diskEnclosuresList> " + sShelvesInfo + " </diskEnclosuresList>"
+        oDiskSoup = bs4.BeautifulSoup(sDiskInfo, 'xml')
+        oShelvesSoup =  bs4.BeautifulSoup(sShelvesInfo, 'xml')
+        # fill dictionaries disks by IDs and name
+        for oDisk in oDiskSoup.find_all(name='object'):
+            sID = str(oDisk.objecthexuid.string)
+            oLog.debug("Found a disk with ID: <{0}>".format(sID))
+            sName = str(oDisk.objectname.string)
+            self.dDiskByID[sID] = oDisk
+            self.dDiskByName[sName] = sID
+
+        # disks for shelf position
+        for oShelf in oShelvesSoup.find_all(name='object'):
+            # iterate over disk shelves
+            sShelf = str(oShelf.objectname.string)
+            for oDiskBay in oShelf.find_all('diskslot'):
+                # iterate over disk slots
+                sPosition = "{0}\{1}".format(sShelf, str(oDiskBay.find('name').string))
+                sId = str(oDiskBay.diskwwn.string)
+                if sId in self.dDiskByID:
+                    self.dDiskByShelfPos[sPosition] = sId
+                elif sId == '0000-0000-0000-0000-0000-0000-0000-0000':
+                    # Empty slot has UID of all zeroes
+                    oLog.debug('Empty slot {}'.format(sPosition))
+                    pass
+                else:
+                    oLog.info(
+                        "There is a slot {0} with strange disk ID {1} that is not cataloged!".format(
+                            sPosition, sId))
         return
 
     def __FillDiskEnclosures__(self):
         """Requests and caches disk enclosure data"""
-        REDIS_KEY = self.sRedisKeyPrefix + "ls_diskshelf_full_xml"
-        sFromRedis = self.oRedisConnection.get(REDIS_KEY)
-        if sFromRedis:
-            # data present in the cache
-            oSoup = bs4.BeautifulSoup(sFromRedis, 'xml')
-        else:
-            sXMLOut = self.oEvaConnection._sRunCommand('ls diskshelf full xml')
-            sXMLOut = '<diskShelves> ' + sXMLOut + ' </diskShelves>'
-            oSoup = bs4.BeautifulSoup(sXMLOut, "xml")
-            self.oRedisConnection.set(REDIS_KEY, oSoup.encode(REDIS_ENCODING), CACHE_TIME)
+        sXMLOut = self.__sCommand__('ls diskshelf full xml')
+        sXMLOut = '<diskShelves> ' + sXMLOut + ' </diskShelves>'
+        oSoup = bs4.BeautifulSoup(sXMLOut, "xml")
         for oShelf in oSoup.find_all(name='object'):
             sShelfName = oShelf.find('diskshelfname').string
             self.dDiskShelves[sShelfName] = EVA_DiskShelfClass(sShelfName, oShelf, self)
@@ -569,16 +462,9 @@ class HP_EVA_Class(ClassicArrayClass):
 
     def __FillControllers__(self):
         """Requests and caches EVA controllers' data"""
-        REDIS_KEY = self.sRedisKeyPrefix + "ls_controller_full_xml"
-        sFromRedis = self.oRedisConnection.get(REDIS_KEY)
-        if sFromRedis:
-            # data present in the cache
-            oSoup = bs4.BeautifulSoup(sFromRedis, 'xml')
-        else:
-            sXMLOut = self.oEvaConnection._sRunCommand('ls controller full xml')
-            sXMLOut = '<EVAControllers> ' + sXMLOut + ' </EVAControllers>'
-            oSoup = bs4.BeautifulSoup(sXMLOut, "xml")
-            self.oRedisConnection.set(REDIS_KEY, oSoup.encode(REDIS_ENCODING), CACHE_TIME)
+        sXMLOut = self.__sCommand__('ls controller full xml')
+        sXMLOut = '<EVAControllers> ' + sXMLOut + ' </EVAControllers>'
+        oSoup = bs4.BeautifulSoup(sXMLOut, "xml")
         for oCtrl in oSoup.find_all(name='object'):
             sCtrlName = oCtrl.find('controllername').string
             self.dControllers[sCtrlName] = EVA_ControllerClass(sCtrlName, oCtrl, self)
@@ -3,14 +3,14 @@
 """IBM Storwize/FlashSystem support (newer FlashSystems). Works via SSH connection to target array"""
 import logging
 import MySSH
-import json
 import itertools as it
 from redis import StrictRedis
 # import re
 from collections import OrderedDict
 import inventoryObjects as inv
 # CONSTANTS from a separate module
-from local import CACHE_TIME, REDIS_ENCODING, DEFAULT_SSH_PORT
+from local import DEFAULT_SSH_PORT
+from commandCache import CachedCommandRunner
 
 # CONSTANTS
 SEP = ','
@@ -69,7 +69,6 @@ class IBMFlashSystem(inv.ClassicArrayClass):
 
     def __init__(self, sIP, oAuth, sSysName, oRedisConn):
         super().__init__(sIP, "FlashSystem")
-        self.sRedisKeyPrefix = "pyzabbix::FlashSys::" + sSysName + "::"
         self.sSysName = sSysName
         self.sIP = sIP
         self.sSN = 'S/N not determined'
@@ -82,8 +81,7 @@ class IBMFlashSystem(inv.ClassicArrayClass):
         self.lDisks = []
         self.lControllers = []
         self.lEnclosures = []
-        self.iRedisTimeout = CACHE_TIME
-        self.oRedisConnection = oRedisConn
+        self.oCache = CachedCommandRunner(oRedisConn, 'FlashSys', sSysName)
         self.dQueries = {"name": self._sGetName,
                          "sn": self._sGetSN,
                          "model": self._sGetModel,
@@ -136,31 +134,33 @@ class IBMFlashSystem(inv.ClassicArrayClass):
             lRet.append(oDsk.dQueries['name']())
         return lRet
 
+    def __fRunner__(self, lConn):
+        """a function running commands in one SSH session, opened at the first command, for the cache"""
+        def _sRun(sCmd):
+            if not lConn:
+                try:    # connect
+                    lConn.append(MySSH.MySSHConnection(self.sIP, DEFAULT_SSH_PORT, self.oAuthData))
+                except Exception as e:
+                    oLog.error("SSH failed on login.")
+                    oLog.debug(e)
+                    raise(IBMFSException('Failed to login, terminating'))
+            return lConn[0].fsRunCmd(sCmd)
+        return _sRun
+
     def __sFromArray__(self, sCommand):
         """runs SSH command on the array, return output and caches results"""
         sRet = ''
-        sRedisKey = self.sRedisKeyPrefix + "__sFromArray__::" + sCommand
+        lConn = []
         try:
-            sRet = json.loads(self.oRedisConnection.get(sRedisKey).decode(REDIS_ENCODING))
-        except AttributeError:     # no data in Redis
-            try:    # connect
-                oConn = MySSH.MySSHConnection(self.sIP, DEFAULT_SSH_PORT, self.oAuthData)
-            except Exception as e:
-                oLog.error("SSH failed on login.")
-                oLog.debug(e)
-                raise(IBMFSException('Failed to login, terminating'))
-            try:            # run command
-                sRet = oConn.fsRunCmd(sCommand)
-                oConn.close()
-                # save results to Redis
-                self.oRedisConnection.set(sRedisKey,
-                                          json.dumps(sRet).encode(REDIS_ENCODING),
-                                          self.iRedisTimeout)
-            except Exception as e:
-                oLog.error("Error when running command by SSH.")
-                oLog.debug(e)
-            finally:
-                oConn.close()
+            sRet = self.oCache._sRun(sCommand, 'config', self.__fRunner__(lConn))
+        except IBMFSException:
+            raise
+        except Exception as e:
+            oLog.error("Error when running command by SSH.")
+            oLog.debug(e)
+        finally:
+            if lConn:
+                lConn[0].close()
         return sRet
 
     def __dsFromArray__(self, lsCommands):
@@ -169,29 +169,17 @@ class IBMFlashSystem(inv.ClassicArrayClass):
         with commands as keys and returned output as values
         """
         dData = OrderedDict({})
-        sRedisKey = self.sRedisKeyPrefix + "__dsFromArray__"
+        lConn = []
         try:
-            oConn = MySSH.MySSHConnection(self.sIP, DEFAULT_SSH_PORT, self.oAuthData)
-            for sCmd in lsCommands:
-                # first try to lookup data in Redis, next ask array itself
-                try:
-                    sData = self.oRedisConnection.hget(sRedisKey, sCmd).decode(REDIS_ENCODING)
-                except AttributeError:
-                    try:
-                        # oLog.debug('__dsFromArray__: Command to run: {}'.format(sCmd))
-                        sData = oConn.fsRunCmd(sCmd)
-                        # oLog.debug('__dsFromArray__: output: {}'.format(sData))
-                    except Exception as e:
-                        oLog.error('__dsFromArray__: failed to exec command')
-                        oLog.error('__dsFromArray__: Additional info: ' + str(e))
-                        raise IBMFSException
-                    self.oRedisConnection.hset(sRedisKey, sCmd, sData.encode(REDIS_ENCODING))
-                    self.oRedisConnection.expire(sRedisKey, self.iRedisTimeout)
-                dData[sCmd] = sData
-            oConn.close()
+            dData = self.oCache._dRunMany(lsCommands, 'config', self.__fRunner__(lConn))
         except Exception as e:
-            oLog.error('__dsFromArray__: SSH failed on login')
+            oLog.error('__dsFromArray__: SSH failed on login or command failed')
             oLog.debug('__dsFromArray__: Additional info: ' + str(e))
+            # the outputs received before the failure
+            dData = getattr(e, 'dOutputs', dData)
+        finally:
+            if lConn:
+                lConn[0].close()
         return dData
 
     def __FillArrayParams__(self):
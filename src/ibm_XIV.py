@@ -11,7 +11,8 @@ place given for this component in the system.  For example: "1:Disk:2:10".
 """
 
 import inventoryObjects as inv
-from local import XCLI_PATH, REDIS_ENCODING, CACHE_TIME 
+from local import XCLI_PATH
+from commandCache import CachedCommandRunner
 from subprocess import check_output, CalledProcessError, STDOUT
 # from redis import StrictRedis
 import csv
@@ -19,8 +20,9 @@ import os
 import logging
 
 # CONSTANTS
-REDIS_PREFIX = "pyzabbix::FlashSys::"
 FAKE_HOME = '/tmp'
+# states of all the components with one command; the component lists give composition and parameters
+HEALTH_COMMAND = 'component_list -t component_id,status,currently_functioning'
 
 
 oLog = logging.getLogger(__name__)
@@ -73,8 +75,7 @@ class XIV_Collections_Service:
             oList.oCSV = list(lCSVData)    # copy
             for dData in lCSVData:
                 sID = dData['Component ID']
-                bHealthy = dData['Currently Functioning'] == 'yes'
-                bHealthy = bHealthy and dData['Status'] == 'OK'
+                bHealthy = self.oSystem._bHealthy(sID, dData)
                 oList._AddID(sID, bHealthy)
                 if not bHealthy:
                     oLog.debug('Failed component: {}'.format(sID))
@@ -87,12 +88,11 @@ class XIV_Collections_Service:
 
 class IBM_XIV_Storage(inv.ScaleOutStorageClass):
     def __init__(self, sIP, sUser, sPass, oRedis, sName):
-        self.sRedisPrefix = REDIS_PREFIX + "XIV::" + sName + "::"
         self.sIP = sIP
         self.sSysName = sName
         self.sUser = sUser
         self.sPass = sPass
-        self.oRedisDB = oRedis
+        self.oCache = CachedCommandRunner(oRedis, 'XIV', sName, self.__sXCLI__)
         self.oFillSvc = XIV_Collections_Service(self)
         self.oNodesList = IBM_XIV_NodesList(self)
         self.oDisksList = IBM_XIV_DisksList(self)
@@ -105,9 +105,14 @@ class IBM_XIV_Storage(inv.ScaleOutStorageClass):
         self.oNICs = IBM_XIV_NICsList(self)
         self.oFCs = IBM_XIV_FCPortsList(self)
         # fill in the data from an array
-        for oList in [self.oNodesList, self.oDisksList, self.oCFList,
-                      self.oDIMMs, self.oPSUs, self.oUPSs, self.oSwitches,
-                      self.oMMs, self.oNICs, self.oFCs]:
+        loLists = [self.oNodesList, self.oDisksList, self.oCFList,
+                   self.oDIMMs, self.oPSUs, self.oUPSs, self.oSwitches,
+                   self.oMMs, self.oNICs, self.oFCs]
+        # the cached outputs of all the lists in one round trip
+        self.oCache._Prefetch([o.sMyListCommand for o in loLists if hasattr(o, 'sMyListCommand')] +
+                              [HEALTH_COMMAND])
+        self.dHealth = self._dGetHealth()
+        for oList in loLists:
             self.oFillSvc._FillList(oList)
         self.dQueries = {"name": lambda: self.sSysName,
                          "node-names":   self.oNodesList._lsListNames,
@@ -124,31 +129,45 @@ class IBM_XIV_Storage(inv.ScaleOutStorageClass):
                          }
         return
 
-    def _lsRunCommand(self, sCmd):
-        """runs a command, caches output in Redis"""
-        sRedisKey = self.sRedisPrefix + sCmd
+    def __sXCLI__(self, sCmd):
+        """runs a command by XCLI, returns output.  Credentials are passed in the environment of
+        the child process only: collectors of several arrays run in parallel threads"""
+        dEnv = dict(os.environ, HOME=FAKE_HOME)
+        if self.sUser:
+            dEnv['XIV_XCLIUSER'] = self.sUser
+            dEnv['XIV_XCLIPASSWORD'] = self.sPass
+        lCommand = [XCLI_PATH, '-y', '-s', '-m', self.sIP] + sCmd.split()
+        # oLog.debug('Will run: {}'.format('_'.join(lCommand)))
+        return check_output(lCommand, stderr=STDOUT, universal_newlines=True, shell=False, env=dEnv)
+
+    def _lsRunCommand(self, sCmd, sClass='config'):
+        """runs a command, caches output in Redis for the TTL of class sClass (local.COMMAND_TTL_CLASSES)"""
         try:
-            sLine = self.oRedisDB.get(sRedisKey).decode(REDIS_ENCODING)
-            # oLog.debug('_lsRunCommand: Data from Redis')
-        except AttributeError:
-            # no line in Redis
-            try:
-                if self.sUser:
-                    os.environ['XIV_XCLIUSER'] = self.sUser
-                    os.environ['XIV_XCLIPASSWORD'] = self.sPass
-                os.environ['HOME'] = FAKE_HOME
-                lCommand = [XCLI_PATH, '-y', '-s', '-m', self.sIP] + sCmd.split()
-                # oLog.debug('Will run: {}'.format('_'.join(lCommand)))
-                sLine = check_output(lCommand, stderr=STDOUT, universal_newlines=True, shell=False)
-                # DBG
-                self.oRedisDB.set(sRedisKey, sLine.encode(REDIS_ENCODING), CACHE_TIME)
-            except CalledProcessError as e:
-                sLine = e.output
-                oLog.error('Non-zero return code from XCli!')
-                oLog.debug('Failed command output from {}: \n'.format(' '.join(lCommand)) + sLine)
+            sLine = self.oCache._sRun(sCmd, sClass)
+        except CalledProcessError as e:
+            sLine = e.output
+            oLog.error('Non-zero return code from XCli!')
+            oLog.debug('Failed command output from {}: \n'.format(' '.join(e.cmd)) + sLine)
         lRet = sLine.split('\n')
         return lRet
 
+    def _dGetHealth(self):
+        """states of the components: {component ID: healthy}, empty if XCLI didn't answer"""
+        dRet = {}
+        for dData in csv.DictReader(self._lsRunCommand(HEALTH_COMMAND, 'health'), delimiter=',', quotechar='"'):
+            try:
+                dRet[dData['Component ID']] = (dData['Currently Functioning'] == 'yes' and dData['Status'] == 'OK')
+            except KeyError:
+                oLog.error('Unexpected output of ' + HEALTH_COMMAND)
+                return {}
+        return dRet
+
+    def _bHealthy(self, sID, dData):
+        """state of component sID from the health command, from its list's data dData if it isn't there"""
+        if sID in self.dHealth:
+            return self.dHealth[sID]
+        return dData['Currently Functioning'] == 'yes' and dData['Status'] == 'OK'
+
     def _ldGetInfoDict(self, sParamName):
         """returns a list of information dictionaries corresponding to parameter. For example,
         if sParamName is 'node-names', returns a result of _ldGetNodeNames() function. So, this
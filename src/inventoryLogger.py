@@ -1,92 +1,94 @@
 #!/usr/bin/env python3
 import sys
-import logging
-import logging.config
-import yaml
 
 #
-# Logging configuration. You can modify this code as you need
-dLoggingConfig = yaml.load("""
-    version: 1
-    formatters:
-        simple:
-            format: '%(asctime)s: %(name)s - %(levelname)s - %(message)s'
-        brief:
-            format: '%(name)s:  %(levelname)s - %(message)s'
-    handlers:
-      console:
-        class : logging.StreamHandler
-        formatter: brief
-        level   : WARNING
-        stream  : ext://sys.stderr
-      logfile:
-        class : logging.handlers.RotatingFileHandler
-        formatter: simple
-        encoding: utf8
-        level: DEBUG
-        filename: /tmp/zabinventory.log
-        # Max log file size: 10 MB, then the file will be rotated
-        maxBytes: 10485760
-        backupCount: 12 
-    root:
-        level: INFO
-        handlers: [console, logfile ]
-    loggers:
-        __main__:
-            level: INFO
-            handlers: [console, logfile]
-        hp3Par:
-            level: INFO
-            handlers: [console, logfile]
-        hpeva_sssu:
-            level: INFO
-            handlers: [console, logfile]
-        ibm_FlashSystem_SW:
-            level: INFO
-            handlers: [console, logfile]
-        ibm_FAStT:
-            level: INFO
-            handlers: [console, logfile]
-        zabbixInterface:
-            level: INFO
-            handlers: [console, logfile]
-        Discovery:
-            level: INFO
-            handlers: [console, logfile]
-        Srv.Discovery:
-            level: DEBUG
-            handlers: [console, logfile]
-        Servers_Feed_Data:
-            level: DEBUG
-            handlers: [console, logfile]
-        ibm_Power_AIX:
-            level: INFO
-            handlers: [console, logfile]
-        ibm_BladeCenter_AMM:
-            level: INFO
-            handlers: [console, logfile]
-        FeedData:
-            level: INFO
-            handlers: [console, logfile]
-        MySSH:
-            level: INFO
-            handlers: [console, logfile]
-        WBEM_vmware:
-            level: INFO
-            hadnlers: [console, logfile]
-        IPMIhost:
-            level: DEBUG
-            handlers: [console, logfile]
-        ESXi_WBEM_host:
-            level: DEBUG
-            hadnlers: [console, logfile]
-        serversDisk:
-            level: DEBUG
-            handlers: [console, logfile]
-    """)
+# Logging configuration. You can modify this code as you need.
+# A plain dict: parsing of YAML took a noticeable part of the start time of short programs
+LOG_HANDLERS = ['console', 'logfile']
+dLoggingConfig = {
+    'version': 1,
+    'formatters': {
+        'simple': {'format': '%(asctime)s: %(name)s - %(levelname)s - %(message)s'},
+        'brief': {'format': '%(name)s:  %(levelname)s - %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler',
+                    'formatter': 'brief',
+                    'level': 'WARNING',
+                    'stream': 'ext://sys.stderr'},
+        'logfile': {'class': 'logging.handlers.RotatingFileHandler',
+                    'formatter': 'simple',
+                    'encoding': 'utf8',
+                    'level': 'DEBUG',
+                    'filename': '/tmp/zabinventory.log',
+                    # Max log file size: 10 MB, then the file will be rotated
+                    'maxBytes': 10485760,
+                    'backupCount': 12},
+    },
+    'root': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+    'loggers': {
+        '__main__': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'hp3Par': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'hpeva_sssu': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'ibm_FlashSystem_SW': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'ibm_FAStT': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'zabbixInterface': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'Discovery': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'DiscoveryServer': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'Srv.Discovery': {'level': 'DEBUG', 'handlers': LOG_HANDLERS},
+        'Servers_Feed_Data': {'level': 'DEBUG', 'handlers': LOG_HANDLERS},
+        'ibm_Power_AIX': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'ibm_BladeCenter_AMM': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'FeedData': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'MySSH': {'level': 'INFO', 'handlers': LOG_HANDLERS},
+        'WBEM_vmware': {'level': 'INFO'},
+        'IPMIhost': {'level': 'DEBUG', 'handlers': LOG_HANDLERS},
+        'ESXi_WBEM_host': {'level': 'DEBUG'},
+        'serversDisk': {'level': 'DEBUG', 'handlers': LOG_HANDLERS},
+    },
+}
+
+
+class LazyLogger:
+    """
+    Logger of short programs started by Zabbix for every LLD rule (discovery-info.py etc.):
+    neither 'logging' is imported nor the log file is opened until a warning or an error comes,
+    the messages of lower levels before that are dropped
+    """
+    def __init__(self, sName):
+        self.sName = sName
+        self.oLog = None
+        return
+
+    def _oLogger(self):
+        if self.oLog is None:
+            import logging.config
+            logging.config.dictConfig(dLoggingConfig)
+            self.oLog = logging.getLogger(self.sName)
+        return self.oLog
+
+    def debug(self, *args, **kwargs):
+        if self.oLog is not None:
+            self.oLog.debug(*args, **kwargs)
+        return
+
+    def info(self, *args, **kwargs):
+        if self.oLog is not None:
+            self.oLog.info(*args, **kwargs)
+        return
+
+    def warning(self, *args, **kwargs):
+        self._oLogger().warning(*args, **kwargs)
+        return
+
+    def error(self, *args, **kwargs):
+        self._oLogger().error(*args, **kwargs)
+        return
 
 
 if __name__ == "__main__":
+    import logging
+    import logging.config
     print("This is a library, not an executable!")
     # test me
     logging.config.dictConfig(dLoggingConfig)
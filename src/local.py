@@ -8,3 +8,78 @@ XCLI_PATH = "/opt/xcli/xcli"
 IPMI_TOOL = '/usr/bin/ipmitool'
 # Время, по истечении которого срабатывает триггер недоступности данных, по умолчанию.
 NODATA_THRESHOLD = 48
+# Период (ч) nodata-триггеров, для которых период не задан явно (самый короткий из используемых)
+NODATA_PERIOD = 24
+# Буферизация отправки данных в Zabbix (trapper): метрик в одном пакете и
+# максимальное время (сек) хранения метрики в буфере до отправки
+SENDER_CHUNK_SIZE = 250
+SENDER_MAX_DELAY = 60
+# Таймаут (сек) HTTP-запросов к Zabbix API
+ZABBIX_API_TIMEOUT = 60
+# Время жизни (сек) кэша метаданных Zabbix (узлы, приложения, элементы, триггеры) в Redis
+META_CACHE_TTL = 86400
+# Режим отправки только изменившихся значений: неизменные значения всё равно
+# отправляются раз в DELTA_HEARTBEAT часов. Должно быть меньше самого короткого
+# периода nodata-триггеров (NODATA_PERIOD, а не NODATA_THRESHOLD) и больше интервала запуска
+DELTA_HEARTBEAT = 12
+# Максимальное число одновременных запросов (и соединений) асинхронного клиента Zabbix API
+ASYNC_API_MAX_REQUESTS = 16
+# Низкоуровневое обнаружение (LLD): время хранения необнаруженных элементов.
+# Формат Zabbix 3.4+ ('30d'), для Zabbix 3.0 -- число дней ('30')
+LLD_LIFETIME = '30d'
+# Протокол Zabbix trapper: сжатие пакетов zlib (только Zabbix 4.0+, для более
+# старых серверов -- False), минимальный размер (байт) сжимаемых данных и таймаут (сек)
+SENDER_COMPRESSION = True
+SENDER_COMPRESS_MIN = 1024
+SENDER_TIMEOUT = 60
+# Асинхронная отправка (feed-data.py, servers-feed-data.py -a): максимальное число
+# одновременно отправляемых пакетов (соединений) на один Zabbix-сервер
+SENDER_ASYNC_CONNECTIONS = 4
+# Ограничение нагрузки на Zabbix frontend по URL Zabbix API ('default' -- для остальных):
+# запросов в секунду и размер пачки (token bucket), пределы окна одновременных запросов,
+# целевая задержка ответа (сек) и допустимая доля ошибок, при превышении которых окно уменьшается вдвое
+ZABBIX_API_LIMITS = {
+    'default': {'rate': 50.0, 'burst': 100, 'min_window': 1, 'max_window': 16,
+                'target_latency': 2.0, 'max_error_rate': 0.1},
+}
+# Параллельный сбор данных с массивов (feed-data.py -w): максимальное число одновременных
+# сессий по типу драйвера; для типов из ARRAY_CAP_PER_MGMT_SERVER -- на один сервер управления
+# (EVA: одна сессия SSSU на сервер Command View)
+ARRAY_DRIVER_CAPS = {'EVA': 1, '3Par': 8, 'IBM_DS': 4, 'FlashSys': 4, 'XIV': 4}
+ARRAY_CAP_PER_MGMT_SERVER = ('EVA',)
+# Размер очереди (записей о компонентах массивов) между сбором данных и отправкой
+# в Zabbix (feed-data.py -p); при заполнении очереди сбор данных приостанавливается
+PIPELINE_QUEUE_SIZE = 64
+# Режим демона (feed-data.py, servers-feed-data.py -D): период опроса каждого устройства (сек),
+# случайный сдвиг времени опроса (доля периода) и максимальное время (сек) повторного
+# использования объектов массивов с открытыми сессиями (SSSU, SSH) между опросами
+DAEMON_INTERVAL = 3600
+DAEMON_JITTER = 0.1
+DEVICE_SESSION_MAX_AGE = CACHE_TIME
+# Периоды обновления (сек) классов компонентов по типу устройства ('default' -- для остальных
+# типов и классов): параметры массива ('system') и шасси меняются редко, диски -- при замене.
+# Класс 'server' -- все данные сервера (собираются за один проход). 0 -- при каждом запуске.
+# Периоды больше NODATA_THRESHOLD/2 уменьшаются, чтобы не срабатывали nodata-триггеры
+REFRESH_INTERVALS = {
+    'default': {'system': 43200, 'controllers': 43200, 'shelves': 43200, 'nodes': 43200, 'switches': 43200,
+                'disks': 14400, 'dimms': 14400, 'cf': 14400, 'ups': 3600, 'server': 14400},
+    # у EVA число блоков питания -- параметр массива
+    'EVA': {'system': 3600},
+}
+# Сервер запросов обнаружения (discovery-server.py): UNIX-сокет, права доступа к нему и период (сек)
+# полной перезагрузки данных из Redis (изменения приходят по подписке, перезагрузка -- на случай потерь)
+DISCOVERY_SOCKET = '/tmp/zabinventory-discovery.sock'
+DISCOVERY_SOCKET_MODE = 0o660
+DISCOVERY_RELOAD = 600
+# Кэш вывода команд устройств (commandCache): время жизни (сек) по классу команды.
+# 'config' -- состав и параметры массива, меняются при замене оборудования: не дольше самого короткого
+# периода обновления компонентов в REFRESH_INTERVALS (диски -- 4 часа);
+# 'health' -- состояние компонентов: намного меньше периодов REFRESH_INTERVALS, чтобы каждое
+# обновление видело свежее состояние
+COMMAND_TTL_CLASSES = {'default': CACHE_TIME, 'config': 4 * CACHE_TIME, 'health': CACHE_TIME // 6}
+# Сжатие вывода команд в кэше (commandCache): алгоритм -- 'zlib', 'lz4' или 'zstd' (если установлены
+# модули lz4, zstandard), None -- без сжатия; сжимаются значения не короче CACHE_COMPRESS_MIN байт
+CACHE_COMPRESSION = 'zlib'
+CACHE_COMPRESS_MIN = 1024
+# уровень zlib: 1 -- вдвое быстрее 6 при сжатии XML EVA до 14% вместо 11% (cache-benchmark.py)
+CACHE_ZLIB_LEVEL = 1
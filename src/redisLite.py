@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal Redis client (RESP2 protocol over a socket) for short-lived programs started by Zabbix
+for every LLD rule of every host (discovery-info.py, servers_discovery.py): importing redis-py
+takes longer than the whole run of such a program.  Only the commands these programs need are
+implemented, with redis-py names, arguments and return values (bytes, int, None).
+Long-running programs use redis-py (redis_utils)
+"""
+
+# the C module: socket.py makes enums of all the socket constants at import, it takes a few ms
+import _socket
+
+REDIS_TIMEOUT = 10.0    # sec
+RECV_SIZE = 65536
+
+
+class RedisError(Exception):
+    pass
+
+
+class ResponseError(RedisError):
+    pass
+
+
+def _bEncode(oValue):
+    if isinstance(oValue, bytes):
+        return oValue
+    return str(oValue).encode('utf-8')
+
+
+def _dPairs(lValues):
+    """HGETALL reply -> {field: value}"""
+    return dict(zip(lValues[::2], lValues[1::2]))
+
+
+class _Commands:
+    """Redis commands, _oCommand() executes or queues a command"""
+    def ping(self):
+        return self._oCommand(None, 'PING')
+
+    def get(self, sKey):
+        return self._oCommand(None, 'GET', sKey)
+
+    def set(self, sKey, oValue, ex=None):
+        if ex is None:
+            return self._oCommand(None, 'SET', sKey, oValue)
+        return self._oCommand(None, 'SET', sKey, oValue, 'EX', ex)
+
+    def hget(self, sKey, sField):
+        return self._oCommand(None, 'HGET', sKey, sField)
+
+    def hset(self, sKey, sField, oValue):
+        return self._oCommand(None, 'HSET', sKey, sField, oValue)
+
+    def hgetall(self, sKey):
+        return self._oCommand(_dPairs, 'HGETALL', sKey)
+
+    def hexists(self, sKey, sField):
+        return self._oCommand(bool, 'HEXISTS', sKey, sField)
+
+    def exists(self, *lsKeys):
+        return self._oCommand(None, 'EXISTS', *lsKeys)
+
+    def expire(self, sKey, iTime):
+        return self._oCommand(None, 'EXPIRE', sKey, iTime)
+
+
+class LiteRedis(_Commands):
+    """One connection to Redis, commands are executed at once"""
+    def __init__(self, host='localhost', port=6379, unix_socket_path=None, timeout=REDIS_TIMEOUT):
+        self.bBuffer = bytearray()      # received data not parsed yet
+        try:
+            if unix_socket_path:
+                ltAddresses = [(_socket.AF_UNIX, unix_socket_path)]
+            else:
+                if host.isascii():
+                    # a str host name is encoded by the 'idna' codec, its import (with re) takes ~10 ms
+                    host = host.encode('ascii')
+                ltAddresses = [(t[0], t[4]) for t in _socket.getaddrinfo(host, port, 0, _socket.SOCK_STREAM)]
+            for iFamily, tAddress in ltAddresses:
+                self.oSocket = _socket.socket(iFamily, _socket.SOCK_STREAM)
+                self.oSocket.settimeout(timeout)
+                try:
+                    self.oSocket.connect(tAddress)
+                    break
+                except OSError:
+                    self.oSocket.close()
+                    if tAddress == ltAddresses[-1][1]:
+                        raise
+        except OSError as e:
+            raise RedisError('Cannot connect to Redis: {}'.format(e))
+        return
+
+    def _Receive(self):
+        try:
+            bData = self.oSocket.recv(RECV_SIZE)
+        except OSError as e:
+            raise RedisError('Cannot read from Redis: {}'.format(e))
+        if not bData:
+            raise RedisError('Connection to Redis is closed')
+        self.bBuffer += bData
+        return
+
+    def _bReadLine(self):
+        """a line without CRLF"""
+        iEnd = self.bBuffer.find(b'\r\n')
+        while iEnd < 0:
+            self._Receive()
+            iEnd = self.bBuffer.find(b'\r\n')
+        bRet = bytes(self.bBuffer[:iEnd])
+        del self.bBuffer[:iEnd + 2]
+        return bRet
+
+    def _bRead(self, iLen):
+        """iLen bytes and CRLF after them"""
+        while len(self.bBuffer) < iLen + 2:
+            self._Receive()
+        bRet = bytes(self.bBuffer[:iLen])
+        del self.bBuffer[:iLen + 2]
+        return bRet
+
+    def _Send(self, llArgs):
+        """send commands in one packet"""
+        lParts = []
+        for lArgs in llArgs:
+            lParts.append(b'*%d\r\n' % len(lArgs))
+            for oArg in lArgs:
+                bArg = _bEncode(oArg)
+                lParts.append(b'$%d\r\n%s\r\n' % (len(bArg), bArg))
+        try:
+            self.oSocket.sendall(b''.join(lParts))
+        except OSError as e:
+            raise RedisError('Cannot send to Redis: {}'.format(e))
+        return
+
+    def _oReply(self):
+        """read one reply, errors are returned as ResponseError objects"""
+        bLine = self._bReadLine()
+        bType, bData = bLine[:1], bLine[1:]
+        if bType == b'+':
+            return bData
+        elif bType == b'-':
+            return ResponseError(bData.decode('utf-8', 'replace'))
+        elif bType == b':':
+            return int(bData)
+        elif bType == b'$':
+            iLen = int(bData)
+            if iLen < 0:
+                return None
+            return self._bRead(iLen)
+        elif bType == b'*':
+            iLen = int(bData)
+            if iLen < 0:
+                return None
+            return [self._oReply() for i in range(iLen)]
+        raise RedisError('Protocol error, reply {!r}'.format(bLine))
+
+    def _oCommand(self, fParse, *lArgs):
+        self._Send([lArgs])
+        oRet = self._oReply()
+        if isinstance(oRet, ResponseError):
+            raise oRet
+        return fParse(oRet) if fParse else oRet
+
+    def pipeline(self, transaction=True):
+        return LitePipeline(self, transaction)
+
+    def close(self):
+        self.oSocket.close()
+        return
+
+
+class LitePipeline(_Commands):
+    """commands sent in one round trip by execute(), transaction=True: in MULTI/EXEC"""
+    def __init__(self, oRedis, transaction=True):
+        self.oRedis = oRedis
+        self.bTransaction = transaction
+        self.lCommands = []     # (parser of reply, arguments)
+        return
+
+    def _oCommand(self, fParse, *lArgs):
+        self.lCommands.append((fParse, lArgs))
+        return self
+
+    def execute(self):
+        """list of replies of the queued commands"""
+        llArgs = [lArgs for fParse, lArgs in self.lCommands]
+        if self.bTransaction:
+            llArgs = [('MULTI',)] + llArgs + [('EXEC',)]
+        self.oRedis._Send(llArgs)
+        lReplies = [self.oRedis._oReply() for lArgs in llArgs]
+        if self.bTransaction:
+            for oReply in lReplies[:-1]:
+                if isinstance(oReply, ResponseError):
+                    raise oReply
+            lReplies = lReplies[-1]
+            if isinstance(lReplies, ResponseError):
+                raise lReplies
+            if lReplies is None:
+                raise RedisError('Transaction is aborted')
+        lRet = []
+        for (fParse, lArgs), oReply in zip(self.lCommands, lReplies):
+            if isinstance(oReply, ResponseError):
+                raise oReply
+            lRet.append(fParse(oReply) if fParse else oReply)
+        self.lCommands = []
+        return lRet
+
+
+def _oConnect2Redis(sConnInfo):
+    """
+    connect to Redis DB, like redis_utils._oConnect2Redis.
+    sConnInfo: 'host:port' or '/path/to/socket'
+    """
+    if sConnInfo[0] == '/':
+        return LiteRedis(unix_socket_path=sConnInfo)
+    sHost, _, sPort = sConnInfo.partition(':')
+    if not sPort.isnumeric():
+        raise RedisError('Invalid Redis connection parameters: {}'.format(sConnInfo))
+    return LiteRedis(host=sHost, port=int(sPort))
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -47,3 +47,61 @@ def _oConnect2Redis(sConnInfo):
         oRedis = redis.StrictRedis(host=sHost, port=iPort)
         oRedis.ping()
     return oRedis
+
+
+def _oPipeline(oRedis, bTransaction=False):
+    """
+    Pipeline of Redis commands sent in one round trip by execute().
+    bTransaction: wrap the commands in MULTI/EXEC, other clients never see a half-done change
+    """
+    return oRedis.pipeline(transaction=bTransaction)
+
+
+def _dHashGetMany(oRedis, sKey, lsFields):
+    """{field: value or None} of hash fields, one round trip"""
+    lsFields = list(lsFields)
+    if not lsFields:
+        return {}
+    return dict(zip(lsFields, oRedis.hmget(sKey, lsFields)))
+
+
+def _HashSetMany(oPipe, sKey, dFields, iTTL=None):
+    """queue setting of hash fields (and TTL of the hash) to a pipeline"""
+    for sField, oValue in dFields.items():
+        oPipe.hset(sKey, sField, oValue)
+    if iTTL is not None:
+        oPipe.expire(sKey, iTTL)
+    return oPipe
+
+
+def _StoreHash(oRedis, sKey, dFields, iTTL=None, bTransaction=False):
+    """set hash fields and TTL of the hash, one round trip"""
+    if not dFields:
+        return
+    _HashSetMany(_oPipeline(oRedis, bTransaction), sKey, dFields, iTTL).execute()
+    return
+
+
+def _PublishSnapshot(oRedis, sKey, dFields, sIndexHash, sName, iTTL, sOldKey=None, sChannel=None):
+    """
+    Replace hash sKey by a new version atomically: the new hash is built under a staging key and
+    RENAMEd over the old one in one MULTI/EXEC together with the index entry sIndexHash[sName] = sKey.
+    Readers see the old or the new version, never a half-written hash; the old version is freed at once,
+    so one copy per name stays in Redis.  sOldKey: a previous key of the name (random-suffix keys of
+    older versions), deleted in the same transaction.  sChannel: the name is PUBLISHed to the channel
+    after the change (subscribers like discovery-server.py reload the snapshot)
+    """
+    sStaging = sKey + '.staging'
+    oPipe = _oPipeline(oRedis, bTransaction=True)
+    oPipe.delete(sStaging)
+    _HashSetMany(oPipe, sStaging, dFields)
+    oPipe.rename(sStaging, sKey)
+    oPipe.expire(sKey, iTTL)
+    oPipe.hset(sIndexHash, sName, sKey)
+    oPipe.expire(sIndexHash, iTTL)
+    if sOldKey and sOldKey != sKey:
+        oPipe.delete(sOldKey)
+    if sChannel:
+        oPipe.publish(sChannel, sName)
+    oPipe.execute()
+    return
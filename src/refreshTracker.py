@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Refresh intervals of device component classes.  Intervals are declared per class and
+device type in local.REFRESH_INTERVALS, times of the last refresh of every class are
+kept in Redis, so feeders (cron runs or the daemon) run device commands only for the
+classes that are due.
+"""
+
+from logging import getLogger
+from local import REFRESH_INTERVALS, NODATA_THRESHOLD, NODATA_PERIOD, REDIS_ENCODING
+from redis_utils import _StoreHash
+import threading
+import time
+
+oLog = getLogger(__name__)
+
+# values must come more often than the shortest 'nodata' triggers fire
+MAX_INTERVAL = min(NODATA_THRESHOLD, NODATA_PERIOD) * 3600 // 2
+# (device type, class) with too long intervals, they are reported once
+stWarned = set()
+
+
+class RefreshTracker:
+    """Last refresh times of devices' component classes in Redis hashes '<prefix>LastRefresh.<device>'"""
+    def __init__(self, oRedis, sPrefix, bForce=False):
+        self.oRedis = oRedis
+        self.sPrefix = sPrefix + 'LastRefresh.'
+        self.bForce = bForce        # refresh all the classes, only remember the times
+        self.dStats = {'due': 0, 'skipped': 0}
+        self.ddPending = {}         # device -> {class: refresh time} not stored yet
+        self.oLock = threading.Lock()
+        return
+
+    @staticmethod
+    def _iInterval(sDevType, sClass):
+        """refresh interval (sec) of a component class on a device type, 0: every run"""
+        iRet = REFRESH_INTERVALS.get(sDevType, {}).get(sClass, REFRESH_INTERVALS['default'].get(sClass, 0))
+        if iRet > MAX_INTERVAL:
+            if (sDevType, sClass) not in stWarned:
+                stWarned.add((sDevType, sClass))
+                oLog.warning('Refresh interval {}s of {} on {} is longer than {}s (half of the nodata period), reduced'.format(
+                    iRet, sClass, sDevType, MAX_INTERVAL))
+            iRet = MAX_INTERVAL
+        return iRet
+
+    def _dLast(self, sDevice):
+        """{component class: time of the last refresh} of a device"""
+        try:
+            return {b.decode(REDIS_ENCODING): float(v) for b, v in self.oRedis.hgetall(self.sPrefix + sDevice).items()}
+        except Exception as e:
+            oLog.error('Cannot read refresh times of {}: {}'.format(sDevice, e))
+            return {}
+
+    def _bDue(self, sDevType, sClass, dLast):
+        """the class must be refreshed now, dLast is the result of _dLast()"""
+        iInterval = self._iInterval(sDevType, sClass)
+        # a little earlier than the interval: runs are not exactly periodic
+        bRet = self.bForce or time.time() - dLast.get(sClass, 0) >= iInterval * 0.95
+        self.dStats['due' if bRet else 'skipped'] += 1
+        return bRet
+
+    def _Done(self, sDevice, sClass, fTime):
+        """remember the refresh of a class (fTime: when the data was collected), stored by _Commit()"""
+        with self.oLock:
+            self.ddPending.setdefault(sDevice, {})[sClass] = fTime
+        return
+
+    def _Commit(self, sDevice):
+        """store the refresh times of a device, one round trip"""
+        with self.oLock:
+            dTimes = self.ddPending.pop(sDevice, {})
+        try:
+            _StoreHash(self.oRedis, self.sPrefix + sDevice, dTimes, 2 * MAX_INTERVAL)
+        except Exception as e:
+            oLog.error('Cannot store refresh times of {}: {}'.format(sDevice, e))
+        return
+
+    def __repr__(self):
+        return "Refresh tracker {0}*, {1}stats {2}".format(
+            self.sPrefix, 'all classes are refreshed, ' if self.bForce else '', self.dStats)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scheduler of the feeders' daemon mode.  Every device is polled once per interval at
+its own time: first polls are spread evenly over the interval and every next poll
+gets a random jitter, so the load on devices, Redis and Zabbix is flat instead of
+a spike at the cron minute.  SIGHUP reloads the device list, SIGTERM/SIGINT stop
+the daemon after the current poll.
+"""
+
+from logging import getLogger
+from local import DAEMON_JITTER
+import threading
+import random
+import signal
+import time
+
+oLog = getLogger(__name__)
+
+MIN_SLEEP = 1.0     # don't wake up more often than this (sec) when nothing is due
+
+
+class DeviceScheduler:
+    """Per-device poll times of a long-running feeder"""
+    def __init__(self, iInterval, fJitter=DAEMON_JITTER):
+        self.iInterval = iInterval
+        self.fJitter = fJitter
+        self.dNext = {}             # device name -> time of next poll (time.monotonic())
+        self.dDevices = {}          # device name -> access parameters
+        self.oWakeup = threading.Event()
+        self.bReload = False
+        self.bStop = False
+        self.dStats = {'cycles': 0, 'polls': 0, 'reloads': 0, 'late_sec': 0.0}
+        return
+
+    def _Update(self, dDevices):
+        """new device list: new devices are spread over the interval, removed ones are forgotten.
+        Returns (added, removed, changed) lists of device names"""
+        fNow = time.monotonic()
+        lsAdded = sorted(set(dDevices) - set(self.dDevices))
+        lsRemoved = sorted(set(self.dDevices) - set(dDevices))
+        lsChanged = sorted(s for s in set(dDevices) & set(self.dDevices) if dDevices[s] != self.dDevices[s])
+        for sName in lsRemoved:
+            del self.dNext[sName]
+        for sName in lsAdded:
+            self.dNext[sName] = fNow + random.uniform(0, self.iInterval)
+        for sName in lsChanged:
+            # access parameters are changed: poll soon
+            self.dNext[sName] = min(self.dNext[sName], fNow + random.uniform(0, MIN_SLEEP * 10))
+        self.dDevices = dict(dDevices)
+        oLog.info('Scheduler: {} devices, added {}, removed {}, changed {}'.format(
+            len(self.dDevices), lsAdded, lsRemoved, lsChanged))
+        return (lsAdded, lsRemoved, lsChanged)
+
+    def _dDue(self):
+        """devices to poll now {name: parameters}, their next polls are scheduled"""
+        fNow = time.monotonic()
+        dRet = {}
+        for sName, fTime in self.dNext.items():
+            if fTime <= fNow:
+                dRet[sName] = self.dDevices[sName]
+                self.dStats['late_sec'] += fNow - fTime
+                # keep the device's phase, but don't try to catch up missed polls
+                fNext = max(fTime + self.iInterval, fNow + self.iInterval / 2)
+                self.dNext[sName] = fNext + random.uniform(-self.fJitter, self.fJitter) * self.iInterval
+        self.dStats['polls'] += len(dRet)
+        return dRet
+
+    def _fUntilNext(self):
+        if not self.dNext:
+            return float(self.iInterval)
+        return max(MIN_SLEEP, min(self.dNext.values()) - time.monotonic())
+
+    def _RequestReload(self, *args):
+        """signal handler: reload the device list before the next poll"""
+        self.bReload = True
+        self.oWakeup.set()
+        return
+
+    def _Stop(self, *args):
+        """signal handler: stop after the current poll"""
+        self.bStop = True
+        self.oWakeup.set()
+        return
+
+    def _InstallSignals(self):
+        signal.signal(signal.SIGHUP, self._RequestReload)
+        signal.signal(signal.SIGTERM, self._Stop)
+        signal.signal(signal.SIGINT, self._Stop)
+        return
+
+    def _Run(self, fLoadDevices, fPoll):
+        """
+        Main loop of a daemon.  fLoadDevices() returns {device name: access parameters},
+        it is called at start and on SIGHUP.  fPoll(dDevices) collects data of the due devices
+        """
+        self._InstallSignals()
+        self._Update(fLoadDevices())
+        while not self.bStop:
+            if self.bReload:
+                self.bReload = False
+                self.dStats['reloads'] += 1
+                oLog.info('Scheduler: reloading the device list')
+                try:
+                    self._Update(fLoadDevices())
+                except Exception as e:
+                    oLog.error('Scheduler: cannot reload the device list, the old one is used: {}'.format(e))
+            dDue = self._dDue()
+            if dDue:
+                self.dStats['cycles'] += 1
+                oLog.info('Scheduler: polling {}'.format(sorted(dDue)))
+                try:
+                    fPoll(dDue)
+                except Exception as e:
+                    oLog.error('Scheduler: poll failed: {}'.format(e))
+                continue
+            self.oWakeup.wait(self._fUntilNext())
+            self.oWakeup.clear()
+        oLog.info('Scheduler stopped, {}'.format(self))
+        return
+
+    def __repr__(self):
+        return "Device scheduler: interval {0}s, jitter {1}, {2} devices, stats {3}".format(
+            self.iInterval, self.fJitter, len(self.dDevices), self.dStats)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -6,8 +6,10 @@ fill in data fields and pass these fields to Zabbix via API
 """
 
 import logging
+import logging.config
 import json
 import argparse as ap
+import time
 # === host types ===
 import ibm_Power_AIX as aix
 import ibm_BladeCenter_AMM as amm
@@ -16,10 +18,13 @@ import zabbixInterface as zi
 # --- end of host types
 from inventoryLogger import dLoggingConfig
 from servers_discovery import REDIS_PREFIX
-from local import REDIS_ENCODING, CACHE_TIME
-from pyzabbix.api import ZabbixAPI          # ZabbixAPIException
-from pyzabbix.sender import ZabbixSender    # ZabbixMetric
+from local import REDIS_ENCODING, CACHE_TIME, DELTA_HEARTBEAT, DAEMON_INTERVAL
+from zabbixSession import _oGetSession
+from zabbixLimiter import dLimiters
+from zabbixImport import ImportDocument
 from redis_utils import _oConnect2Redis
+from scheduler import DeviceScheduler
+from refreshTracker import RefreshTracker
 
 # for debugging
 import traceback
@@ -62,19 +67,18 @@ def _dGetServersInfo(oRedis):
     """
     ACCESS_PFX = REDIS_PREFIX + "ServersAccess"
     lRet = {}
-    lInfoDictNames = [b.decode(REDIS_ENCODING) for b in oRedis.hkeys(ACCESS_PFX)]
-    # oLog.debug("*DBG* Arrays defined: {}".format(lArrayInfoDictNames))
-    for sSrvName in lInfoDictNames:
-        sJson = oRedis.hget(ACCESS_PFX, sSrvName)
+    # all the access records at once
+    for bName, sJson in oRedis.hgetall(ACCESS_PFX).items():
         if sJson:
-            lRet[sSrvName] = json.loads(sJson.decode(REDIS_ENCODING))
+            lRet[bName.decode(REDIS_ENCODING)] = json.loads(sJson.decode(REDIS_ENCODING))
         else:
             # no data in Redis
             oLog.info("No arrays connection data in Redis")
     return lRet
 
 
-def _CollectInfoFromServer(sSrvName, dSrvParams, oZbxAPI, oZbxSender, oTrigFactory):
+def _CollectInfoFromServer(sSrvName, dSrvParams, oZbxAPI, oZbxSender, oTrigFactory, bDeferItems=False, bLLD=False,
+                           oImport=None):
     oZbxHost = None
     sSrvType = dSrvParams['type']
     sSrvIP = dSrvParams.get('srv-ip', sSrvName)
@@ -118,31 +122,114 @@ def _CollectInfoFromServer(sSrvName, dSrvParams, oZbxAPI, oZbxSender, oTrigFacto
     # connect to server, retrieve information from it
     oZbxHost._ConnectTriggerFactory(oTrigFactory)
     oZbxHost._Connect2Zabbix(oZbxAPI, oZbxSender)
+    if bDeferItems:
+        # new items will be created with one API call per host
+        oZbxHost.oZbxHost._DeferItemsCreation()
+    if bLLD:
+        # components are created by Zabbix low-level discovery
+        oZbxHost.oZbxHost._UseLLD()
+    if oImport is not None:
+        # missing objects will be created with one configuration import
+        oZbxHost.oZbxHost._UseImport(oImport)
     oZbxHost._MakeAppsItems()
     return oZbxHost
 
 
-def _ProcessArgs(oArgs, oLog, oTrigFactory):
-    """ Process the CLI arguments and connect to Redis """
+def _tPrepare(oArgs):
+    """connect to Redis, Zabbix API and set up Zabbix caches,
+    returns (Redis connection, Zabbix API session, metrics buffer, refresh tracker)"""
     oRedis = _oConnect2Redis(oArgs.redis)
     oRedis.cacheTime = oArgs.redis_ttl
 
     dZbxInfo = _dGetZabbixConnectionInfo(oRedis)
-    dServersInfo = _dGetServersInfo(oRedis)
     sZbxURL = "http://{}/zabbix/".format(dZbxInfo['zabbix_IP'])
-    oZbxAPI = ZabbixAPI(url=sZbxURL, user=dZbxInfo['zabbix_user'], password=dZbxInfo['zabbix_passwd'])
-    oZbxSender = ZabbixSender(zabbix_server=dZbxInfo['zabbix_IP'], zabbix_port=dZbxInfo['zabbix_port'])
+    if not oArgs.no_meta_cache:
+        zi._EnableMetadataCache(oRedis, sZbxURL)
+    if oArgs.delta:
+        zi._EnableDeltaSubmission(oRedis)
+    if oArgs.async_api:
+        zi._EnableAsyncSending()
+    oZbxAPI = _oGetSession(sZbxURL, dZbxInfo['zabbix_user'], dZbxInfo['zabbix_passwd'], bAsync=oArgs.async_api)
+    oZbxSender = zi._oGetMetricsBuffer(dZbxInfo['zabbix_IP'], dZbxInfo['zabbix_port'])
+    oTracker = RefreshTracker(oRedis, REDIS_PREFIX, bForce=oArgs.refresh_all)
+    return (oRedis, oZbxAPI, oZbxSender, oTracker)
+
+
+def _CollectServers(dServersInfo, oArgs, oZbxAPI, oZbxSender, oTrigFactory, oTracker):
+    """collect data of the servers and send it to Zabbix.
+    A server is collected when its refresh interval (class 'server' of local.REFRESH_INTERVALS) is over:
+    all the data of a server is received in one pass"""
+    oImport = ImportDocument() if (oArgs.import_config or oArgs.dry_run) else None
+    dDue = {}
     for sSrvName, dSrvParams in dServersInfo.items():
+        if oTracker._bDue(dSrvParams['type'], 'server', oTracker._dLast(sSrvName)):
+            dDue[sSrvName] = dSrvParams
+        else:
+            oLog.info("Server {} isn't due for refresh".format(sSrvName))
+    if oArgs.async_api:
+        # Zabbix metadata of all the due servers at once
+        zi._PrefetchHosts(oZbxAPI, list(dDue))
+    for sSrvName, dSrvParams in dDue.items():
         try:
             # 'zabbix_user', 'zabbix_passwd':, 'zabbix_IP':, 'zabbix_port'
             oLog.info("Processing server {}".format(sSrvName))
-            _CollectInfoFromServer(sSrvName, dSrvParams, oZbxAPI, oZbxSender, oTrigFactory)
+            fStart = time.time()
+            _CollectInfoFromServer(sSrvName, dSrvParams, oZbxAPI, oZbxSender, oTrigFactory,
+                                   bDeferItems=oArgs.bulk_items, bLLD=oArgs.lld, oImport=oImport)
+            oTracker._Done(sSrvName, 'server', fStart)
+            oTracker._Commit(sSrvName)
             # oZbxInterface._SendDataToZabbix(oServer)
         except Exception as e:
             oLog.error('Exception when processing server: ' + sSrvName)
             oLog.error(str(e))
             traceback.print_exc()
             continue
+    if oImport is not None:
+        # create the missing objects of all the servers and send values of the new items
+        oImport._Import(oZbxAPI, bDryRun=oArgs.dry_run)
+        oLog.info(str(oImport))
+    oZbxSender.Flush()
+    oLog.info(str(oZbxSender))
+    if oTrigFactory.bReconcile:
+        # create all the missing triggers at once
+        oTrigFactory._Reconcile()
+    oLog.info(str(oTracker))
+    oLog.info(str(zi.oAppIndex))
+    for oLimiter in dLimiters.values():
+        oLog.info(str(oLimiter))
+    for oMetaCache in zi.dMetaCaches.values():
+        oLog.info(str(oMetaCache))
+    if zi.oDeltaFilter is not None:
+        oLog.info(str(zi.oDeltaFilter))
+    return
+
+
+def _ProcessArgs(oArgs, oLog, oTrigFactory):
+    """ Process the CLI arguments and connect to Redis """
+    oRedis, oZbxAPI, oZbxSender, oTracker = _tPrepare(oArgs)
+    _CollectServers(_dGetServersInfo(oRedis), oArgs, oZbxAPI, oZbxSender, oTrigFactory, oTracker)
+    return
+
+
+def _RunDaemon(oArgs, oLog):
+    """
+    Daemon mode: Redis connection, Zabbix session and metrics buffer stay open between
+    poll cycles, every server is polled once per interval at its own time.
+    SIGHUP reloads the list of servers from Redis.  Server objects are made anew for every
+    poll: they accumulate the components found
+    """
+    oRedis, oZbxAPI, oZbxSender, oTracker = _tPrepare(oArgs)
+    oScheduler = DeviceScheduler(oArgs.interval)
+
+    def _Poll(dDue):
+        zi._StartRun()
+        # triggers are loaded again, they could be changed by hand
+        _CollectServers(dDue, oArgs, oZbxAPI, oZbxSender, zi.TriggerFactory(bReconcile=oArgs.bulk_triggers),
+                        oTracker)
+        oLog.info(str(oScheduler))
+        return
+
+    oScheduler._Run(lambda: _dGetServersInfo(oRedis), _Poll)
     return
 
 
@@ -152,6 +239,31 @@ def _oGetCLIParser():
                          default='localhost:6379', type=str, required=False)
     oParser.add_argument('-t', '--redis-ttl', help="TTL of Redis-cached data", type=int,
                          default=CACHE_TIME, required=False)
+    oParser.add_argument('-b', '--bulk-items', help="Create missing Zabbix items with one API call per host",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('-a', '--async-api', help="Use asyncio Zabbix API client with a pool of connections, "
+                         "load Zabbix metadata of all the servers at once, send values asynchronously",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('-g', '--bulk-triggers', help="Create missing triggers at the end of run with one API call",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('-l', '--lld', help="Send components (disks, DIMMs, CPUs, adapters, PSUs) "
+                         "via Zabbix low-level discovery. Static items of these components are disabled "
+                         "when the discovery rules are created", action='store_true', default=False, required=False)
+    oParser.add_argument('-i', '--import-config', help="Create missing applications, items and triggers "
+                         "of all the servers with one configuration import", action='store_true', default=False,
+                         required=False)
+    oParser.add_argument('--dry-run', help="Only log Zabbix objects missing for the configuration import",
+                         action='store_true', default=False, required=False)
+    oParser.add_argument('-D', '--daemon', help="Run as a daemon polling every server once per INTERVAL, "
+                         "SIGHUP reloads the list of servers", action='store_true', default=False, required=False)
+    oParser.add_argument('--interval', help="Poll interval of the daemon, seconds (default {})".format(
+                         DAEMON_INTERVAL), type=int, default=DAEMON_INTERVAL, required=False)
+    oParser.add_argument('-f', '--refresh-all', help="Collect all the servers, ignore refresh intervals "
+                         "(local.REFRESH_INTERVALS)", action='store_true', default=False, required=False)
+    oParser.add_argument('-d', '--delta', help="Send only changed values (and all values every {} hours)".format(
+                         DELTA_HEARTBEAT), action='store_true', default=False, required=False)
+    oParser.add_argument('-n', '--no-meta-cache', help="Don't cache Zabbix metadata in Redis between runs",
+                         action='store_true', default=False, required=False)
     return (oParser.parse_args())
 
 
@@ -159,12 +271,15 @@ if __name__ == "__main__":
     iRetCode = 0
     logging.config.dictConfig(dLoggingConfig)
     oLog = logging.getLogger('Servers_Feed_Data')
-    oTriggerFactory = zi.TriggerFactory()
 
     try:
         oLog.info('Starting Servers information Feeder program')
         oParser = _oGetCLIParser()
-        _ProcessArgs(oParser, oLog, oTriggerFactory)
+        if oParser.daemon:
+            _RunDaemon(oParser, oLog)
+        else:
+            oTriggerFactory = zi.TriggerFactory(bReconcile=oParser.bulk_triggers)
+            _ProcessArgs(oParser, oLog, oTriggerFactory)
     except Exception as e:
         oLog.error("Fatal error: {}".format(str(e)))
         traceback.print_exc()
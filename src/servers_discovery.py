@@ -2,14 +2,13 @@
 # -*- coding: utf-8 -*-
 
 """ Prints to STDOUT list of servers in JSON format used by Zabbix """
-import logging
-import argparse as ap
-from inventoryLogger import dLoggingConfig
-# from zabbixInterface import _sListOfStringsToJSON
-from redis import RedisError
-from redis_utils import _oConnect2Redis
-import json
-import traceback
+# Zabbix runs the program for every LLD rule of every server: only light modules are imported,
+# Redis is accessed by redisLite instead of redis-py, arguments are parsed by argvLite instead
+# of argparse, JSON is made without the json module (see startup-benchmark.py)
+from argvLite import ArgvParser
+from inventoryLogger import LazyLogger
+from redisLite import _oConnect2Redis, RedisError
+from accessRegistry import AccessRegistry, _sJSON
 from local import REDIS_ENCODING, CACHE_TIME
 
 # Constants
@@ -56,9 +55,8 @@ def _PushConnectionInfo2(dConnInfo, oParser, oRedis):
                      'zabbix_IP': oParser.zbxip,
                      'zabbix_port': oParser.zbxport}
     try:
-        oRedis.set(ZABBIX_PFX, json.dumps(dZabbixAccess), oParser.redis_ttl)
-        oRedis.hset(ACCESS_PFX, oParser.name, json.dumps(dConnInfo))
-        oRedis.expire(ACCESS_PFX, oParser.redis_ttl)
+        oRegistry = AccessRegistry(oRedis, REDIS_PREFIX, ACCESS_PFX, ZABBIX_PFX, oParser.redis_ttl)
+        oRegistry._lRegister(oParser.name, _sJSON(dConnInfo), _sJSON(dZabbixAccess))
     except RedisError:
         oLog.error('Cannot connect to Redis and set information')
         raise RedisError
@@ -168,7 +166,7 @@ def _oConfigureESXiParser(oParser):
 
 def _Main():
     """parse CLI arguments, make connection to Redis and call a worker function"""
-    oParser = ap.ArgumentParser(description="Make servers list for Zabbix")
+    oParser = ArgvParser(description="Make servers list for Zabbix")
     oSubParsers = oParser.add_subparsers(title='server types',
                                          dest='server_type',
                                          description='Supported server types',
@@ -199,6 +197,7 @@ def _Main():
     oRedis = _oConnect2Redis(oArgs.redis)
     # and call a function corresponding to server's type (from 'set_defaults')
     oArgs.func(oArgs, oRedis)
+    oRedis.close()
     print('{"data":[]}')
     return
 
@@ -207,8 +206,7 @@ def _Main():
 # == main ==
 #
 if __name__ == '__main__':
-    logging.config.dictConfig(dLoggingConfig)
-    oLog = logging.getLogger('Srv.Discovery')
+    oLog = LazyLogger('Srv.Discovery')
     oLog.info('<<< Starting servers discovery program')
     sRet = "Not implemented yet"
     iRetCode = -1
@@ -220,6 +218,7 @@ if __name__ == '__main__':
         iErrCode = 2
     except Exception as e:
         oLog.error("Exception at top-level {}".format(str(e)))
+        import traceback
         traceback.print_exc()
         iRetCode = 1
     oLog.info('>>> End of servers discovery program')
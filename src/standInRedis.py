@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-memory stand-in Redis server for the benchmarks (cache-benchmark.py, startup-benchmark.py):
+RESP protocol over TCP, the commands of the programs they measure, MULTI/EXEC without isolation.
+TTLs are accepted and ignored, commands and writes are counted
+"""
+
+import socketserver
+import threading
+
+
+class StandInRedis(socketserver.StreamRequestHandler):
+    """request handler, the data and the counters are shared by all the connections"""
+    dData = {}
+    oLock = threading.Lock()
+    WRITES = {'SET', 'HSET', 'EXPIRE', 'DEL'}
+    dCounts = {'commands': 0, 'writes': 0}
+
+    def _lRequest(self):
+        bLine = self.rfile.readline()
+        if not bLine:
+            return None
+        lArgs = []
+        for i in range(int(bLine[1:])):
+            iLen = int(self.rfile.readline()[1:])
+            lArgs.append(self.rfile.read(iLen + 2)[:-2])
+        return lArgs
+
+    @staticmethod
+    def _bEncode(oReply, bNull=b'$-1\r\n'):
+        """RESP reply, bNull: null of the protocol of the connection"""
+        if oReply is None:
+            return bNull
+        elif isinstance(oReply, Exception):
+            return b'-ERR %s\r\n' % str(oReply).encode()
+        elif isinstance(oReply, int):
+            return b':%d\r\n' % oReply
+        elif isinstance(oReply, list):
+            return b'*%d\r\n' % len(oReply) + b''.join(StandInRedis._bEncode(o, bNull) for o in oReply)
+        elif isinstance(oReply, dict):
+            # RESP3 map: a reply to HELLO
+            return b'%%%d\r\n' % len(oReply) + b''.join(StandInRedis._bEncode(o, bNull)
+                                                          for t in oReply.items() for o in t)
+        return b'$%d\r\n%s\r\n' % (len(oReply), oReply)
+
+    def _oExecute(self, lArgs):
+        sCmd = lArgs[0].decode().upper()
+        d = self.dData
+        self.dCounts['commands'] += 1
+        self.dCounts['writes'] += sCmd in self.WRITES
+        if sCmd == 'PING':
+            return b'PONG'
+        elif sCmd == 'HELLO':
+            # redis-py 5+ negotiates the protocol, RESP2 replies are valid in RESP3 except null
+            return {b'server': b'stand-in', b'proto': int(lArgs[1]) if len(lArgs) > 1 else 2}
+        elif sCmd == 'GET':
+            return d.get(lArgs[1])
+        elif sCmd == 'SET':
+            d[lArgs[1]] = lArgs[2]
+            return b'OK'
+        elif sCmd == 'MGET':
+            return [d.get(k) for k in lArgs[1:]]
+        elif sCmd == 'STRLEN':
+            return len(d.get(lArgs[1], b''))
+        elif sCmd == 'DEL':
+            return sum(d.pop(k, None) is not None for k in lArgs[1:])
+        elif sCmd == 'HGET':
+            return d.get(lArgs[1], {}).get(lArgs[2])
+        elif sCmd == 'HSET':
+            d.setdefault(lArgs[1], {})[lArgs[2]] = lArgs[3]
+            return 1
+        elif sCmd == 'HEXISTS':
+            return int(lArgs[2] in d.get(lArgs[1], {}))
+        elif sCmd == 'HGETALL':
+            return [b for t in d.get(lArgs[1], {}).items() for b in t]
+        elif sCmd == 'EXISTS':
+            return sum(k in d for k in lArgs[1:])
+        elif sCmd == 'TTL':
+            return 3600 if lArgs[1] in d else -2
+        elif sCmd == 'EXPIRE':
+            return int(lArgs[1] in d)
+        return ValueError('unknown command {}'.format(sCmd))
+
+    def handle(self):
+        lQueued = None
+        bNull = b'$-1\r\n'
+        while True:
+            lArgs = self._lRequest()
+            if lArgs is None:
+                return
+            sCmd = lArgs[0].decode().upper()
+            if sCmd == 'HELLO' and len(lArgs) > 1 and lArgs[1] == b'3':
+                # RESP3 has its own null
+                bNull = b'_\r\n'
+            if sCmd == 'MULTI':
+                lQueued = []
+                self.wfile.write(b'+OK\r\n')
+            elif lQueued is not None and sCmd != 'EXEC':
+                lQueued.append(lArgs)
+                self.wfile.write(b'+QUEUED\r\n')
+            else:
+                with self.oLock:
+                    if sCmd == 'EXEC':
+                        oReply = [self._oExecute(l) for l in lQueued]
+                        lQueued = None
+                    else:
+                        oReply = self._oExecute(lArgs)
+                if oReply == b'OK' or oReply == b'PONG':
+                    self.wfile.write(b'+%s\r\n' % oReply)
+                else:
+                    self.wfile.write(self._bEncode(oReply, bNull))
+
+
+def _sStartServer():
+    """start the stand-in Redis server in a background thread, returns 'host:port'"""
+    socketserver.ThreadingTCPServer.daemon_threads = True
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    oServer = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StandInRedis)
+    threading.Thread(target=oServer.serve_forever, daemon=True).start()
+    return '127.0.0.1:{}'.format(oServer.server_address[1])
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of start time of the programs Zabbix runs as external scripts for every LLD rule
+of every host (discovery-info.py, servers_discovery.py): wall-clock time of complete runs
+(interpreter start, imports, Redis access, output) against a local stand-in Redis server
+or a real one (-r), Redis commands and writes per run (stand-in server) and the slowest
+imports by 'python -X importtime'.
+The target is below 50 ms per run; a bare interpreter start is shown for reference
+"""
+
+import argparse as ap
+import json
+import os
+import subprocess
+import sys
+import time
+from redisLite import _oConnect2Redis
+from standInRedis import StandInRedis, _sStartServer
+
+TARGET_MS = 50.0
+ARRAY_NAME = 'bench-array'
+SERVER_NAME = 'bench-server'
+
+
+def _FillRedis(sRedis, iNames):
+    """lists of names the discovery programs print"""
+    sJson = json.dumps({'data': [{'{#NAME}': 'Disk {:04d}'.format(i)} for i in range(iNames)]})
+    oRedis = _oConnect2Redis(sRedis)
+    oPipe = oRedis.pipeline(transaction=False)
+    oPipe.hset('ArraysDiscovery.ArrayKeys', ARRAY_NAME, 'ArraysDiscovery.Snapshot.' + ARRAY_NAME)
+    oPipe.hset('ArraysDiscovery.Snapshot.' + ARRAY_NAME, 'LIST OF DISK NAMES', sJson)
+    oPipe.execute()
+    oRedis.close()
+    return
+
+
+def _lsCommands(sRedis):
+    """program -> command line"""
+    sDir = os.path.dirname(os.path.abspath(__file__))
+    return [
+        ('bare interpreter', [sys.executable, '-c', 'pass']),
+        ('discovery-info.py', [sys.executable, os.path.join(sDir, 'discovery-info.py'), '-t', '3Par',
+                               '-q', 'disk-names', '-c', '127.0.0.1', '-u', 'bench', '-p', 'bench',
+                               '-s', ARRAY_NAME, '-r', sRedis]),
+        ('servers_discovery.py', [sys.executable, os.path.join(sDir, 'servers_discovery.py'), '-r', sRedis,
+                                  'esxi', '-n', SERVER_NAME, '-u', 'bench', '-p', 'bench', '-v', 'vcenter']),
+    ]
+
+
+def _lfRuns(lsCommand, iRuns):
+    """wall-clock times (ms) of runs, sorted"""
+    lfRet = []
+    for i in range(iRuns):
+        fStart = time.perf_counter()
+        oProc = subprocess.run(lsCommand, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        lfRet.append((time.perf_counter() - fStart) * 1000)
+        if oProc.returncode != 0 or (lsCommand[1] != '-c' and not oProc.stdout.startswith(b'{')):
+            raise RuntimeError('{} failed: {}'.format(lsCommand[1], oProc.stderr.decode()))
+    return sorted(lfRet)
+
+
+def _PrintImportTime(lsCommand, iTop):
+    """slowest modules by cumulative import time of one run"""
+    oProc = subprocess.run([lsCommand[0], '-X', 'importtime'] + lsCommand[1:],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    ltImports = []
+    for sLine in oProc.stderr.decode().splitlines():
+        if sLine.startswith('import time:') and '|' in sLine:
+            lsFields = sLine[len('import time:'):].split('|')
+            if lsFields[0].strip().isdigit():
+                ltImports.append((int(lsFields[1]), lsFields[2].strip()))
+    ltImports.sort(reverse=True)
+    print('    all imports {:.1f} ms, top-level by cumulative time:'.format(
+        sum(i for i, s in ltImports if not s.startswith(' ')) / 1000))
+    for iTime, sModule in [t for t in ltImports if not t[1].startswith(' ')][:iTop]:
+        print('    {:8.1f} ms  {}'.format(iTime / 1000, sModule))
+    return
+
+
+def _oGetCLIParser():
+    oParser = ap.ArgumentParser(description="Start time of discovery programs with a stand-in or real Redis")
+    oParser.add_argument('-r', '--redis', help="Real Redis host:port or socket (default: local stand-in server)",
+                         type=str, required=False)
+    oParser.add_argument('-n', '--runs', help="Runs of every program", type=int, default=30)
+    oParser.add_argument('-N', '--names', help="Names in the discovered list", type=int, default=200)
+    oParser.add_argument('-i', '--imports', help="Slowest imports to show", type=int, default=8)
+    return oParser.parse_args()
+
+
+if __name__ == "__main__":
+    oArgs = _oGetCLIParser()
+    sRedis = oArgs.redis or _sStartServer()
+    _FillRedis(sRedis, oArgs.names)
+    print("{} runs per program, Redis {}, target {} ms".format(
+        oArgs.runs, sRedis if oArgs.redis else 'stand-in', TARGET_MS))
+    bFailed = False
+    for sName, lsCommand in _lsCommands(sRedis):
+        dCounts = dict(StandInRedis.dCounts)
+        lfTimes = _lfRuns(lsCommand, oArgs.runs)
+        fMedian = lfTimes[len(lfTimes) // 2]
+        fP90 = lfTimes[int(len(lfTimes) * 0.9)]
+        sVerdict = ''
+        if lsCommand[1] != '-c':
+            bOK = fMedian < TARGET_MS
+            bFailed = bFailed or not bOK
+            sVerdict = 'OK' if bOK else 'SLOW'
+        print("{:22s} min {:6.1f}  median {:6.1f}  p90 {:6.1f} ms  {}".format(
+            sName, lfTimes[0], fMedian, fP90, sVerdict))
+        if not oArgs.redis and lsCommand[1] != '-c':
+            print('    Redis commands per run {:.1f}, writes {:.1f}'.format(
+                *[(StandInRedis.dCounts[s] - dCounts[s]) / oArgs.runs for s in ('commands', 'writes')]))
+        if oArgs.imports and lsCommand[1] != '-c':
+            _PrintImportTime(lsCommand, oArgs.imports)
+    sys.exit(1 if bFailed else 0)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of Zabbix API clients: wall-clock time to read metadata (host ID, items, applications,
+triggers) of many synthetic hosts from a local stand-in Zabbix API server with a given latency.
+Compared clients:
+  pyzabbix  -- pyzabbix.ZabbixAPI, a new HTTP connection per request, hosts one by one
+  session   -- zabbixSession.ZabbixSession, one keep-alive connection, hosts one by one
+  async     -- zabbixAsync.ZabbixAsyncAPI, pool of connections, all the hosts at once
+"""
+
+import argparse as ap
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pyzabbix.api import ZabbixAPI
+from zabbixSession import ZabbixSession
+from zabbixAsync import ZabbixAsyncAPI
+from zabbixLimiter import AdaptiveLimiter, dLimiters
+from zabbixInterface import ITEM_OUTPUT_FIELDS
+
+
+class StandInZabbix:
+    """in-memory read-only Zabbix API: hosts with items, applications and triggers"""
+    def __init__(self, iHosts, iItems):
+        self.dHostIDs = {}
+        self.ddHosts = {}
+        iID = 10000
+        for iHost in range(iHosts):
+            iID += 1
+            iHostID = iID
+            sName = 'bench-host-{:04d}'.format(iHost)
+            self.dHostIDs[sName] = iHostID
+            ldApps, ldItems, ldTriggers = [], [], []
+            for iItem in range(iItems):
+                iID += 1
+                dApp = {'applicationid': str(iID), 'name': 'Drive {}'.format(iItem)}
+                ldApps.append(dApp)
+                iID += 1
+                ldItems.append({'itemid': str(iID), 'name': 'Drive {} Serial Number'.format(iItem),
+                                'key_': 'Drive_{}_SN'.format(iItem), 'type': '2', 'value_type': '1',
+                                'units': '', 'delay': '0', 'description': '', 'applications': [dApp]})
+                ldTriggers.append({'triggerid': str(iID + 1), 'description': 'Disk serial number is changed',
+                                   'items': [{'itemid': str(iID)}]})
+                iID += 1
+            self.ddHosts[iHostID] = {'applications': ldApps, 'items': ldItems, 'triggers': ldTriggers}
+        return
+
+    def oAnswer(self, sMethod, dParams):
+        if sMethod == 'user.login':
+            return 'bench-auth-token'
+        elif sMethod == 'user.logout':
+            return True
+        elif sMethod == 'host.get':
+            sName = dParams['filter']['host']
+            return [{'hostid': str(self.dHostIDs[sName]), 'host': sName}] if sName in self.dHostIDs else []
+        dHost = self.ddHosts[int(dParams['hostids'])]
+        return {'item.get': dHost['items'],
+                'application.get': dHost['applications'],
+                'trigger.get': dHost['triggers']}[sMethod]
+
+
+def _oStartServer(oZabbix, fLatency):
+    """start the stand-in API server in a background thread, returns (server, URL)"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # one write per answer and no Nagle delays, like a real web server
+        wbufsize = 65536
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            dReq = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(fLatency)
+            bBody = json.dumps({'jsonrpc': '2.0', 'id': dReq['id'],
+                                'result': oZabbix.oAnswer(dReq['method'], dReq.get('params'))}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(bBody)))
+            self.end_headers()
+            self.wfile.write(bBody)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 128
+    oServer = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=oServer.serve_forever, daemon=True).start()
+    return (oServer, 'http://127.0.0.1:{}/zabbix'.format(oServer.server_address[1]))
+
+
+def _iLoadOneByOne(oAPI, lsHosts):
+    """the current way: every host and every object type is requested sequentially"""
+    iItems = 0
+    for sHost in lsHosts:
+        iHostID = int(oAPI.host.get(filter={'host': sHost})[0]['hostid'])
+        iItems += len(oAPI.do_request('item.get', {'hostids': iHostID, 'output': ITEM_OUTPUT_FIELDS,
+                                                   'selectApplications': ['applicationid', 'name']})['result'])
+        oAPI.do_request('application.get', {'hostids': iHostID, 'output': ['applicationid', 'name']})
+        oAPI.do_request('trigger.get', {'hostids': iHostID, 'output': ['triggerid', 'description'],
+                                        'selectItems': ['itemid']})
+    return iItems
+
+
+def _iLoadAtOnce(oAPI, lsHosts):
+    ddMeta = oAPI._ddLoadHosts(lsHosts, ITEM_OUTPUT_FIELDS)
+    return sum(len(d['items']) for d in ddMeta.values())
+
+
+def _oGetCLIParser():
+    oParser = ap.ArgumentParser(description="Zabbix API clients benchmark with a local stand-in server")
+    oParser.add_argument('-n', '--hosts', help="Number of synthetic hosts", type=int, default=500)
+    oParser.add_argument('-i', '--items', help="Number of items per host", type=int, default=20)
+    oParser.add_argument('-l', '--latency', help="Server latency per request, ms", type=float, default=10.0)
+    oParser.add_argument('-c', '--concurrency', help="Requests in flight of async client", type=int, default=16)
+    return oParser.parse_args()
+
+
+if __name__ == "__main__":
+    oArgs = _oGetCLIParser()
+    oZabbix = StandInZabbix(oArgs.hosts, oArgs.items)
+    oServer, sURL = _oStartServer(oZabbix, oArgs.latency / 1000.0)
+    lsHosts = sorted(oZabbix.dHostIDs.keys())
+    # the clients are measured, not the frontend protection
+    dLimiters[sURL] = AdaptiveLimiter(sURL, rate=1e6, burst=10 ** 6, min_window=oArgs.concurrency,
+                                      max_window=oArgs.concurrency)
+    print("{} hosts, {} items per host, latency {} ms, {} requests per host".format(
+        oArgs.hosts, oArgs.items, oArgs.latency, 4))
+
+    ltResults = []
+    for sName, fMakeAPI, fLoad in (
+            ('pyzabbix', lambda: ZabbixAPI(url=sURL, user='bench', password='bench'), _iLoadOneByOne),
+            ('session', lambda: ZabbixSession(sURL, 'bench', 'bench'), _iLoadOneByOne),
+            ('async', lambda: ZabbixAsyncAPI(sURL, 'bench', 'bench', iMaxRequests=oArgs.concurrency),
+             _iLoadAtOnce)):
+        oAPI = fMakeAPI()
+        fStart = time.perf_counter()
+        iItems = fLoad(oAPI, lsHosts)
+        fElapsed = time.perf_counter() - fStart
+        if isinstance(oAPI, (ZabbixSession, ZabbixAsyncAPI)):
+            oAPI._Logout()
+        ltResults.append((sName, fElapsed, iItems))
+    fBase = ltResults[0][1]
+    for sName, fElapsed, iItems in ltResults:
+        print("{:10s} {:8.2f} s  {:7d} items  x{:.1f}".format(sName, fElapsed, iItems, fBase / fElapsed))
+    oServer.shutdown()
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
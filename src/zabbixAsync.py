@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asyncio Zabbix JSON-RPC client.  A pool of keep-alive HTTP connections and a bounded
+number of requests in flight, so one slow frontend answer doesn't stall other requests.
+ZabbixAsyncAPI is a synchronous (thread-safe) facade with the ZabbixAPI interface
+(do_request(), api.host.get(...)) usable by ZabbixHost/GeneralZabbix, plus helpers running
+many requests or many hosts at once.
+"""
+
+from logging import getLogger
+from pyzabbix.api import ZabbixAPIException, ZabbixAPIObjectClass
+from urllib.parse import urlsplit
+from local import ZABBIX_API_TIMEOUT, ASYNC_API_MAX_REQUESTS
+from zabbixLimiter import _oGetLimiter
+import threading
+import asyncio
+import json
+import ssl
+
+oLog = getLogger(__name__)
+
+
+def _bSessionExpired(oException):
+    """the API error is about an expired or unknown session"""
+    sError = str(oException)
+    return 'Session terminated' in sError or 'Not authorised' in sError or 'Not authorized' in sError
+
+
+class AsyncZabbixClient:
+    """Coroutine-based Zabbix API client, must be used in one event loop"""
+    def __init__(self, sURL, iMaxRequests=ASYNC_API_MAX_REQUESTS, iTimeout=ZABBIX_API_TIMEOUT):
+        oURL = urlsplit(sURL.rstrip('/') + '/api_jsonrpc.php')
+        self.oSSL = ssl.create_default_context() if oURL.scheme == 'https' else None
+        self.sHost = oURL.hostname
+        self.iPort = oURL.port or (443 if self.oSSL else 80)
+        self.sNetLoc = oURL.netloc
+        self.sPath = oURL.path
+        self.iTimeout = iTimeout
+        self.iMaxRequests = iMaxRequests
+        self.oSemaphore = None      # created in the loop
+        self.ltIdle = []            # idle connections: (reader, writer)
+        self.sAuth = None
+        self.tCredentials = None    # (user, password) for a new login when the session expires
+        self.oLoginLock = None      # created in the loop
+        self.iLogins = 0
+        self.iRequestID = 0
+        self.dStats = {'requests': 0, 'connections': 0}
+        self.oLimiter = _oGetLimiter(sURL)
+        return
+
+    async def _tConnect(self):
+        tConn = await asyncio.wait_for(
+            asyncio.open_connection(self.sHost, self.iPort, ssl=self.oSSL), self.iTimeout)
+        self.dStats['connections'] += 1
+        return tConn
+
+    @staticmethod
+    def _Close(tConn):
+        tConn[1].close()
+        return
+
+    async def _bReadBody(self, oReader, dHeaders):
+        if dHeaders.get('transfer-encoding', '').lower() == 'chunked':
+            bBody = b''
+            while True:
+                iSize = int((await oReader.readline()).split(b';')[0].strip(), 16)
+                if iSize == 0:
+                    # trailer headers up to an empty line
+                    while (await oReader.readline()).strip():
+                        pass
+                    return bBody
+                bBody += await oReader.readexactly(iSize)
+                await oReader.readline()
+        elif 'content-length' in dHeaders:
+            return await oReader.readexactly(int(dHeaders['content-length']))
+        else:
+            return await oReader.read()
+
+    async def _tExchange(self, tConn, bData):
+        """send a request over a connection, returns (HTTP status, headers, body)"""
+        oReader, oWriter = tConn
+        bHead = ('POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json-rpc\r\n'
+                 'Content-Length: {}\r\nConnection: keep-alive\r\n\r\n').format(
+                     self.sPath, self.sNetLoc, len(bData)).encode('ascii')
+        oWriter.write(bHead + bData)
+        await oWriter.drain()
+        bStatus = await oReader.readline()
+        if not bStatus:
+            raise ConnectionResetError('Connection closed by server')
+        iStatus = int(bStatus.split()[1])
+        dHeaders = {}
+        while True:
+            bLine = await oReader.readline()
+            if not bLine.strip():
+                break
+            sName, _, sValue = bLine.decode('latin-1').partition(':')
+            dHeaders[sName.strip().lower()] = sValue.strip()
+        bBody = await self._bReadBody(oReader, dHeaders)
+        return (iStatus, dHeaders, bBody)
+
+    async def _bPost(self, bData):
+        """POST the data when the adaptive limiter of the Zabbix URL allows"""
+        fStart = await self.oLimiter._fAcquireAsync()
+        bError = True
+        try:
+            bRet = await self._bPostPooled(bData)
+            bError = False
+        finally:
+            self.oLimiter._Release(fStart, bError)
+        return bRet
+
+    async def _bPostPooled(self, bData):
+        """POST the data using a pooled connection"""
+        if self.oSemaphore is None:
+            self.oSemaphore = asyncio.Semaphore(self.iMaxRequests)
+        async with self.oSemaphore:
+            bReused = bool(self.ltIdle)
+            tConn = self.ltIdle.pop() if bReused else await self._tConnect()
+            try:
+                iStatus, dHeaders, bBody = await asyncio.wait_for(self._tExchange(tConn, bData), self.iTimeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                self._Close(tConn)
+                if not bReused:
+                    raise
+                # the server closed an idle connection, try again with a new one
+                oLog.debug('Pooled connection to {} is closed ({}), reconnecting'.format(self.sNetLoc, e))
+                tConn = await self._tConnect()
+                iStatus, dHeaders, bBody = await asyncio.wait_for(self._tExchange(tConn, bData), self.iTimeout)
+            except BaseException:
+                self._Close(tConn)
+                raise
+            if dHeaders.get('connection', '').lower() == 'close':
+                self._Close(tConn)
+            else:
+                self.ltIdle.append(tConn)
+        if iStatus != 200:
+            raise ZabbixAPIException('HTTP error {} from {}'.format(iStatus, self.sNetLoc))
+        return bBody
+
+    async def _dRequest(self, method, params=None):
+        """Zabbix API request, returns the answer dictionary like ZabbixAPI.do_request.
+        A session expired on the server (long-running daemon) is logged in again"""
+        iLogins = self.iLogins
+        try:
+            return await self._dRequestOnce(method, params)
+        except ZabbixAPIException as e:
+            if method in ('user.login', 'user.logout') or self.tCredentials is None or not _bSessionExpired(e):
+                raise
+        if self.oLoginLock is None:
+            self.oLoginLock = asyncio.Lock()
+        async with self.oLoginLock:
+            # concurrent requests with the expired session: one login
+            if self.iLogins == iLogins:
+                oLog.info('Zabbix API session of {} is expired, logging in again'.format(self.tCredentials[0]))
+                await self._Login(*self.tCredentials)
+        return await self._dRequestOnce(method, params)
+
+    async def _dRequestOnce(self, method, params):
+        self.iRequestID += 1
+        dRequest = {'jsonrpc': '2.0',
+                    'method': method,
+                    'params': params or {},
+                    'id': self.iRequestID}
+        if self.sAuth and (method not in ('apiinfo.version', 'user.login')):
+            dRequest['auth'] = self.sAuth
+        self.dStats['requests'] += 1
+        bResp = await self._bPost(json.dumps(dRequest).encode('utf-8'))
+        try:
+            dRes = json.loads(bResp.decode('utf-8'))
+        except ValueError as e:
+            raise ZabbixAPIException("Unable to parse json: {}".format(e))
+        if 'error' in dRes:
+            dErr = dRes['error'].copy()
+            dErr.update({'json': str(dRequest)})
+            raise ZabbixAPIException(dErr)
+        return dRes
+
+    async def _Login(self, sUser, sPassword):
+        dRes = await self._dRequest('user.login', {'user': sUser, 'password': sPassword})
+        self.sAuth = dRes['result']
+        self.tCredentials = (sUser, sPassword)
+        self.iLogins += 1
+        return
+
+    async def _Logout(self):
+        if self.sAuth:
+            try:
+                await self._dRequest('user.logout', [])
+            except (ZabbixAPIException, OSError) as e:
+                oLog.info('Zabbix logout error: {}'.format(e))
+            self.sAuth = None
+            self.tCredentials = None
+        while self.ltIdle:
+            self._Close(self.ltIdle.pop())
+        return
+
+    async def _dLoadHost(self, sHostName, lItemFields):
+        """host ID, applications, items (with lItemFields fields) and triggers of a host:
+        1 + 3 concurrent requests.  Returns None for unknown or non-unique host names"""
+        lHosts = (await self._dRequest('host.get', {'filter': {'host': sHostName}}))['result']
+        if len(lHosts) != 1:
+            return None
+        iHostID = int(lHosts[0]['hostid'])
+        dItems, dApps, dTriggers = await asyncio.gather(
+            self._dRequest('item.get', {'hostids': iHostID, 'output': lItemFields,
+                                        'selectApplications': ['applicationid', 'name']}),
+            self._dRequest('application.get', {'hostids': iHostID, 'output': ['applicationid', 'name']}),
+            self._dRequest('trigger.get', {'hostids': iHostID, 'output': ['triggerid', 'description'],
+                                           'selectItems': ['itemid']}))
+        return {'host': sHostName,
+                'hostid': iHostID,
+                'items': dItems['result'],
+                'applications': dApps['result'],
+                'triggers': dTriggers['result']}
+
+
+class ZabbixAsyncAPI:
+    """
+    Synchronous facade of AsyncZabbixClient with the ZabbixAPI interface.  The event loop runs
+    in a background thread; do_request() may be called from many threads at once, the number
+    of requests in flight is bounded by the client
+    """
+    def __init__(self, sURL, sUser, sPassword, iMaxRequests=ASYNC_API_MAX_REQUESTS, iTimeout=ZABBIX_API_TIMEOUT):
+        self.url = sURL.rstrip('/') + '/api_jsonrpc.php'
+        self.iTimeout = iTimeout
+        self.oClient = AsyncZabbixClient(sURL, iMaxRequests, iTimeout)
+        self.oLoop = asyncio.new_event_loop()
+        self.oThread = threading.Thread(target=self.oLoop.run_forever, name='ZabbixAsyncAPI', daemon=True)
+        self.oThread.start()
+        self.dHosts = {}    # host name -> list of host dictionaries from 'host.get'
+        self._oRun(self.oClient._Login(sUser, sPassword))
+        return
+
+    def __getattr__(self, name):
+        """ZabbixAPI style calls: oAPI.host.get(filter=...)"""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return ZabbixAPIObjectClass(name, self)
+
+    def _oRun(self, oCoroutine):
+        """run a coroutine in the client's loop and wait for its result"""
+        oFuture = asyncio.run_coroutine_threadsafe(oCoroutine, self.oLoop)
+        return oFuture.result()
+
+    @property
+    def auth(self):
+        return self.oClient.sAuth
+
+    def do_request(self, method, params=None):
+        return self._oRun(self.oClient._dRequest(method, params))
+
+    def _ldRequestMany(self, ltRequests):
+        """run many (method, params) requests at once, returns the list of answers in the same order.
+        Exceptions are returned in place of answers"""
+        async def _Gather():
+            return await asyncio.gather(*[self.oClient._dRequest(m, p) for m, p in ltRequests],
+                                        return_exceptions=True)
+        return self._oRun(_Gather())
+
+    def _ddLoadHosts(self, lsHostNames, lItemFields='extend'):
+        """metadata of many hosts at once (see AsyncZabbixClient._dLoadHost): {host name: dict or None}"""
+        async def _Gather():
+            return await asyncio.gather(*[self.oClient._dLoadHost(s, lItemFields) for s in lsHostNames])
+        ddRet = dict(zip(lsHostNames, self._oRun(_Gather())))
+        for sHostName, dMeta in ddRet.items():
+            if dMeta is not None:
+                self.dHosts[sHostName] = [{'hostid': str(dMeta['hostid']), 'host': sHostName}]
+        return ddRet
+
+    def _lFindHosts(self, sHostName):
+        """returns a list of hosts named sHostName, known hosts are cached"""
+        if sHostName not in self.dHosts:
+            lHosts = self.host.get(filter={'host': sHostName})
+            if not lHosts:
+                return lHosts
+            self.dHosts[sHostName] = lHosts
+        return self.dHosts[sHostName]
+
+    def _Logout(self):
+        """log out, close connections and stop the loop"""
+        if self.oLoop.is_running():
+            self._oRun(self.oClient._Logout())
+            self.oLoop.call_soon_threadsafe(self.oLoop.stop)
+            self.oThread.join(self.iTimeout)
+        return
+
+    def __repr__(self):
+        return "Async Zabbix API {0}, stats {1}".format(self.url, self.oClient.dStats)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk provisioning of Zabbix hosts with 'configuration.import'.  ZabbixHost and
+TriggerFactory record applications, items and triggers in an ImportDocument instead
+of creating them one by one; at the end of a run the document is compared with the
+objects existing in Zabbix (3 API calls for all the hosts) and only the missing objects
+are imported with one call.  Values of the new items are sent after the import; a dry run
+only logs the missing objects and drops the values waiting for new items, as they don't exist.
+Servers (servers-feed-data.py) record all their objects; storage arrays (feed-data.py) get
+component items from their templates, so only their timestamp application and item are recorded.
+The document uses the 4.4 export format (Zabbix 4.4 - 5.2: applications are gone in 5.4)
+"""
+
+from logging import getLogger
+from pyzabbix.api import ZabbixAPIException
+from zabbixInterface import _InvalidateHostMeta, _enStrToSeverity, oAppIndex
+import json
+import time
+
+oLog = getLogger(__name__)
+
+IMPORT_FORMAT_VERSION = '4.4'
+# Zabbix item attributes to export format constants
+ITEM_TYPES = {0: 'ZABBIX_PASSIVE', 2: 'TRAP', 7: 'ZABBIX_ACTIVE', 15: 'CALCULATED'}
+VALUE_TYPES = {0: 'FLOAT', 1: 'CHAR', 2: 'LOG', 3: 'UNSIGNED', 4: 'TEXT'}
+PRIORITIES = ['NOT_CLASSIFIED', 'INFO', 'WARNING', 'AVERAGE', 'HIGH', 'DISASTER']
+# import only creates missing objects: re-imports don't change anything made by hand
+IMPORT_RULES = {'groups': {'createMissing': False},
+                'hosts': {'createMissing': False, 'updateExisting': False},
+                'applications': {'createMissing': True, 'deleteMissing': False},
+                'items': {'createMissing': True, 'updateExisting': False, 'deleteMissing': False},
+                'triggers': {'createMissing': True, 'updateExisting': False, 'deleteMissing': False}}
+
+
+class ImportDocument:
+    """Applications, items and triggers wanted on many hosts, imported at once"""
+    def __init__(self):
+        self.dHosts = {}        # host name -> ZabbixHost
+        self.ddApps = {}        # host name -> set of application names
+        self.ddItems = {}       # host name -> {item key: ZabbixItem}
+        self.ddTriggers = {}    # host name -> {(trigger name, expression): severity}
+        self.dStats = {'hosts': 0, 'applications': 0, 'items': 0, 'triggers': 0}
+        return
+
+    def _AddHost(self, oHost):
+        self.dHosts[oHost.name] = oHost
+        self.ddApps.setdefault(oHost.name, set())
+        self.ddItems.setdefault(oHost.name, {})
+        self.ddTriggers.setdefault(oHost.name, {})
+        return
+
+    def _AddApplication(self, sHostName, sAppName):
+        self.ddApps[sHostName].add(sAppName)
+        return
+
+    def _AddItem(self, sHostName, oItem):
+        self.ddItems[sHostName][oItem.key] = oItem
+        for oApp in oItem.lRelatedApps:
+            self._AddApplication(sHostName, oApp._sGetName())
+        return
+
+    def _AddTrigger(self, sHostName, sTriggerName, sExpr, sSeverity):
+        self.ddTriggers[sHostName][(sTriggerName, sExpr)] = sSeverity
+        return
+
+    def _ddExisting(self, oAPI):
+        """names of applications, keys of items and (name, expression) of triggers existing on the hosts"""
+        lHostIDs = [o.id for o in self.dHosts.values()]
+        dNames = {o.id: o.name for o in self.dHosts.values()}
+        ddRet = {s: {'groups': [], 'applications': set(), 'items': set(), 'triggers': set()} for s in self.dHosts}
+        for dHost in oAPI.do_request('host.get', {'hostids': lHostIDs, 'output': ['host'],
+                                                  'selectGroups': ['name']})['result']:
+            ddRet[dHost['host']]['groups'] = [d['name'] for d in dHost['groups']]
+        for dApp in oAPI.do_request('application.get', {'hostids': lHostIDs,
+                                                        'output': ['hostid', 'name']})['result']:
+            ddRet[dNames[int(dApp['hostid'])]]['applications'].add(dApp['name'])
+        for dItem in oAPI.do_request('item.get', {'hostids': lHostIDs, 'output': ['hostid', 'key_']})['result']:
+            ddRet[dNames[int(dItem['hostid'])]]['items'].add(dItem['key_'])
+        for dTrigger in oAPI.do_request('trigger.get', {'hostids': lHostIDs, 'output': ['description', 'expression'],
+                                                        'expandExpression': True,
+                                                        'selectHosts': ['hostid']})['result']:
+            for dHost in dTrigger['hosts']:
+                ddRet[dNames[int(dHost['hostid'])]]['triggers'].add((dTrigger['description'],
+                                                                     dTrigger['expression']))
+        return ddRet
+
+    def _ddDiff(self, oAPI):
+        """Dry run: objects of the document missing in Zabbix,
+        {host name: {'applications': [names], 'items': [keys], 'triggers': [(name, expression)]}},
+        only hosts with changes"""
+        ddExisting = self._ddExisting(oAPI)
+        ddRet = {}
+        for sHostName in self.dHosts:
+            dExisting = ddExisting[sHostName]
+            dDiff = {'groups': dExisting['groups'],
+                     'applications': sorted(self.ddApps[sHostName] - dExisting['applications']),
+                     'items': sorted(set(self.ddItems[sHostName]) - dExisting['items']),
+                     'triggers': sorted(set(self.ddTriggers[sHostName]) - dExisting['triggers'])}
+            if dDiff['applications'] or dDiff['items'] or dDiff['triggers']:
+                ddRet[sHostName] = dDiff
+        return ddRet
+
+    def _dItemExport(self, oItem):
+        return {'name': oItem.name,
+                'type': ITEM_TYPES.get(oItem.iUpdType, 'TRAP'),
+                'key': oItem.key,
+                'delay': str(oItem.iDelay) if oItem.iUpdType != 2 else '0',
+                'value_type': VALUE_TYPES[oItem.iValType],
+                'units': oItem.sUnits,
+                'description': oItem.sDescription,
+                'applications': [{'name': oApp._sGetName()} for oApp in oItem.lRelatedApps]}
+
+    def _dExport(self, ddDiff):
+        """'zabbix_export' document with the missing objects"""
+        ldHosts = []
+        ldTriggers = []
+        ssGroups = set()
+        for sHostName, dDiff in sorted(ddDiff.items()):
+            ssGroups.update(dDiff['groups'])
+            ldHosts.append({'host': sHostName,
+                            'name': sHostName,
+                            'groups': [{'name': s} for s in dDiff['groups']],
+                            'applications': [{'name': s} for s in dDiff['applications']],
+                            'items': [self._dItemExport(self.ddItems[sHostName][s]) for s in dDiff['items']]})
+            for tTrigger in dDiff['triggers']:
+                sTriggerName, sExpr = tTrigger
+                sSeverity = self.ddTriggers[sHostName][tTrigger]
+                ldTriggers.append({'expression': sExpr,
+                                   'name': sTriggerName,
+                                   'priority': PRIORITIES[_enStrToSeverity(sSeverity).value]})
+        dRet = {'version': IMPORT_FORMAT_VERSION,
+                'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'groups': [{'name': s} for s in sorted(ssGroups)],
+                'hosts': ldHosts}
+        if ldTriggers:
+            dRet['triggers'] = ldTriggers
+        return {'zabbix_export': dRet}
+
+    def _Import(self, oAPI, bDryRun=False):
+        """Import the missing objects with one 'configuration.import' call, then send the
+        values waiting for new items.  bDryRun: only log the difference.  Returns the difference"""
+        if not self.dHosts:
+            return {}
+        ddDiff = self._ddDiff(oAPI)
+        for sHostName, dDiff in ddDiff.items():
+            oLog.info('Host {}: missing {} applications, {} items, {} triggers'.format(
+                sHostName, len(dDiff['applications']), len(dDiff['items']), len(dDiff['triggers'])))
+            oLog.debug('Host {}: missing {}'.format(sHostName, dDiff))
+        if bDryRun:
+            # nothing is created: the values and triggers waiting for new items are discarded
+            for oHost in self.dHosts.values():
+                oHost._DropFailedItems(oHost.loPendingItems)
+                oHost.loPendingItems = []
+            return ddDiff
+        if ddDiff:
+            for sHostName in ddDiff:
+                _InvalidateHostMeta(sHostName)
+                oAppIndex._Invalidate(oAPI, self.dHosts[sHostName].id)
+            try:
+                oAPI.do_request('configuration.import', {'format': 'json', 'rules': IMPORT_RULES,
+                                                         'source': json.dumps(self._dExport(ddDiff))})
+                for dDiff in ddDiff.values():
+                    for sKey in ('applications', 'items', 'triggers'):
+                        self.dStats[sKey] += len(dDiff[sKey])
+                self.dStats['hosts'] += len(ddDiff)
+            except ZabbixAPIException as e:
+                # the items that exist anyway get their values, the missing ones are logged
+                oLog.error('Configuration import failed, error {}'.format(e))
+        for oHost in self.dHosts.values():
+            oHost._ResolvePendingItems()
+        return ddDiff
+
+    def __repr__(self):
+        return "Import document: {0} hosts, imported {1}".format(len(self.dHosts), self.dStats)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
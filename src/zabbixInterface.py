@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 
 from logging import getLogger
-from pyzabbix.api import ZabbixAPI, ZabbixAPIException
-from pyzabbix.sender import ZabbixSender, ZabbixMetric
+from pyzabbix.api import ZabbixAPIException
+from pyzabbix.sender import ZabbixMetric
 from enum import Enum
 from uuid import uuid4
 from copy import copy   # copy of Python objects
+from local import SENDER_CHUNK_SIZE, SENDER_MAX_DELAY, DELTA_HEARTBEAT, REDIS_ENCODING, LLD_LIFETIME, NODATA_PERIOD
+from local import SENDER_ASYNC_CONNECTIONS
+from zabbixSession import ZabbixSession, _oGetSession, dSessions
+from zabbixSender import TrapperSender
+from zabbixAsync import ZabbixAsyncAPI
+from zabbixMetaCache import MetaCache
+import threading
+import asyncio
+import atexit
+import hashlib
 import re
 import json
 import time
@@ -22,6 +32,19 @@ RE_SWITCH =     re.compile(r'^Switch\s')
 RE_UPS =        re.compile(r'^UPS\s')
 RE_DIMM =       re.compile(r'^DIMM\s')
 RE_CF =         re.compile(r'^Compact Flash ')
+# fields of Zabbix 'item' object needed to build ZabbixItem instances
+ITEM_OUTPUT_FIELDS = ['itemid', 'name', 'key_', 'type', 'value_type', 'units', 'delay', 'description']
+# low-level discovery: component classes by application name. The application name is {#ID},
+# item names are '<application name> <parameter>'
+LLD_CLASSES = [(re.compile(r'^(Drive|Disk|HDD)\b', re.I),                          'disk'),
+               (re.compile(r'^(DIMM|RAM module)\b', re.I),                         'dimm'),
+               (re.compile(r'^(CPU|Processor)\b', re.I),                           'cpu'),
+               (re.compile(r'^(PCI Device|Adapter|Host Bus Adapter|HBA)\b', re.I), 'adapter'),
+               (re.compile(r'^Power supply\b', re.I),                              'psu')]
+LLD_KEY_PREFIX = 'inventory.'
+# item update interval: seconds or a number with a time suffix (Zabbix 3.4+)
+RE_DELAY = re.compile(r'^(\d+)([smhdw]?)$')
+D_DELAY_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
 
 
 # THE simplest function, can take any number of arguments
@@ -38,6 +61,15 @@ class ZabInterfaceException(Exception):
         return self.sData
 
 
+def _iParseDelay(oDelay):
+    """update interval of an item in seconds: 300, '300' and '5m' are 300.  Custom intervals after ';'
+    are ignored, user macros ('{$DELAY}') and other values that can't be resolved here are 0"""
+    oMatch = RE_DELAY.match(str(oDelay).split(';')[0].strip())
+    if oMatch is None:
+        return 0
+    return int(oMatch.group(1)) * D_DELAY_UNITS[oMatch.group(2)]
+
+
 def _sListOfStringsToJSON(lsStrings):
     """Converts list of strings to JSON data for Zabbix"""
     ID = '{#ID}'
@@ -67,6 +99,451 @@ def _sMkKey(*args):
         return sRes
 
 
+# persistent metadata caches (zabbixMetaCache.MetaCache): Zabbix URL -> cache
+dMetaCaches = {}
+# metadata of hosts loaded in advance in this run without a metadata cache: host name -> {Zabbix URL: metadata}
+ddPrefetched = {}
+
+
+def _sBaseURL(sURL):
+    """Zabbix frontend URL without the API script, the key of dMetaCaches"""
+    sURL = sURL.rstrip('/')
+    if sURL.endswith('/api_jsonrpc.php'):
+        sURL = sURL[:-len('/api_jsonrpc.php')]
+    return sURL.rstrip('/')
+
+
+def _EnableMetadataCache(oRedis, sZabbixURL):
+    """keep hosts metadata of Zabbix server sZabbixURL in Redis between runs"""
+    oCache = MetaCache(oRedis, _sBaseURL(sZabbixURL), ITEM_OUTPUT_FIELDS)
+    dMetaCaches[_sBaseURL(sZabbixURL)] = oCache
+    return oCache
+
+
+def _oMetaCache(oAPI):
+    """metadata cache of the Zabbix server of oAPI or None"""
+    if not dMetaCaches:
+        return None
+    return dMetaCaches.get(_sBaseURL(getattr(oAPI, 'url', '')))
+
+
+def _dHostMeta(oAPI, sHostName):
+    """validated cached (or prefetched) metadata of a host or None"""
+    oCache = _oMetaCache(oAPI)
+    if oCache is None:
+        return ddPrefetched.get(sHostName, {}).get(_sBaseURL(getattr(oAPI, 'url', '')))
+    return oCache._dGetHost(oAPI, sHostName)
+
+
+def _PrefetchHosts(oAPI, lsHostNames):
+    """Load metadata of many hosts at once with the asyncio API client (zabbixAsync.ZabbixAsyncAPI),
+    ZabbixHost and GeneralZabbix objects of these hosts made later in the run use it.
+    Other clients load hosts one by one, nothing is done"""
+    if not isinstance(oAPI, ZabbixAsyncAPI) or not lsHostNames:
+        return
+    oCache = _oMetaCache(oAPI)
+    try:
+        if oCache is not None:
+            oCache._Prefetch(oAPI, lsHostNames)
+        else:
+            sURL = _sBaseURL(oAPI.url)
+            for sHostName, dMeta in oAPI._ddLoadHosts(lsHostNames, ITEM_OUTPUT_FIELDS).items():
+                if dMeta is not None:
+                    ddPrefetched.setdefault(sHostName, {})[sURL] = dMeta
+    except (ZabbixAPIException, OSError) as e:
+        # the hosts will be loaded one by one
+        oLog.warning('Cannot prefetch metadata of {} hosts: {}'.format(len(lsHostNames), e))
+    return
+
+
+def _InvalidateHostMeta(sHostName):
+    """we are changing the host, its cached metadata will be outdated
+    (in all the caches: a host name can be known to several Zabbix servers)"""
+    for oCache in dMetaCaches.values():
+        oCache._Invalidate(sHostName)
+    ddPrefetched.pop(sHostName, None)
+    return
+
+
+def _sLLDKey(sClass, sID, sParam):
+    """key of a discovered item: inventory.<class>["<ID>","<parameter>"]"""
+    return '{}{}["{}","{}"]'.format(LLD_KEY_PREFIX, sClass, sID.replace('"', '\\"'), sParam.replace('"', '\\"'))
+
+
+def _sLLDRuleKey(sClass):
+    return '{}{}.discovery'.format(LLD_KEY_PREFIX, sClass)
+
+
+def _lFindHosts(oAPI, sHostName):
+    """list of Zabbix hosts named sHostName, caches answer if possible"""
+    dMeta = _dHostMeta(oAPI, sHostName)
+    if dMeta is not None:
+        return [{'hostid': str(dMeta['hostid']), 'host': sHostName}]
+    if isinstance(oAPI, (ZabbixSession, ZabbixAsyncAPI)):
+        return oAPI._lFindHosts(sHostName)
+    return oAPI.host.get(filter={'host': sHostName})
+
+
+def _ldGetHostApps(oAPI, iHostID, sHostName):
+    """list of host's applications (dictionaries with 'applicationid' and 'name' keys)"""
+    dMeta = _dHostMeta(oAPI, sHostName)
+    if dMeta is not None:
+        return dMeta['applications']
+    return oAPI.do_request('application.get', {'hostids': str(iHostID)})['result']
+
+
+def _tLoadHostItems(oAPI, iHostID, oHost):
+    """
+    Loads all the items of a host with one 'item.get' call (or from metadata cache).
+    Parameters: API object, host ID and host object (ZabbixHost or GeneralZabbix)
+    Returns: a tuple of two dictionaries: items by lowercase name and items by key
+    """
+    dByName = {}
+    dByKey = {}
+    dMeta = _dHostMeta(oAPI, oHost._sName())
+    if dMeta is not None:
+        ldItems = dMeta['items']
+    else:
+        ldItems = oAPI.do_request('item.get', {'hostids': iHostID, 'output': ITEM_OUTPUT_FIELDS})['result']
+    for dItemDict in ldItems:
+        sName = dItemDict['name'].lower()
+        oItem = ZabbixItem(sName, oHost, dItemDict)
+        dByName[sName] = oItem
+        dByKey[oItem.key] = oItem
+    oLog.debug('Loaded {} items of host ID {}'.format(len(dByName), iHostID))
+    return (dByName, dByKey)
+
+
+class DeltaFilter:
+    """
+    Change-only submission of values. A fingerprint of every sent value and the time of sending
+    are stored in Redis (a hash per host, fields are item keys).  Unchanged values are dropped,
+    but re-sent every iHeartbeat hours so that 'nodata' triggers don't fire.
+    Zabbix server answers only with numbers of processed and failed values: the values of a chunk
+    where some values failed are stored as suspects and sent one per chunk next time (bSuspect)
+    """
+    sPrefix = "ZabbixDelta."
+    SUSPECT = '?'
+
+    def __init__(self, oRedis, iHeartbeat=DELTA_HEARTBEAT):
+        self.oRedis = oRedis
+        self.iHeartbeat = int(iHeartbeat * 3600)
+        self.dStats = {'passed': 0, 'skipped': 0}
+        return
+
+    @staticmethod
+    def _sFingerprint(sValue):
+        return hashlib.sha1(sValue.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _dByHost(loMetrics):
+        dRet = {}
+        for oMetric in loMetrics:
+            dRet.setdefault(oMetric.host, []).append(oMetric)
+        return dRet
+
+    def _loFilter(self, loMetrics):
+        """returns the metrics to send: changed ones and ones not sent for a heartbeat period"""
+        loRet = []
+        try:
+            for sHost, loHostMetrics in self._dByHost(loMetrics).items():
+                lbSent = self.oRedis.hmget(self.sPrefix + sHost, [o.key for o in loHostMetrics])
+                for oMetric, bSent in zip(loHostMetrics, lbSent):
+                    if bSent:
+                        sPrint, sTime = bSent.decode(REDIS_ENCODING).split(':')
+                        oMetric.bSuspect = (sPrint == self.SUSPECT)
+                        if (sPrint == self._sFingerprint(oMetric.value) and
+                                oMetric.clock - int(sTime) < self.iHeartbeat):
+                            self.dStats['skipped'] += 1
+                            continue
+                    loRet.append(oMetric)
+        except Exception as e:
+            # without the fingerprints just send everything
+            oLog.error('Delta filter: cannot read value fingerprints, error {}'.format(e))
+            return loMetrics
+        self.dStats['passed'] += len(loRet)
+        return loRet
+
+    def _Remember(self, loMetrics, bSuspect=False):
+        """store fingerprints of successfully sent values.  bSuspect: the values were sent in a chunk
+        with failures, which of them failed is unknown"""
+        try:
+            oPipe = self.oRedis.pipeline()
+            for sHost, loHostMetrics in self._dByHost(loMetrics).items():
+                sHash = self.sPrefix + sHost
+                for oMetric in loHostMetrics:
+                    sPrint = self.SUSPECT if bSuspect else self._sFingerprint(oMetric.value)
+                    oPipe.hset(sHash, oMetric.key, '{}:{}'.format(sPrint, oMetric.clock))
+                # forget hosts that aren't updated anymore
+                oPipe.expire(sHash, 2 * self.iHeartbeat)
+            oPipe.execute()
+        except Exception as e:
+            oLog.error('Delta filter: cannot store value fingerprints, error {}'.format(e))
+        return
+
+    def __repr__(self):
+        return "Delta filter: heartbeat {0}s, stats {1}".format(self.iHeartbeat, self.dStats)
+
+
+class MetricsBuffer:
+    """
+    Run-scoped buffer of ZabbixMetric objects with the same 'send(list)' interface as ZabbixSender.
+    Metrics are sent in chunks of iChunkSize when the buffer is full, when the oldest metric
+    waits longer than iMaxDelay seconds or when Flush() is called (end of a host).
+    Thread-safe: one buffer is shared by concurrent collectors.  In asynchronous mode (_StartLoop)
+    the chunks are sent from an asyncio loop thread, up to iConnections at once: collectors don't
+    wait for Zabbix, Flush() waits for all the chunks sent so far
+    """
+    def __init__(self, sZabbixIP, iZabbixPort, iChunkSize=SENDER_CHUNK_SIZE, iMaxDelay=SENDER_MAX_DELAY,
+                 iConnections=SENDER_ASYNC_CONNECTIONS):
+        self.sZabbixIP = sZabbixIP
+        self.iZabbixPort = int(iZabbixPort)
+        self.iChunkSize = iChunkSize
+        self.iMaxDelay = iMaxDelay
+        self.oSender = TrapperSender(sZabbixIP, self.iZabbixPort, iChunkSize)
+        self.loMetrics = []
+        self.fFirstTime = 0.0
+        self.dStats = {'chunks': 0, 'processed': 0, 'failed': 0, 'lost': 0, 'suspects': 0}
+        self.oFilter = oDeltaFilter
+        self.oLock = threading.RLock()
+        self.oStatsLock = threading.Lock()
+        self.iConnections = iConnections
+        self.oLoop = None           # asyncio loop of asynchronous mode
+        self.oSemaphore = None      # created in the loop
+        self.loFutures = []         # chunks being sent asynchronously
+        if bAsyncSending:
+            self._StartLoop()
+
+    def _StartLoop(self):
+        """switch to asynchronous mode: a loop thread sending the chunks"""
+        with self.oLock:
+            if self.oLoop is None:
+                self.oLoop = asyncio.new_event_loop()
+                threading.Thread(target=self.oLoop.run_forever, name='MetricsBuffer', daemon=True).start()
+        return
+
+    def send(self, loMetrics):
+        """Put metrics to the buffer, returns True as the metrics are queued"""
+        with self.oLock:
+            iNow = int(time.time())
+            if not self.loMetrics:
+                self.fFirstTime = time.time()
+            for oMetric in loMetrics:
+                if getattr(oMetric, 'clock', None) is None:
+                    # remember the time of value, not the time of sending
+                    oMetric.clock = iNow
+                self.loMetrics.append(oMetric)
+            if (len(self.loMetrics) >= self.iChunkSize or
+                    (self.loMetrics and time.time() - self.fFirstTime > self.iMaxDelay)):
+                self._SendBuffered()
+        return True
+
+    def _SendBuffered(self):
+        """send the buffered metrics chunk by chunk (in asynchronous mode: start sending),
+        suspects of the delta filter one per chunk"""
+        with self.oLock:
+            llChunks = []
+            if self.oFilter is not None and self.loMetrics:
+                self.loMetrics = self.oFilter._loFilter(self.loMetrics)
+                llChunks = [[o] for o in self.loMetrics if getattr(o, 'bSuspect', False)]
+                self.loMetrics = [o for o in self.loMetrics if not getattr(o, 'bSuspect', False)]
+                with self.oStatsLock:
+                    self.dStats['suspects'] += len(llChunks)
+            while self.loMetrics:
+                llChunks.append(self.loMetrics[:self.iChunkSize])
+                del self.loMetrics[:self.iChunkSize]
+            for loChunk in llChunks:
+                if self.oLoop is not None:
+                    self.loFutures.append(asyncio.run_coroutine_threadsafe(self._SendChunkAsync(loChunk), self.oLoop))
+                    continue
+                try:
+                    oResp = self.oSender.send(loChunk)
+                except OSError as e:
+                    self._Lost(loChunk, e)
+                    continue
+                self._Account(loChunk, oResp)
+        return
+
+    async def _SendChunkAsync(self, loChunk):
+        if self.oSemaphore is None:
+            self.oSemaphore = asyncio.Semaphore(self.iConnections)
+        async with self.oSemaphore:
+            try:
+                oResp = await self.oSender._oSendAsync(loChunk)
+            except (OSError, asyncio.TimeoutError) as e:
+                self._Lost(loChunk, e)
+                return
+        self._Account(loChunk, oResp)
+        return
+
+    def _Lost(self, loChunk, oError):
+        oLog.error('Cannot send {} metrics to Zabbix server {}: {}'.format(len(loChunk), self.sZabbixIP, oError))
+        with self.oStatsLock:
+            self.dStats['lost'] += len(loChunk)
+        return
+
+    def _Account(self, loChunk, oResp):
+        """statistics and value fingerprints of a sent chunk"""
+        with self.oStatsLock:
+            self.dStats['chunks'] += 1
+            self.dStats['processed'] += oResp.processed
+            self.dStats['failed'] += oResp.failed
+        if self.oFilter is not None:
+            if oResp.failed == 0:
+                self.oFilter._Remember(loChunk)
+            elif oResp.processed > 0:
+                # failed values are unknown, the chunk's values are sent one by one next time
+                self.oFilter._Remember(loChunk, bSuspect=True)
+            # nothing is remembered when all the values failed, single suspects failed again stay suspects
+        if oResp.failed:
+            oLog.warning('Zabbix chunk of {}: processed {}, failed {}'.format(
+                len(loChunk), oResp.processed, oResp.failed))
+        else:
+            oLog.debug('Zabbix chunk of {}: processed {}'.format(len(loChunk), oResp.processed))
+        return
+
+    def Flush(self):
+        """Send all the buffered metrics to Zabbix, returns when they are sent"""
+        with self.oLock:
+            self._SendBuffered()
+            loFutures, self.loFutures = self.loFutures, []
+        for oFuture in loFutures:
+            oFuture.result()
+        return
+
+    def __repr__(self):
+        return ("MetricsBuffer for {0}:{1}, buffered {2}, stats {3}, sender stats {4}".format(
+            self.sZabbixIP, self.iZabbixPort, len(self.loMetrics), self.dStats, self.oSender.dStats))
+
+
+# one buffer per Zabbix server for the whole run
+dMetricsBuffers = {}
+oBuffersLock = threading.Lock()
+# change-only submission filter (DeltaFilter), None if all the values are sent
+oDeltaFilter = None
+# metrics buffers send chunks from asyncio loops (MetricsBuffer._StartLoop)
+bAsyncSending = False
+
+
+def _EnableDeltaSubmission(oRedis, iHeartbeat=DELTA_HEARTBEAT):
+    """send only changed values (and unchanged ones every iHeartbeat hours) through metrics buffers"""
+    global oDeltaFilter
+    oDeltaFilter = DeltaFilter(oRedis, iHeartbeat)
+    for oBuffer in dMetricsBuffers.values():
+        oBuffer.oFilter = oDeltaFilter
+    return oDeltaFilter
+
+
+def _EnableAsyncSending():
+    """metrics buffers send full chunks asynchronously, collectors don't wait for Zabbix"""
+    global bAsyncSending
+    bAsyncSending = True
+    for oBuffer in dMetricsBuffers.values():
+        oBuffer._StartLoop()
+    return
+
+
+def _oGetMetricsBuffer(sZabbixIP, iZabbixPort):
+    """returns the run-wide metrics buffer for a given Zabbix server"""
+    tKey = (sZabbixIP, int(iZabbixPort))
+    with oBuffersLock:
+        if tKey not in dMetricsBuffers:
+            dMetricsBuffers[tKey] = MetricsBuffer(sZabbixIP, iZabbixPort)
+        return dMetricsBuffers[tKey]
+
+
+def _FlushMetricsBuffers():
+    """send all the buffered metrics"""
+    for oBuffer in dMetricsBuffers.values():
+        oBuffer.Flush()
+    return
+
+
+# don't lose the buffered data on exit
+atexit.register(_FlushMetricsBuffers)
+
+
+def _StartRun():
+    """new poll cycle of a long-running feeder: forget run-scoped Zabbix metadata,
+    sessions and metrics buffers stay"""
+    oAppIndex._Reset()
+    for oSession in list(dSessions.values()):
+        # hosts can be deleted and created again between cycles
+        oSession.dHosts = {}
+    for oCache in dMetaCaches.values():
+        oCache._ResetRun()
+    ddPrefetched.clear()
+    return
+
+
+class ApplicationIndex:
+    """
+    Run-scoped index of hosts' applications shared by GeneralZabbix and ZabbixHost objects.
+    Applications of a host are loaded at the first lookup; names that aren't found are
+    remembered too (negative entries) until an application is created on that host
+    """
+    def __init__(self):
+        self.ddApps = {}        # (API, host ID) -> {lowercase application name: application dictionary}
+        self.dssMissing = {}    # (API, host ID) -> lowercase names known to be missing
+        self.dStats = {'loads': 0, 'hits': 0, 'negative_hits': 0, 'saved_calls': 0}
+        return
+
+    def _dHostApps(self, oAPI, iHostID, sHostName):
+        tKey = (oAPI, int(iHostID))
+        if tKey in self.ddApps:
+            self.dStats['saved_calls'] += 1
+        else:
+            self.ddApps[tKey] = {d['name'].lower(): d for d in _ldGetHostApps(oAPI, iHostID, sHostName)}
+            self.dssMissing[tKey] = set()
+            self.dStats['loads'] += 1
+        return self.ddApps[tKey]
+
+    def _ldGetApps(self, oAPI, iHostID, sHostName):
+        """list of host's applications (dictionaries with 'applicationid' and 'name' keys)"""
+        return list(self._dHostApps(oAPI, iHostID, sHostName).values())
+
+    def _dFind(self, oAPI, iHostID, sHostName, sAppName):
+        """application dictionary by name (case-insensitive) or None"""
+        sAppName = sAppName.lower()
+        dApps = self._dHostApps(oAPI, iHostID, sHostName)
+        ssMissing = self.dssMissing[(oAPI, int(iHostID))]
+        if sAppName in dApps:
+            self.dStats['hits'] += 1
+            return dApps[sAppName]
+        if sAppName in ssMissing:
+            self.dStats['negative_hits'] += 1
+        else:
+            ssMissing.add(sAppName)
+        return None
+
+    def _Add(self, oAPI, iHostID, dApp):
+        """register a new application (after 'application.create')"""
+        tKey = (oAPI, int(iHostID))
+        if tKey in self.ddApps:
+            self.ddApps[tKey][dApp['name'].lower()] = dApp
+            # other names may be created by someone else, forget all the misses of the host
+            self.dssMissing[tKey] = set()
+        return
+
+    def _Invalidate(self, oAPI, iHostID):
+        """forget the applications of a host, they'll be loaded at the next lookup"""
+        self.ddApps.pop((oAPI, int(iHostID)), None)
+        self.dssMissing.pop((oAPI, int(iHostID)), None)
+        return
+
+    def _Reset(self):
+        """start a new run"""
+        self.ddApps = {}
+        self.dssMissing = {}
+        return
+
+    def __repr__(self):
+        return "Application index: {0} hosts, stats {1}".format(len(self.ddApps), self.dStats)
+
+
+oAppIndex = ApplicationIndex()
+
+
 class GeneralZabbix:
     def __init__(self, sHostName, sZabbixIP, iZabbixPort, sZabUser, sZabPwd):
         """
@@ -78,19 +555,23 @@ class GeneralZabbix:
         self.sZabbixIP = sZabbixIP
         self.iZabbixPort = iZabbixPort
         self.dApplicationNamesToIds = {}
+        self.dTrapperKeys = {}      # (application name, parameter) -> item key
         self.sHostName = sHostName
         self.ldApplications = []
         self.dItemNames = {}
+        self.dItemKeys = {}
+        self.bItemsLoaded = False
         self.dAppIds = {}
         self.dApps = {}
         # self.sArrayName = sHostName
         self.sHostID = ''
         self.iHostID = 0
         try:
-            self.oZapi = ZabbixAPI(url=self.sZabbixURL, user=sZabUser, password=sZabPwd)
+            # all the interface objects share one session and one host IDs cache
+            self.oZapi = _oGetSession(self.sZabbixURL, sZabUser, sZabPwd)
             self.oAPI = self.oZapi
-            self.oZSend = ZabbixSender(zabbix_server=self.sZabbixIP, zabbix_port=self.iZabbixPort)
-            lsHosts = self.oZapi.host.get(filter={"host": sHostName})
+            self.oZSend = _oGetMetricsBuffer(self.sZabbixIP, self.iZabbixPort)
+            lsHosts = _lFindHosts(self.oZapi, sHostName)
             if len(lsHosts) > 0:
                 # Just use the first host
                 self.sHostID = str(lsHosts[0]['hostid'])
@@ -107,8 +588,7 @@ class GeneralZabbix:
 
     def __fillApplications__(self, reFilter=None):
         # receive the list of applications
-        ldApplications = self.oZapi.do_request('application.get', {'hostids': self.sHostID})
-        ldAppResult = ldApplications['result']
+        ldAppResult = oAppIndex._ldGetApps(self.oZapi, self.iHostID, self.sHostName)
         dBuf = {}
         if len(ldAppResult) == 0:
             # the host exists but didn't return anything, just continue
@@ -128,30 +608,46 @@ class GeneralZabbix:
                 else:
                     dBuf[sAppName] = dApp['applicationid']
             self.dApplicationNamesToIds = dBuf
+            self.__fillTrapperKeys__()
+        return
+
+    def __fillTrapperKeys__(self):
+        """
+        receive keys of all items of the filtered applications with one API call,
+        item names are '<application name> <parameter>'
+        """
+        dBuf = {}
+        if self.dApplicationNamesToIds:
+            dMeta = _dHostMeta(self.oZapi, self.sHostName)
+            if dMeta is not None:
+                ldItems = dMeta['items']
+            else:
+                dItem2Get = {'hostids': self.sHostID,
+                             'applicationids': list(self.dApplicationNamesToIds.values()),
+                             'output': ['itemid', 'name', 'key_'],
+                             'selectApplications': ['name']}
+                ldItems = self.oZapi.do_request('item.get', dItem2Get)['result']
+            for dItem in ldItems:
+                for dApp in dItem.get('applications', []):
+                    sAppName = dApp['name']
+                    if (sAppName in self.dApplicationNamesToIds and
+                            dItem['name'].startswith(sAppName + ' ')):
+                        dBuf[(sAppName, dItem['name'][len(sAppName) + 1:])] = dItem['key_']
+        self.dTrapperKeys = dBuf
+        oLog.debug('Host {}: {} trapper keys found'.format(self.sHostName, len(dBuf)))
         return
 
     def _oPrepareZabMetric(self, sAppName, sParameter, iValue):
         """Prepare ZabbixMetric instance for sending to a Zabbix server"""
-        dFilter = {'name': sAppName + ' ' + sParameter}
-        try:
-            iAppID = self.dApplicationNamesToIds[sAppName]
-            dItem2Get = {'hostids': self.sHostID,
-                         'applicationids': iAppID,
-                         'filter': dFilter,
-                         'sort': 'name'}
-            dResult = self.oZapi.do_request('item.get', dItem2Get)
-            try:
-                sKey = dResult['result'][0]['key_']
-                # now we have key, so we can prepare data to Zabbix
-                oRet = ZabbixMetric(host=self.sHostName, key=sKey, value=iValue)
-            except IndexError:
-                oLog.info("Can't receive item named '{}' from Zabbix with item.get".format(dFilter['name']))
-                oRet = None
-        except KeyError:
+        if sAppName not in self.dApplicationNamesToIds:
             oLog.info('Unknown application name "{}"'.format(sAppName))
             # oLog.info('Known apps: ' + str(self.dApplicationNamesToIds))
-            oRet = None
-        return oRet
+            return None
+        sKey = self.dTrapperKeys.get((sAppName, sParameter))
+        if sKey is None:
+            oLog.info("Can't find item named '{} {}' in Zabbix".format(sAppName, sParameter))
+            return None
+        return ZabbixMetric(host=self.sHostName, key=sKey, value=iValue)
 
     def _SendMetrics(self, loMetrics):
         """Send only non-empty metrics to Zabbix"""
@@ -171,40 +667,32 @@ class GeneralZabbix:
 
     def _bHasApplication(self, sAppName):
         sAppName = sAppName.lower()
-        ldApplications = self.oZapi.do_request('application.get', {'hostids': self.sHostID})
-        for dApp in ldApplications['result']:
-            sNewName = dApp['name'].lower()
-            sNewID = dApp['applicationid']
-            self.dAppIds[sNewName] = dApp['applicationid']
-            self.dApps[sNewID] = ZabbixApplication(sNewName, self, dApp)
-        bRet = (sAppName in self.dAppIds)
-        return bRet
+        if sAppName not in self.dAppIds:
+            dApp = oAppIndex._dFind(self.oZapi, self.iHostID, self.sHostName, sAppName)
+            if dApp is None:
+                return False
+            self.dAppIds[sAppName] = dApp['applicationid']
+            self.dApps[dApp['applicationid']] = ZabbixApplication(sAppName, self, dApp)
+        return True
+
+    def _LoadItems(self):
+        """fills the item indexes (by name and by key) with all the items of the host"""
+        self.dItemNames, self.dItemKeys = _tLoadHostItems(self.oAPI, self.iHostID, self)
+        self.bItemsLoaded = True
+        return
 
     def _bHasItem(self, sItemName):
-        bRet = False
-        sItemName = sItemName.lower()
-        if sItemName in self.dItemNames:
-            bRet = True
-        else:
-            # try to refresh dItemNames
-            dGetItem = {'hostids': self.iHostID,
-                        'search': {'name': sItemName}}
-            dItems = self.oAPI.do_request('item.get', dGetItem)
-            # oLog.debug('_bHasItem: result of item.get() is {}'.format(str(dItems)))
-            if len(dItems['result']) > 0:
-                # matching item(s) found
-                for dItemDict in dItems['result']:
-                    # dItemDict = dItems['result'][0]
-                    # oLog.debug("Item found: {}".format(str(dItemDict)))
-                    sName = dItemDict['name'].lower()
-                    dItemDict['key'] = dItemDict.get('key_')    # from the Zabbix parameter 'key_'
-                    self.dItemNames[sName] = ZabbixItem(sName, self, dItemDict)
-                bRet = True
-            else:
-                # No item found
-                bRet = False
-            # oLog.debug('_bHasItem: dItemNames after call is: ' + str(self.dItemNames))
-        return bRet
+        """checks item presence by exact name. All the host's items are loaded at first call,
+        so misses are answered from the index without API requests"""
+        if not self.bItemsLoaded:
+            self._LoadItems()
+        return sItemName.lower() in self.dItemNames
+
+    def _oGetItemByKey(self, sKey):
+        """returns item object by key or None"""
+        if not self.bItemsLoaded:
+            self._LoadItems()
+        return self.dItemKeys.get(sKey, None)
 
     def _oGetItem(self, sItemName):
         """returns item object by name"""
@@ -229,20 +717,26 @@ class GeneralZabbix:
         else:
             oApp = ZabbixApplication(sAppName, self)
             oApp._NewApp(sAppName)
-            self.dAppIds[sAppName] = oApp._iGetID
-            self.dApps[oApp._iGetID] = oApp
+            self.dAppIds[sAppName.lower()] = oApp._iGetID()
+            self.dApps[oApp._iGetID()] = oApp
         return oApp
 
     def _oAddItem(self, sItemName, sAppName='', dParams=None):
         # sItemName = sItemName.lower()
+        sKey = (dParams or {}).get('key')
         if self._bHasItem(sItemName):
             # already have that item
             oItem = self._oGetItem(sItemName)
             oLog.debug('Already have that item, returned {}'.format(str(oItem)))
+        elif sKey and self._oGetItemByKey(sKey) is not None:
+            # the item exists under another name, key is unique on the host
+            oItem = self._oGetItemByKey(sKey)
+            oLog.debug('Item with key {} already exists with name {}'.format(sKey, oItem.name))
         else:
             # need to create item
             oItem = ZabbixItem(sItemName, self, dParams)
-            self.dItemNames[sItemName] = oItem
+            self.dItemNames[sItemName.lower()] = oItem
+            self.dItemKeys[oItem.key] = oItem
             if sAppName != '':
                 oApp = self._oGetApp(sAppName)
                 oItem._LinkWithApp(oApp)
@@ -624,12 +1118,23 @@ class MyZabbixException(Exception):
 
 class ZabbixHost:
     """Zabbix object: host"""
-    def __init__(self, sName, oZabAPI):
-        """initialize empty object with a given name"""
+    def __init__(self, sName, oZabAPI, bDeferItems=False, bLLD=False):
+        """initialize empty object with a given name.
+        bDeferItems: queue missing items and create them with one API call (see _CreatePendingItems)
+        bLLD: components matching LLD_CLASSES are sent via low-level discovery (see _UseLLD)"""
         self.oAPI = oZabAPI
         self.sName = sName
+        self.bDeferItems = bDeferItems
+        self.bLLD = bLLD
+        self.ddDiscovered = {}      # LLD class -> {'ids': [], 'params': {}, 'triggers': {}}
+        self.dLLDApps = {}          # application name -> ZabbixApplication of discovered component
+        self.dLLDItems = {}         # item name -> ZabbixItem of discovered component
+        self.oImport = None         # zabbixImport.ImportDocument in bulk provisioning mode
+        self.dImportApps = {}       # application name -> ZabbixApplication waiting for import
+        self.loPendingItems = []    # items waiting for creation
+        self.lDeferredCalls = []    # calls waiting for pending items: (function, arguments)
         # try to find a host by name. This name must be unique
-        lHosts = self.oAPI.host.get(filter={'host': sName})
+        lHosts = _lFindHosts(self.oAPI, sName)
         if len(lHosts) == 1:
             # exists, unique
             self.iHostID = int(lHosts[0]['hostid'])
@@ -643,7 +1148,10 @@ class ZabbixHost:
         # get list of applications from host
         self.dAppIds = {}
         self.dApps = {}
+        # items of the host are loaded at first use with one API call
         self.dItemNames = {}
+        self.dItemKeys = {}
+        self.bItemsLoaded = False
         return
 
     def _bHasApplication(self, sAppName):
@@ -651,72 +1159,299 @@ class ZabbixHost:
         if sAppName in self.dAppIds:
             bRet = True
         else:
-            ldApplications = self.oAPI.do_request('application.get', {'hostids': str(self.iHostID)})
-            # oLog.debug("Defined applications on host {0}:\n{1}".format(self.iHostID, "\n".join(
-            #      [str(a) for a in ldApplications['result']])))
-            for dApp in ldApplications['result']:
-                sNewName = dApp['name'].lower()
-                sNewID = dApp['applicationid']
-                self.dAppIds[sNewName] = dApp['applicationid']
-                self.dApps[sNewID] = ZabbixApplication(sNewName, self, dApp)
-            bRet = (sAppName in self.dAppIds)
+            dApp = oAppIndex._dFind(self.oAPI, self.iHostID, self.sName, sAppName)
+            bRet = (dApp is not None)
+            if bRet:
+                self.dAppIds[sAppName] = dApp['applicationid']
+                self.dApps[dApp['applicationid']] = ZabbixApplication(sAppName, self, dApp)
         return bRet
 
+    def _LoadItems(self):
+        """fills the item indexes (by name and by key) with all the items of the host"""
+        self.dItemNames, self.dItemKeys = _tLoadHostItems(self.oAPI, self.iHostID, self)
+        self.bItemsLoaded = True
+        return
+
     def _bHasItem(self, sItemName):
-        bRet = False
-        sItemName = sItemName.lower()
-        if sItemName in self.dItemNames:
-            bRet = True
-        else:
-            # try to refresh dItemNames
-            dGetItem = {'hostids': self.iHostID,
-                        'search': {'name': sItemName}}
-            dItems = self.oAPI.do_request('item.get', dGetItem)
-            # oLog.debug('_bHasItem: result of item.get() is {}'.format(str(dItems)))
-            if len(dItems['result']) > 0:
-                # matching item(s) found
-                for dItemDict in dItems['result']:
-                    # dItemDict = dItems['result'][0]
-                    # oLog.debug("Item found: {}".format(str(dItemDict)))
-                    sName = dItemDict['name'].lower()
-                    dItemDict['key'] = dItemDict.get('key_')    # from the Zabbix parameter 'key_'
-                    self.dItemNames[sName] = ZabbixItem(sName, self, dItemDict)
-                bRet = True
-            else:
-                # No item found
-                bRet = False
-            # oLog.debug('_bHasItem: dItemNames after call is: ' + str(self.dItemNames))
-        return bRet
+        """checks item presence by exact name. All the host's items are loaded at first call,
+        so misses are answered from the index without API requests"""
+        if not self.bItemsLoaded:
+            self._LoadItems()
+        return sItemName.lower() in self.dItemNames
+
+    def _oGetItemByKey(self, sKey):
+        """returns item object by key or None"""
+        if not self.bItemsLoaded:
+            self._LoadItems()
+        return self.dItemKeys.get(sKey, None)
 
     def _oAddApp(self, sAppName):
         # sAppName = sAppName.lower()
-        if self._bHasApplication(sAppName):
+        sClass = self._sLLDClass(sAppName)
+        if sClass:
+            # a discovered component: no application on the server, just remember its ID
+            if sAppName not in self.dLLDApps:
+                self.dLLDApps[sAppName] = ZabbixApplication(sAppName, self)
+                self.ddDiscovered[sClass]['ids'].append(sAppName)
+            oApp = self.dLLDApps[sAppName]
+        elif self._bHasApplication(sAppName):
             # already have this app
             oApp = self._oGetApp(sAppName)
+        elif self.oImport is not None:
+            # the application will be created by the import at the end of run
+            oApp = self.dImportApps.setdefault(sAppName.lower(), ZabbixApplication(sAppName, self))
+            self.oImport._AddApplication(self.sName, sAppName)
         else:
             oApp = ZabbixApplication(sAppName, self)
             oApp._NewApp(sAppName)
-            self.dAppIds[sAppName] = oApp._iGetID
-            self.dApps[oApp._iGetID] = oApp
+            self.dAppIds[sAppName.lower()] = oApp._iGetID()
+            self.dApps[oApp._iGetID()] = oApp
         return oApp
 
+    def _UseLLD(self, bLLD=True):
+        """Switch low-level discovery mode on or off.  In LLD mode components whose application names
+        match LLD_CLASSES aren't created with the API: one discovery JSON per class is sent through
+        the trapper, values are sent to item prototypes keys (see _sLLDKey) and Zabbix server creates
+        and deletes the items.  Discovery rules and prototypes are created once per host, at that time
+        the host's static items of the class are disabled (see _DisableStaticItems), their history is kept
+        and they can be deleted by hand."""
+        self.bLLD = bLLD
+        return
+
+    def _sLLDClass(self, sAppName):
+        """LLD class of an application or None"""
+        if self.bLLD:
+            for reApp, sClass in LLD_CLASSES:
+                if reApp.match(sAppName):
+                    self.ddDiscovered.setdefault(sClass, {'ids': [], 'params': {}, 'triggers': {}})
+                    return sClass
+        return None
+
+    def _oAddLLDItem(self, sClass, sItemName, sAppName, dParams):
+        """item of a discovered component, nothing is created on the server"""
+        if sAppName not in self.dLLDApps:
+            self._oAddApp(sAppName)
+        if sItemName not in self.dLLDItems:
+            sParam = sItemName[len(sAppName):].strip()
+            dItemParams = dict(dParams or {})
+            dItemParams['key'] = _sLLDKey(sClass, sAppName, sParam)
+            oItem = ZabbixItem(sItemName, self, dItemParams)
+            oItem.bDiscovered = True
+            oItem.tLLD = (sClass, sParam)
+            self.ddDiscovered[sClass]['params'][sParam] = dItemParams
+            self.dLLDItems[sItemName] = oItem
+        return self.dLLDItems[sItemName]
+
+    def _DeclareTriggerPrototype(self, oItem, sTriggerName, sFunction, sSeverity):
+        """trigger of a discovered item becomes a trigger prototype of its class"""
+        sClass, sParam = oItem.tLLD
+        self.ddDiscovered[sClass]['triggers'][(sParam, sTriggerName)] = (sFunction, sSeverity)
+        return
+
+    def _EnsureDiscoveryRules(self):
+        """create missing discovery rules, item and trigger prototypes (onboarding only)"""
+        dRes = self.oAPI.do_request('discoveryrule.get', {
+            'hostids': self.iHostID, 'output': ['itemid', 'key_'],
+            'search': {'key_': LLD_KEY_PREFIX}, 'selectItems': ['key_'], 'selectTriggers': ['description']})
+        dRules = {d['key_']: d for d in dRes['result']}
+        lNewRules = [sClass for sClass in self.ddDiscovered if _sLLDRuleKey(sClass) not in dRules]
+        if lNewRules:
+            _InvalidateHostMeta(self.sName)
+            dRes = self.oAPI.do_request('discoveryrule.create', [
+                {'hostid': self.iHostID, 'name': 'Inventory: {} discovery'.format(sClass),
+                 'key_': _sLLDRuleKey(sClass), 'type': 2, 'lifetime': LLD_LIFETIME} for sClass in lNewRules])
+            for sClass, sRuleID in zip(lNewRules, dRes['result']['itemids']):
+                dRules[_sLLDRuleKey(sClass)] = {'itemid': sRuleID, 'items': [], 'triggers': []}
+            oLog.info('Created discovery rules {} on host {}'.format(lNewRules, self.sName))
+            self._DisableStaticItems(lNewRules)
+        ldPrototypes = []
+        ldTriggers = []
+        for sClass, dDiscovered in self.ddDiscovered.items():
+            dRule = dRules[_sLLDRuleKey(sClass)]
+            ssKeys = set(d['key_'] for d in dRule.get('items', []))
+            for sParam, dParams in dDiscovered['params'].items():
+                sKey = _sLLDKey(sClass, '{#ID}', sParam)
+                if sKey not in ssKeys:
+                    ldPrototypes.append({'hostid': self.iHostID, 'ruleid': dRule['itemid'],
+                                         'name': '{#ID} ' + sParam, 'key_': sKey, 'type': 2,
+                                         'value_type': dParams.get('value_type', 1),
+                                         'units': dParams.get('units', ''),
+                                         'description': dParams.get('description', ''),
+                                         'applicationPrototypes': [{'name': '{#ID}'}]})
+            ssTriggers = set(d['description'] for d in dRule.get('triggers', []))
+            for (sParam, sTriggerName), (sFunction, sSeverity) in dDiscovered['triggers'].items():
+                sName = '{#ID}: ' + sTriggerName
+                if sName not in ssTriggers:
+                    ldTriggers.append({'description': sName,
+                                       'expression': '{' + '{}:{}.{}'.format(
+                                           self.sName, _sLLDKey(sClass, '{#ID}', sParam), sFunction) + '}=1',
+                                       'priority': _enStrToSeverity(sSeverity).value,
+                                       'status': 0})
+        # triggers need their item prototypes, so the order matters
+        if ldPrototypes:
+            self.oAPI.do_request('itemprototype.create', ldPrototypes)
+            oLog.info('Created {} item prototypes on host {}'.format(len(ldPrototypes), self.sName))
+        if ldTriggers:
+            self.oAPI.do_request('triggerprototype.create', ldTriggers)
+            oLog.info('Created {} trigger prototypes on host {}'.format(len(ldTriggers), self.sName))
+        return
+
+    def _DisableStaticItems(self, lClasses):
+        """disable the items created without LLD for components of the given classes: they don't
+        get values anymore and their triggers would fire 'no data' alongside the prototypes' ones"""
+        lRegexps = [reApp for reApp, sClass in LLD_CLASSES if sClass in lClasses]
+        dRes = self.oAPI.do_request('item.get', {
+            'hostids': self.iHostID, 'output': ['itemid'], 'filter': {'flags': 0, 'status': 0},
+            'selectApplications': ['name']})
+        lsIDs = [d['itemid'] for d in dRes['result']
+                 if any(reApp.match(dApp['name']) for dApp in d.get('applications', []) for reApp in lRegexps)]
+        if lsIDs:
+            self.oAPI.do_request('item.update', [{'itemid': sID, 'status': 1} for sID in lsIDs])
+            oLog.warning('Disabled {} static items of classes {} moved to discovery on host {}'.format(
+                len(lsIDs), lClasses, self.sName))
+        return
+
+    def _SendDiscovery(self, oSender):
+        """send one discovery JSON per LLD class ({#ID} is the application name of a component)"""
+        if not self.ddDiscovered:
+            return
+        try:
+            self._EnsureDiscoveryRules()
+        except ZabbixAPIException as e:
+            oLog.error('Cannot create discovery rules on host {}, error {}'.format(self.sName, e))
+        loMetrics = [ZabbixMetric(host=self.sName, key=_sLLDRuleKey(sClass),
+                                  value=_sListOfStringsToJSON(dDiscovered['ids']))
+                     for sClass, dDiscovered in self.ddDiscovered.items()]
+        oSender.send(loMetrics)
+        return
+
     def _oAddItem(self, sItemName, sAppName='', dParams=None):
         # sItemName = sItemName.lower()
-        if self._bHasItem(sItemName):
+        sKey = (dParams or {}).get('key')
+        sClass = self._sLLDClass(sAppName) if sAppName else None
+        if sClass and sItemName.startswith(sAppName):
+            oItem = self._oAddLLDItem(sClass, sItemName, sAppName, dParams)
+        elif self._bHasItem(sItemName):
             # already have that item
             oItem = self._oGetItem(sItemName)
             # oLog.debug('Already have that item, returned {}'.format(str(oItem)))
+        elif sKey and self._oGetItemByKey(sKey) is not None:
+            # the item exists under another name, key is unique on the host
+            oItem = self._oGetItemByKey(sKey)
+            oLog.debug('Item with key {} already exists with name {}'.format(sKey, oItem.name))
         else:
             # need to create item
             oItem = ZabbixItem(sItemName, self, dParams)
-            self.dItemNames[sItemName] = oItem
+            self.dItemNames[sItemName.lower()] = oItem
+            self.dItemKeys[oItem.key] = oItem
             if sAppName != '':
                 oApp = self._oGetApp(sAppName)
                 oItem._LinkWithApp(oApp)
-            oItem._NewZbxItem()
+            if self.bDeferItems or self.oImport is not None:
+                oItem.bPending = True
+                self.loPendingItems.append(oItem)
+                if self.oImport is not None:
+                    self.oImport._AddItem(self.sName, oItem)
+            else:
+                oItem._NewZbxItem()
             # oLog.debug('Created a new item, returned {}'.format(str(oItem)))
         return oItem
 
+    def _DeferItemsCreation(self, bDefer=True):
+        """switch deferred items creation mode on or off"""
+        self.bDeferItems = bDefer
+        return
+
+    def _UseImport(self, oDocument):
+        """Bulk provisioning mode: missing applications, items and triggers are recorded in
+        oDocument (zabbixImport.ImportDocument) and created by its _Import() at the end of run"""
+        self.oImport = oDocument
+        oDocument._AddHost(self)
+        return
+
+    def _DeferCall(self, fFunction, *args):
+        """store a call (sending a value, making a trigger) that needs a pending item to exist"""
+        self.lDeferredCalls.append((fFunction, args))
+        return
+
+    def _CreatePendingItems(self):
+        """Creates all the queued items with one 'item.create' call, maps new item IDs back
+        to ZabbixItem objects and then runs deferred calls in their original order"""
+        if self.oImport is not None:
+            # the items will be imported at the end of run (see _ResolvePendingItems)
+            return
+        if self.loPendingItems:
+            loItems = self.loPendingItems
+            self.loPendingItems = []
+            _InvalidateHostMeta(self.sName)
+            try:
+                dRes = self.oAPI.do_request('item.create', [o._dCreateParams() for o in loItems])
+                for oItem, sItemID in zip(loItems, dRes['result']['itemids']):
+                    oItem.iID = int(sItemID)
+                    oItem.bPending = False
+                oLog.info('Created {} items on host {} with one call'.format(len(loItems), self.sName))
+            except ZabbixAPIException as e:
+                # bulk creation is all-or-nothing, find the failed item(s) one by one
+                oLog.warning('Bulk creation of items on host {} failed, error {}'.format(self.sName, e))
+                try:
+                    for oItem in loItems:
+                        try:
+                            oItem._NewZbxItem()
+                            oItem.bPending = False
+                        except MyZabbixException as e:
+                            oLog.error('Item {} is not created on host {}: {}'.format(oItem.key, self.sName, e))
+                finally:
+                    # still pending: failed or not tried because of another error
+                    self._DropFailedItems([o for o in loItems if o.bPending])
+                    self._RunDeferredCalls()
+                return
+        self._RunDeferredCalls()
+        return
+
+    def _DropFailedItems(self, loItems):
+        """forget items that weren't created (they are made again at next use) and drop
+        the deferred calls waiting for them"""
+        if not loItems:
+            return
+        setFailed = set(id(o) for o in loItems)
+        for oItem in loItems:
+            self.dItemNames.pop(oItem.name.lower(), None)
+            self.dItemKeys.pop(oItem.key, None)
+        lCalls = [(f, args) for f, args in self.lDeferredCalls
+                  if id(getattr(f, '__self__', None)) not in setFailed and
+                  not any(id(a) in setFailed for a in args)]
+        if len(lCalls) < len(self.lDeferredCalls):
+            oLog.warning('Host {}: dropped {} deferred values and triggers of {} items not created'.format(
+                self.sName, len(self.lDeferredCalls) - len(lCalls), len(loItems)))
+        self.lDeferredCalls = lCalls
+        return
+
+    def _ResolvePendingItems(self):
+        """find IDs of the items created by configuration import and run deferred calls"""
+        if self.loPendingItems:
+            loItems = self.loPendingItems
+            self.loPendingItems = []
+            dRes = self.oAPI.do_request('item.get', {'hostids': self.iHostID, 'output': ['itemid', 'key_'],
+                                                     'filter': {'key_': [o.key for o in loItems]}})
+            dIDs = {d['key_']: int(d['itemid']) for d in dRes['result']}
+            for oItem in loItems:
+                if oItem.key in dIDs:
+                    oItem.iID = dIDs[oItem.key]
+                    oItem.bPending = False
+                else:
+                    oLog.error('Item {} was not imported to host {}'.format(oItem.name, self.sName))
+            self._DropFailedItems([o for o in loItems if o.bPending])
+        self._RunDeferredCalls()
+        return
+
+    def _RunDeferredCalls(self):
+        """run the calls waiting for pending items in their original order"""
+        lCalls = self.lDeferredCalls
+        self.lDeferredCalls = []
+        for fFunction, args in lCalls:
+            fFunction(*args)
+        return
+
     def __repr__(self):
         sRet = "Host name: {}, ID: {}. Defined apps:\n".format(self.sName, self.iHostID)
         sRet += "\n".join([a.__repr__() for a in self.dApps.values() if a is not None])
@@ -749,7 +1484,7 @@ class ZabbixHost:
         if self._bHasApplication(sAppName):
             return self.dApps[self.dAppIds[sAppName]]
         else:
-            return None
+            return self.dImportApps.get(sAppName, None)
 
     def _MakeTimeStamp(self, oSender):
         """make an application and item (if there are no), send current timestamp as a TS of last update"""
@@ -764,8 +1499,14 @@ class ZabbixHost:
                 sItemName, sAppName=sTSAppName,
                 dParams={'key': "Update_Time", 'value_type': 3, 'units': 's',
                          'description': 'Date and time of last data update'})
+        # the timestamp is the last item of a host, send discovery and create queued items now
+        self._SendDiscovery(oSender)
+        self._CreatePendingItems()
         # now the application and item must exist
         oTimeStamp_Item._SendValue(int(time.time()), oSender)
+        if isinstance(oSender, MetricsBuffer):
+            # the end of a host
+            oSender.Flush()
         return
 
 
@@ -784,10 +1525,13 @@ class ZabbixApplication:
         """creates a new application on host if there are no such an application"""
         if not self.oHost._bHasApplication(sAppName):
             # create an app on the server
+            _InvalidateHostMeta(self.oHost._sName())
             dNewApp = {'hostid': str(self.oHost._iGetHostID()), 'name': sAppName}
             oRes = self.oHost.oAPI.do_request('application.create', dNewApp)
             if (oRes['result'] is not None):
                 self.iID = int(oRes['result']['applicationids'][0])
+                oAppIndex._Add(self.oHost.oAPI, self.oHost._iGetHostID(),
+                               {'applicationid': str(self.iID), 'name': sAppName})
             else:
                 raise MyZabbixException('Non-successful application creation')
         return
@@ -848,6 +1592,9 @@ class ZabbixItem:
         self.lRelatedApps = []
         self.lTriggers = []
         self.sKey = None
+        self.bPending = False   # True while waiting for deferred creation
+        self.bDiscovered = False    # item is created by Zabbix low-level discovery
+        self.tLLD = None            # (LLD class, parameter) of a discovered item
         if dDict is not None:
             self.iID = int(dDict.get('itemid', 0))
             self.sUnits = dDict.get('units', '')
@@ -857,7 +1604,7 @@ class ZabbixItem:
             # update type: see documentation.  2 is a Zabbix trapper item
             self.iUpdType = int(dDict.get('type', 2))
             self.sKey = dDict.get('key') or dDict.get('key_')    # unique key
-            self.iDelay = int(dDict.get('delay', 0))
+            self.iDelay = _iParseDelay(dDict.get('delay', 0))
             self.sDescription = dDict.get('description', '')
         else:
             # fill some fields
@@ -865,6 +1612,7 @@ class ZabbixItem:
             self.iValType = 1
             self.iUpdType = 2
             self.iDelay = 86400     # 1 day
+            self.sDescription = ''
         if self.sKey is None:
             self.sKey = str(uuid4())
         return
@@ -896,7 +1644,8 @@ class ZabbixItem:
             self.lRelatedApps.append(oApp)
         return
 
-    def _NewZbxItem(self):
+    def _dCreateParams(self):
+        """parameters of 'item.create' API call for this item"""
         lAppIDs = []
         # self.sKey = sKey
         for oApp in self.lRelatedApps:
@@ -913,6 +1662,11 @@ class ZabbixItem:
                     # optional fields
                     'description': self.sDescription
                     }
+        return dNewItem
+
+    def _NewZbxItem(self):
+        dNewItem = self._dCreateParams()
+        _InvalidateHostMeta(self.oHost._sName())
         try:
             dRes = self.oHost.oAPI.do_request('item.create', dNewItem)
         except ZabbixAPIException as e:
@@ -920,11 +1674,15 @@ class ZabbixItem:
             raise MyZabbixException('_NewZbxItem: Cannot create an item, error {}'.format(e))
         # oLog.debug("_NewZbxItem: operation result is \n{}".format(
         #     ["{}{}\n".format(str(k), str(v)) for k, v in dRes.items()]))
-        self.iID = dRes.get('itemid')
+        self.iID = int(dRes['result']['itemids'][0])
         return
 
     def _SendValue(self, oValue, oZabSender):
         # oLog.debug('Entered _SendValue, params are: {}, {}'.format(oValue, str(oZabSender)))
+        if self.bPending:
+            # the item doesn't exist on the server yet, send the value after its creation
+            self.oHost._DeferCall(self._SendValue, oValue, oZabSender)
+            return
         if self.iValType == 0:        # numeric (float)
             oValue = float(oValue)
         elif self.iValType in [1, 2, 4]:      # character
@@ -954,18 +1712,27 @@ class ZabbixItem:
 class TriggerFactory:
     """Factory of triggers. Check the presence and construct the Zabbix trigger"""
 
-    def __init__(self):
+    def __init__(self, bReconcile=False):
+        """bReconcile: components only declare triggers, missing ones are created by _Reconcile()"""
         self.ddTriggersList = {}   # Global array of triggers
         # Global array of triggers is a 2-level dictionary where 1st level keys are hostnames,
         # and 2nd level keys are items' keys.  Values are list of triggers  linked with these
         # hosts and keys
+        self.bReconcile = bReconcile
+        self.ltDeclared = []       # declared triggers: (item, new trigger parameters)
         return
 
     def _GetTriggers(self, oHost):
         """get all triggers for a given hostname and fill in the dictionary of triggers"""
-        dParams = {'host': oHost.name, 'selectItems': 1}
-        dRes = oHost.oAPI.do_request('trigger.get', dParams)
-        for dTrigger in dRes['result']:
+        dMeta = _dHostMeta(oHost.oAPI, oHost.name)
+        if dMeta is not None:
+            ldTriggers = dMeta['triggers']
+        else:
+            dParams = {'host': oHost.name, 'selectItems': 1}
+            ldTriggers = oHost.oAPI.do_request('trigger.get', dParams)['result']
+        # remember the host even if it has no triggers
+        self.ddTriggersList.setdefault(oHost.id, {})
+        for dTrigger in ldTriggers:
             # oLog.debug('Defined trigger: ' + str(dTrigger))
             ldItemsData = dTrigger.get('items', [])
             if ldItemsData:
@@ -988,11 +1755,12 @@ class TriggerFactory:
             oLog.debug('trigger exists -- from cache')
             bResult = True
         else:
-            dParams = {'hostid': oHost.id, 'itemids': [oItem.id]}
+            dParams = {'hostids': oHost.id, 'itemids': [oItem.id], 'output': ['triggerid', 'description']}
             dRes = oHost.oAPI.do_request('trigger.get', dParams)
             # oLog.debug('_bTriggerExist: Result of trigger.get: ' + str(dRes))
             for dOneRes in dRes['result']:
-                bResult = bResult or ('triggerid' in dOneRes)
+                # an item can have several triggers, check the name too
+                bResult = bResult or (dOneRes.get('description') == sTrigName)
                 # there should be not much results, so no 'continue' optimization here
             if bResult:
                 oLog.debug('Trigger found on host, adding to cache')
@@ -1022,7 +1790,18 @@ class TriggerFactory:
     def _AddChangeTrigger(self, oItem, sTriggerName='', sSeverity='warning'):
         if sTriggerName == '':
             sTriggerName = oItem.name + " Changed"
-        if not self._bTriggerExist(oItem.host, oItem, sTriggerName):
+        if oItem.bDiscovered:
+            oItem.oHost._DeclareTriggerPrototype(oItem, sTriggerName, 'diff()', sSeverity)
+        elif getattr(oItem.oHost, 'oImport', None) is not None:
+            sExpr = '{' + "{}:{}".format(oItem.host.name, oItem.key) + '.diff()}=1'
+            oItem.oHost.oImport._AddTrigger(oItem.oHost.name, sTriggerName, sExpr, sSeverity)
+        elif oItem.bPending:
+            # the item will be created later, so will be the trigger
+            oItem.oHost._DeferCall(self._AddChangeTrigger, oItem, sTriggerName, sSeverity)
+        elif self.bReconcile:
+            sExpr = '{' + "{}:{}".format(oItem.host.name, oItem.key) + '.diff()}=1'
+            self._DeclareTrigger(oItem, sTriggerName, sExpr, sSeverity)
+        elif not self._bTriggerExist(oItem.host, oItem, sTriggerName):
             sHostName = oItem.host.name
             sExpr = '{' + "{}:{}".format(sHostName, oItem.key) + '.diff()}=1'
             # oLog.debug('Expression: ' + sExpr)
@@ -1033,6 +1812,7 @@ class TriggerFactory:
                            'priority': enSeverity.value,
                            'status': 0,  # enabled
                            }
+            _InvalidateHostMeta(sHostName)
             try:
                 oItem.host.oAPI.do_request('trigger.create', dNewTrigger)
                 # oLog.debug("_AddChangeTrigger: operation result is \n{}".format(
@@ -1046,7 +1826,7 @@ class TriggerFactory:
             pass
         return
 
-    def _AddNoDataTrigger(self, oItem, sTriggerName, sSeverity='warning', iPeriod=24):
+    def _AddNoDataTrigger(self, oItem, sTriggerName, sSeverity='warning', iPeriod=NODATA_PERIOD):
         """This trigger fires when no data is received over the given time period. Parameters:
         1) Zabbix item (object of ZabbixItem class)
         2) Trigger Name
@@ -1055,8 +1835,21 @@ class TriggerFactory:
         Returns nothing, raises MyZabbixException on error
         """
         if sTriggerName == '':
-            sTriggerName = self.sName + "No data received"
-        if not self._bTriggerExist(oItem.host, oItem, sTriggerName):
+            sTriggerName = oItem.name + " No data received"
+        if oItem.bDiscovered:
+            oItem.oHost._DeclareTriggerPrototype(oItem, sTriggerName, 'nodata({})'.format(int(iPeriod * 3600)),
+                                                 sSeverity)
+        elif getattr(oItem.oHost, 'oImport', None) is not None:
+            sExpr = '{' + '{0}:{1}.nodata({2})'.format(oItem.host.name, oItem.key, int(iPeriod * 3600)) + '}=1'
+            oItem.oHost.oImport._AddTrigger(oItem.oHost.name, sTriggerName, sExpr, sSeverity)
+        elif oItem.bPending:
+            # the item will be created later, so will be the trigger
+            oItem.oHost._DeferCall(self._AddNoDataTrigger, oItem, sTriggerName, sSeverity, iPeriod)
+        elif self.bReconcile:
+            iSec = int(iPeriod * 3600)   # from hours to seconds
+            sExpr = '{' + '{0}:{1}.nodata({2})'.format(oItem.host.name, oItem.key, iSec) + '}=1'
+            self._DeclareTrigger(oItem, sTriggerName, sExpr, sSeverity)
+        elif not self._bTriggerExist(oItem.host, oItem, sTriggerName):
             iSec = int(iPeriod * 3600)   # from hours to seconds
             sExpr = '{' + '{0}:{1}.nodata({2})'.format(oItem.host.name, oItem.key, iSec) + '}=1'
             # oLog.debug("NoData trigger expression:  " + sExpr)
@@ -1070,6 +1863,7 @@ class TriggerFactory:
                            'status': 0,  # enabled
                            }
             # dRes = {}
+            _InvalidateHostMeta(oItem.host.name)
             try:
                 oItem.host.oAPI.do_request('trigger.create', dNewTrigger)
                 # oLog.debug("_AddNoDataTrigger: operation result is \n{}".format(
@@ -1082,6 +1876,88 @@ class TriggerFactory:
                 sTriggerName, oItem.host.name, oItem.id))
         return
 
+    def _DeclareTrigger(self, oItem, sTriggerName, sExpr, sSeverity):
+        """remember a trigger wanted by a component (reconciliation mode)"""
+        dNewTrigger = {'hostid': oItem.host.id,
+                       'description': sTriggerName,
+                       'expression': sExpr,
+                       'priority': _enStrToSeverity(sSeverity).value,
+                       'status': 0,  # enabled
+                       }
+        self.ltDeclared.append((oItem, dNewTrigger))
+        return
+
+    def _LoadHostsTriggers(self, loHosts):
+        """fill in the dictionary of triggers for all the given hosts, one 'trigger.get' per Zabbix server"""
+        dHostsByAPI = {}
+        for oHost in loHosts:
+            if oHost.id in self.ddTriggersList:
+                continue
+            if oHost.name in ddPrefetched:
+                # triggers of prefetched hosts are loaded already
+                self._GetTriggers(oHost)
+            else:
+                dHostsByAPI.setdefault(oHost.oAPI, {})[oHost.id] = oHost
+        for oAPI, dHosts in dHostsByAPI.items():
+            if _oMetaCache(oAPI) is not None:
+                # triggers of validated hosts are cached already
+                for oHost in dHosts.values():
+                    self._GetTriggers(oHost)
+                continue
+            dParams = {'hostids': list(dHosts.keys()),
+                       'output': ['triggerid', 'description'],
+                       'selectItems': ['itemid'],
+                       'selectHosts': ['hostid']}
+            dRes = oAPI.do_request('trigger.get', dParams)
+            for iHostID in dHosts:
+                self.ddTriggersList.setdefault(iHostID, {})
+            for dTrigger in dRes['result']:
+                for dHost in dTrigger.get('hosts', []):
+                    for dItemData in dTrigger.get('items', []):
+                        self._RegisterTriggerByIds(int(dHost['hostid']), int(dItemData['itemid']),
+                                                   dTrigger['description'])
+        return
+
+    def _Reconcile(self):
+        """
+        Reconciliation mode: compare all the declared triggers with triggers defined in Zabbix
+        and create the missing ones with one 'trigger.create' call per Zabbix server.
+        Returns the number of created triggers
+        """
+        ltDeclared = self.ltDeclared
+        self.ltDeclared = []
+        self._LoadHostsTriggers([oItem.oHost for oItem, _ in ltDeclared])
+        dMissing = {}       # Zabbix API -> {(host ID, item ID, trigger name): (item, parameters)}
+        for oItem, dNewTrigger in ltDeclared:
+            iHostID = oItem.oHost.id
+            sName = dNewTrigger['description']
+            if sName not in self.ddTriggersList.get(iHostID, {}).get(oItem.id, []):
+                dMissing.setdefault(oItem.oHost.oAPI, {})[(iHostID, oItem.id, sName)] = (oItem, dNewTrigger)
+        iCreated = 0
+        for oAPI, dTriggers in dMissing.items():
+            ltTriggers = list(dTriggers.values())
+            for oItem, _ in ltTriggers:
+                _InvalidateHostMeta(oItem.oHost.name)
+            try:
+                oAPI.do_request('trigger.create', [d for _, d in ltTriggers])
+                ltCreated = ltTriggers
+            except ZabbixAPIException as e:
+                # bulk creation is all-or-nothing, create the triggers one by one
+                oLog.warning('Bulk creation of {} triggers failed, error {}'.format(len(ltTriggers), e))
+                ltCreated = []
+                for oItem, dNewTrigger in ltTriggers:
+                    try:
+                        oAPI.do_request('trigger.create', dNewTrigger)
+                        ltCreated.append((oItem, dNewTrigger))
+                    except ZabbixAPIException as e:
+                        oLog.error('Cannot create trigger {} on host {}, error {}'.format(
+                            dNewTrigger['description'], oItem.oHost.name, e))
+            for oItem, dNewTrigger in ltCreated:
+                self._RegisterTriggerByIds(oItem.oHost.id, oItem.id, dNewTrigger['description'])
+            iCreated += len(ltCreated)
+        oLog.info('Triggers reconciliation: {} declared, {} created'.format(len(ltDeclared), iCreated))
+        return iCreated
+
 # --
 
 if __name__ == "__main__":
@@ -1091,6 +1967,9 @@ if __name__ == "__main__":
     # oConHdr.setLevel(logging.DEBUG)
     # oLog.addHandler(oConHdr)
     # testing
+    for oDelay, iExpected in ((0, 0), ('300', 300), ('30s', 30), ('1m', 60), ('1h;50s/1-7,00:00-24:00', 3600),
+                              ('{$DELAY}', 0), ('', 0)):
+        assert _iParseDelay(oDelay) == iExpected, (oDelay, _iParseDelay(oDelay))
     pass
 
 # vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client-side limiter of Zabbix API requests: a token bucket (requests per second) and
+an AIMD window of requests in flight.  The window grows by one request per window
+of good answers and is halved when the average latency or error rate is too high,
+so concurrent feeders adapt to the frontend load instead of timing out.
+One limiter per Zabbix API URL, limits are set in local.ZABBIX_API_LIMITS.
+"""
+
+from logging import getLogger
+from local import ZABBIX_API_LIMITS
+import threading
+import asyncio
+import time
+
+oLog = getLogger(__name__)
+
+EWMA_WEIGHT = 0.2       # weight of a new sample in the average latency and error rate
+MAX_WAIT_STEP = 0.05    # async waiters check the limiter at least this often (sec)
+
+
+class AdaptiveLimiter:
+    """Token bucket and AIMD concurrency window, thread-safe"""
+    def __init__(self, sName, rate=50.0, burst=100, min_window=1, max_window=16,
+                 target_latency=2.0, max_error_rate=0.1):
+        self.sName = sName
+        self.fRate = float(rate)
+        self.iBurst = int(burst)
+        self.iMinWindow = int(min_window)
+        self.iMaxWindow = int(max_window)
+        self.fTargetLatency = float(target_latency)
+        self.fMaxErrorRate = float(max_error_rate)
+        self.fTokens = float(burst)
+        self.fRefillTime = time.monotonic()
+        self.fWindow = float(max(min_window, min(4, max_window)))
+        self.iInFlight = 0
+        self.fLatency = 0.0         # moving average of latency
+        self.fErrorRate = 0.0       # moving average of errors
+        self.fDecreaseTime = 0.0
+        self.oCond = threading.Condition()
+        self.dStats = {'requests': 0, 'throttled': 0, 'wait_sec': 0.0, 'errors': 0,
+                       'decreases': 0, 'min_window': self.fWindow}
+        return
+
+    def _fTryAcquire(self):
+        """take a token and a window slot: returns 0.0, or the time to wait (sec) before the next try"""
+        fNow = time.monotonic()
+        self.fTokens = min(self.iBurst, self.fTokens + (fNow - self.fRefillTime) * self.fRate)
+        self.fRefillTime = fNow
+        if self.iInFlight >= int(self.fWindow):
+            # wait for a release (or a timeout, to refill tokens)
+            return 1.0
+        if self.fTokens < 1.0:
+            return (1.0 - self.fTokens) / self.fRate
+        self.fTokens -= 1.0
+        self.iInFlight += 1
+        self.dStats['requests'] += 1
+        return 0.0
+
+    def _Waited(self, fStart):
+        if fStart is not None:
+            self.dStats['throttled'] += 1
+            self.dStats['wait_sec'] += time.monotonic() - fStart
+        return
+
+    def _fAcquire(self):
+        """block until a request may be sent, returns the start time for _Release()"""
+        fStart = None
+        with self.oCond:
+            fWait = self._fTryAcquire()
+            while fWait > 0:
+                fStart = fStart or time.monotonic()
+                self.oCond.wait(fWait)
+                fWait = self._fTryAcquire()
+            self._Waited(fStart)
+        return time.monotonic()
+
+    async def _fAcquireAsync(self):
+        """coroutine version of _fAcquire(), doesn't block the event loop"""
+        fStart = None
+        while True:
+            with self.oCond:
+                fWait = self._fTryAcquire()
+                if fWait == 0:
+                    self._Waited(fStart)
+                    return time.monotonic()
+            fStart = fStart or time.monotonic()
+            await asyncio.sleep(min(fWait, MAX_WAIT_STEP))
+
+    def _Release(self, fStartTime, bError=False):
+        """a request is finished: adapt the window to its latency and result"""
+        fNow = time.monotonic()
+        with self.oCond:
+            self.iInFlight -= 1
+            self.fLatency += EWMA_WEIGHT * (fNow - fStartTime - self.fLatency)
+            self.fErrorRate += EWMA_WEIGHT * ((1.0 if bError else 0.0) - self.fErrorRate)
+            if bError:
+                self.dStats['errors'] += 1
+            if self.fLatency > self.fTargetLatency or self.fErrorRate > self.fMaxErrorRate:
+                # multiplicative decrease, at most once per target latency period
+                if fNow - self.fDecreaseTime > self.fTargetLatency and self.fWindow > self.iMinWindow:
+                    self.fWindow = max(self.iMinWindow, self.fWindow / 2)
+                    self.fDecreaseTime = fNow
+                    self.dStats['decreases'] += 1
+                    self.dStats['min_window'] = min(self.dStats['min_window'], self.fWindow)
+                    oLog.info('Zabbix API {}: latency {:.2f}s, error rate {:.2f}, window is reduced to {}'.format(
+                        self.sName, self.fLatency, self.fErrorRate, int(self.fWindow)))
+            else:
+                # additive increase: one request per window of good answers
+                self.fWindow = min(self.iMaxWindow, self.fWindow + 1.0 / self.fWindow)
+            self.oCond.notify()
+        return
+
+    def __repr__(self):
+        return "Zabbix API limiter {0}: window {1}, latency {2:.3f}s, error rate {3:.2f}, stats {4}".format(
+            self.sName, int(self.fWindow), self.fLatency, self.fErrorRate, self.dStats)
+
+
+# Zabbix API URL -> limiter
+dLimiters = {}
+oLimitersLock = threading.Lock()
+
+
+def _oGetLimiter(sURL):
+    """the limiter of a Zabbix API URL, limits are taken from ZABBIX_API_LIMITS by URL or 'default'"""
+    sURL = sURL.rstrip('/')
+    with oLimitersLock:
+        if sURL not in dLimiters:
+            dLimits = ZABBIX_API_LIMITS.get(sURL, ZABBIX_API_LIMITS['default'])
+            dLimiters[sURL] = AdaptiveLimiter(sURL, **dLimits)
+        return dLimiters[sURL]
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
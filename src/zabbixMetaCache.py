@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of Zabbix host metadata in Redis: host ID, applications, items
+and triggers of each host.  A cached host is validated once per run with two light requests
+(numbers of host's items, applications and triggers; the newest item ID); the full reload
+is done only when these numbers differ from the cached ones.  Our own changes of a host
+(new applications, items or triggers) remove the host from the cache.  Objects renamed by
+hand don't change the numbers: they are seen after the cache TTL (META_CACHE_TTL).
+With the asyncio API client the hosts of a run are validated and reloaded all at once (_Prefetch).
+"""
+
+from logging import getLogger
+from local import REDIS_ENCODING, META_CACHE_TTL
+import json
+
+oLog = getLogger(__name__)
+
+META_PREFIX = "ZabbixMeta."
+
+
+class MetaCache:
+    """Redis-backed cache of hosts metadata for one Zabbix server"""
+    def __init__(self, oRedis, sZabbixURL, lItemFields, iTTL=META_CACHE_TTL):
+        """Parameters: Redis connection, Zabbix URL (a part of cache keys),
+        list of item fields to load (see zabbixInterface.ITEM_OUTPUT_FIELDS), cache TTL"""
+        self.oRedis = oRedis
+        self.sPrefix = META_PREFIX + sZabbixURL.rstrip('/') + '.'
+        self.lItemFields = lItemFields
+        self.iTTL = iTTL
+        self.ddRun = {}         # host name -> metadata validated in this run
+        self.dStats = {'valid': 0, 'reloaded': 0, 'invalidated': 0}
+        return
+
+    def _sKey(self, sHostName):
+        return self.sPrefix + sHostName
+
+    def _dLoad(self, sHostName):
+        """host metadata from Redis or None"""
+        bData = self.oRedis.get(self._sKey(sHostName))
+        if bData:
+            try:
+                return json.loads(bData.decode(REDIS_ENCODING))
+            except ValueError:
+                oLog.info('Invalid metadata of host {} in Redis'.format(sHostName))
+        return None
+
+    @staticmethod
+    def _lRevision(ldItems, iApps, iTriggers):
+        """revision of a host: number of items, the newest item ID, numbers of applications and triggers"""
+        return [len(ldItems), max([int(d['itemid']) for d in ldItems], default=0), int(iApps), int(iTriggers)]
+
+    @staticmethod
+    def _ltCheckRequests(iHostID):
+        """light requests (method, parameters) validating cached metadata of a host:
+        numbers of items, applications and triggers (they can be changed outside of the feeders too)
+        and the newest item"""
+        return [('host.get', {'hostids': iHostID, 'output': ['hostid'], 'selectItems': 'count',
+                              'selectApplications': 'count', 'selectTriggers': 'count'}),
+                ('item.get', {'hostids': iHostID, 'output': ['itemid'],
+                              'sortfield': 'itemid', 'sortorder': 'DESC', 'limit': 1})]
+
+    @staticmethod
+    def _lCheckRevision(lResults):
+        """revision of a host (see _lRevision) from the results of _ltCheckRequests, None if the host is gone"""
+        ldHosts, ldNewest = lResults
+        if not ldHosts:
+            return None
+        dHost = ldHosts[0]
+        return [int(dHost['items']), max([int(d['itemid']) for d in ldNewest], default=0),
+                int(dHost['applications']), int(dHost['triggers'])]
+
+    def _dStore(self, dMeta):
+        """store all the metadata of a host (keys 'host', 'hostid', 'applications', 'items', 'triggers')
+        received from Zabbix to Redis, it is valid in this run"""
+        dMeta['revision'] = self._lRevision(dMeta['items'], len(dMeta['applications']), len(dMeta['triggers']))
+        self.oRedis.set(self._sKey(dMeta['host']), json.dumps(dMeta), ex=self.iTTL)
+        self.ddRun[dMeta['host']] = dMeta
+        self.dStats['reloaded'] += 1
+        oLog.debug('Metadata of host {} reloaded from Zabbix'.format(dMeta['host']))
+        return dMeta
+
+    def _dReload(self, oAPI, sHostName, iHostID):
+        """receive all the metadata of a host from Zabbix and store it to Redis"""
+        ldItems = oAPI.do_request('item.get', {'hostids': iHostID, 'output': self.lItemFields,
+                                               'selectApplications': ['applicationid', 'name']})['result']
+        ldApps = oAPI.do_request('application.get', {'hostids': iHostID,
+                                                     'output': ['applicationid', 'name']})['result']
+        ldTriggers = oAPI.do_request('trigger.get', {'hostids': iHostID,
+                                                     'output': ['triggerid', 'description'],
+                                                     'selectItems': ['itemid']})['result']
+        return self._dStore({'host': sHostName,
+                             'hostid': iHostID,
+                             'applications': ldApps,
+                             'items': ldItems,
+                             'triggers': ldTriggers})
+
+    def _dGetHost(self, oAPI, sHostName):
+        """Validated metadata of a host, a dictionary with keys 'hostid', 'applications',
+        'items', 'triggers'.  Returns None if the host isn't found or isn't unique"""
+        if sHostName in self.ddRun:
+            return self.ddRun[sHostName]
+        dMeta = self._dLoad(sHostName)
+        if dMeta is not None:
+            lRevision = self._lCheckRevision([oAPI.do_request(sMethod, dParams)['result']
+                                              for sMethod, dParams in self._ltCheckRequests(dMeta['hostid'])])
+            if lRevision == dMeta['revision']:
+                self.dStats['valid'] += 1
+            elif lRevision is None:
+                # the host is gone, it may be re-created with another ID
+                dMeta = None
+            else:
+                dMeta = self._dReload(oAPI, sHostName, dMeta['hostid'])
+        if dMeta is None:
+            lHosts = oAPI.host.get(filter={'host': sHostName})
+            if len(lHosts) != 1:
+                return None
+            dMeta = self._dReload(oAPI, sHostName, int(lHosts[0]['hostid']))
+        self.ddRun[sHostName] = dMeta
+        return dMeta
+
+    def _Prefetch(self, oAPI, lsHostNames):
+        """Validate cached metadata of many hosts with concurrent requests and reload the outdated
+        and unknown hosts at once.  oAPI is zabbixAsync.ZabbixAsyncAPI; hosts that failed here
+        are validated one by one by _dGetHost"""
+        ltCached = []
+        lsLoad = []
+        for sHostName in lsHostNames:
+            if sHostName in self.ddRun:
+                continue
+            dMeta = self._dLoad(sHostName)
+            if dMeta is None:
+                lsLoad.append(sHostName)
+            else:
+                ltCached.append((sHostName, dMeta, self._ltCheckRequests(dMeta['hostid'])))
+        lAnswers = oAPI._ldRequestMany([tRequest for _, _, ltRequests in ltCached for tRequest in ltRequests])
+        for sHostName, dMeta, ltRequests in ltCached:
+            lHostAnswers, lAnswers = lAnswers[:len(ltRequests)], lAnswers[len(ltRequests):]
+            if any(isinstance(oAnswer, Exception) for oAnswer in lHostAnswers):
+                continue
+            if self._lCheckRevision([dAnswer['result'] for dAnswer in lHostAnswers]) == dMeta['revision']:
+                self.ddRun[sHostName] = dMeta
+                self.dStats['valid'] += 1
+            else:
+                lsLoad.append(sHostName)
+        if lsLoad:
+            for dMeta in oAPI._ddLoadHosts(lsLoad, self.lItemFields).values():
+                if dMeta is not None:
+                    self._dStore(dMeta)
+        return
+
+    def _Invalidate(self, sHostName):
+        """Forget the cached metadata of a host, it will be reloaded in the next run.
+        Metadata of the current run stays: the objects changing a host track their changes"""
+        if self.oRedis.delete(self._sKey(sHostName)):
+            self.dStats['invalidated'] += 1
+        return
+
+    def _ResetRun(self):
+        """start a new run: validate hosts again"""
+        self.ddRun = {}
+        return
+
+    def __repr__(self):
+        return "Zabbix metadata cache {0}*, hosts in run: {1}, stats {2}".format(
+            self.sPrefix, len(self.ddRun), self.dStats)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Zabbix trapper ('sender data') protocol client.  ZBXD packets, zlib-compressed when
+the data is large enough (Zabbix 4.0+), one TCP connection reused between chunks while
+the server keeps it open, and the server answer (processed/failed/total) parsed per chunk.
+TrapperSender.send() has the interface of pyzabbix ZabbixSender.send(),
+TrapperSender._oSendAsync() is the same for asyncio code (one event loop per sender).
+"""
+
+from logging import getLogger
+from local import SENDER_CHUNK_SIZE, SENDER_COMPRESSION, SENDER_COMPRESS_MIN, SENDER_TIMEOUT
+import asyncio
+import select
+import socket
+import struct
+import json
+import time
+import zlib
+import re
+
+oLog = getLogger(__name__)
+
+ZBXD_MAGIC = b'ZBXD'
+FLAG_ZBXD = 0x01
+FLAG_COMPRESSED = 0x02
+# magic, flags, data length, reserved (uncompressed length of compressed data)
+ZBXD_HEADER = struct.Struct('<4sBII')
+ZBXD_MAX_SIZE = 128 * 1024 * 1024
+RE_INFO = re.compile(r'[Pp]rocessed:? (\d+);? [Ff]ailed:? (\d+);? [Tt]otal:? (\d+)')
+
+
+class ZabbixSenderException(OSError):
+    """protocol error or non-successful answer of Zabbix server"""
+    pass
+
+
+class SenderResponse:
+    """Summary of Zabbix server answers, the same properties as pyzabbix ZabbixResponse"""
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.total = 0
+        self.chunk = 0
+        self.ltChunks = []      # (processed, failed, total) of every chunk
+        return
+
+    def _Add(self, dAnswer):
+        """add an answer of the server to one chunk"""
+        if dAnswer.get('response') != 'success':
+            raise ZabbixSenderException('Zabbix server answer: {}'.format(dAnswer))
+        oMatch = RE_INFO.search(dAnswer.get('info', ''))
+        if oMatch is None:
+            raise ZabbixSenderException('Cannot parse Zabbix server answer: {}'.format(dAnswer))
+        tChunk = tuple(int(s) for s in oMatch.groups())
+        self.ltChunks.append(tChunk)
+        self.processed += tChunk[0]
+        self.failed += tChunk[1]
+        self.total += tChunk[2]
+        self.chunk += 1
+        return
+
+    def __repr__(self):
+        return "processed: {}, failed: {}, total: {}, chunks: {}".format(
+            self.processed, self.failed, self.total, self.chunk)
+
+
+def _bMakePacket(loMetrics, bCompress=SENDER_COMPRESSION, iCompressMin=SENDER_COMPRESS_MIN):
+    """ZBXD packet of 'sender data' request with ZabbixMetric-like objects"""
+    ldData = []
+    for oMetric in loMetrics:
+        dData = {'host': oMetric.host, 'key': oMetric.key, 'value': str(oMetric.value)}
+        iClock = getattr(oMetric, 'clock', None)
+        if iClock is not None:
+            dData['clock'] = int(iClock)
+        ldData.append(dData)
+    bData = json.dumps({'request': 'sender data', 'data': ldData, 'clock': int(time.time())},
+                       ensure_ascii=False).encode('utf-8')
+    if bCompress and len(bData) >= iCompressMin:
+        bBody = zlib.compress(bData)
+        return ZBXD_HEADER.pack(ZBXD_MAGIC, FLAG_ZBXD | FLAG_COMPRESSED, len(bBody), len(bData)) + bBody
+    return ZBXD_HEADER.pack(ZBXD_MAGIC, FLAG_ZBXD, len(bData), 0) + bData
+
+
+def _tParseHeader(bHeader):
+    """(flags, data length, uncompressed length) of a ZBXD header"""
+    if len(bHeader) < ZBXD_HEADER.size:
+        raise ConnectionResetError('Connection closed by Zabbix server')
+    bMagic, iFlags, iLen, iRawLen = ZBXD_HEADER.unpack(bHeader)
+    if bMagic != ZBXD_MAGIC or not (iFlags & FLAG_ZBXD) or iLen > ZBXD_MAX_SIZE:
+        raise ZabbixSenderException('Invalid ZBXD header: {}'.format(bHeader))
+    return (iFlags, iLen, iRawLen)
+
+
+def _dParseBody(iFlags, bBody):
+    if iFlags & FLAG_COMPRESSED:
+        bBody = zlib.decompress(bBody)
+    try:
+        return json.loads(bBody.decode('utf-8'))
+    except ValueError as e:
+        raise ZabbixSenderException('Invalid answer of Zabbix server: {}'.format(e))
+
+
+class TrapperSender:
+    """Sender of values to Zabbix trapper items, one persistent connection"""
+    def __init__(self, sServer='127.0.0.1', iPort=10051, iChunkSize=SENDER_CHUNK_SIZE,
+                 bCompress=SENDER_COMPRESSION, iTimeout=SENDER_TIMEOUT):
+        self.sServer = sServer
+        self.iPort = int(iPort)
+        self.iChunkSize = iChunkSize
+        self.bCompress = bCompress
+        self.iTimeout = iTimeout
+        self.oSock = None
+        self.ltIdle = []            # idle connections of _oSendAsync: (reader, writer)
+        self.dStats = {'connections': 0, 'bytes': 0, 'raw_bytes': 0}
+        return
+
+    def _Connect(self):
+        self.oSock = socket.create_connection((self.sServer, self.iPort), self.iTimeout)
+        self.dStats['connections'] += 1
+        return
+
+    def _Close(self):
+        if self.oSock is not None:
+            self.oSock.close()
+            self.oSock = None
+        return
+
+    def _bIsOpen(self):
+        """the connection can be reused: the server didn't close it after the last answer"""
+        if self.oSock is None:
+            return False
+        lReady, _, _ = select.select([self.oSock], [], [], 0)
+        if lReady:
+            # nothing is expected from the server, so readable means closed (or garbage)
+            self._Close()
+            return False
+        return True
+
+    def _bRecvExactly(self, iLen):
+        lParts = []
+        while iLen > 0:
+            bPart = self.oSock.recv(min(iLen, 65536))
+            if not bPart:
+                break
+            lParts.append(bPart)
+            iLen -= len(bPart)
+        return b''.join(lParts)
+
+    def _dExchange(self, bPacket):
+        """send one packet, returns the answer dictionary"""
+        bReused = self._bIsOpen()
+        if not bReused:
+            self._Connect()
+        try:
+            self.oSock.sendall(bPacket)
+            bHeader = self._bRecvExactly(ZBXD_HEADER.size)
+            if not bHeader and bReused:
+                # the server closed an idle connection without reading the data: send again
+                raise ConnectionResetError('Idle connection closed')
+        except (ConnectionError, socket.timeout) as e:
+            self._Close()
+            if not bReused:
+                raise
+            oLog.debug('Connection to Zabbix server {} is closed ({}), reconnecting'.format(self.sServer, e))
+            self._Connect()
+            self.oSock.sendall(bPacket)
+            bHeader = self._bRecvExactly(ZBXD_HEADER.size)
+        try:
+            iFlags, iLen, _ = _tParseHeader(bHeader)
+            bBody = self._bRecvExactly(iLen)
+            if len(bBody) < iLen:
+                raise ConnectionResetError('Connection closed by Zabbix server')
+        except OSError:
+            self._Close()
+            raise
+        return _dParseBody(iFlags, bBody)
+
+    def _lbPackets(self, loMetrics):
+        lbRet = []
+        for iStart in range(0, len(loMetrics), self.iChunkSize):
+            bPacket = _bMakePacket(loMetrics[iStart:iStart + self.iChunkSize], self.bCompress)
+            self.dStats['bytes'] += len(bPacket)
+            self.dStats['raw_bytes'] += ZBXD_HEADER.size + max(ZBXD_HEADER.unpack(bPacket[:ZBXD_HEADER.size])[2:])
+            lbRet.append(bPacket)
+        return lbRet
+
+    def send(self, loMetrics):
+        """send ZabbixMetric objects chunk by chunk, returns SenderResponse.
+        Raises OSError (ZabbixSenderException on non-successful answer)"""
+        oResp = SenderResponse()
+        for bPacket in self._lbPackets(loMetrics):
+            oResp._Add(self._dExchange(bPacket))
+        return oResp
+
+    async def _tConnectAsync(self):
+        tConn = await asyncio.wait_for(asyncio.open_connection(self.sServer, self.iPort), self.iTimeout)
+        self.dStats['connections'] += 1
+        return tConn
+
+    @staticmethod
+    async def _dExchangeAsync(tConn, bPacket):
+        """send one packet over a connection, returns the answer dictionary"""
+        oReader, oWriter = tConn
+        oWriter.write(bPacket)
+        await oWriter.drain()
+        try:
+            bHeader = await oReader.readexactly(ZBXD_HEADER.size)
+            iFlags, iLen, _ = _tParseHeader(bHeader)
+            bBody = await oReader.readexactly(iLen)
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError('Connection closed by Zabbix server')
+        return _dParseBody(iFlags, bBody)
+
+    async def _oSendAsync(self, loMetrics):
+        """coroutine version of send().  Connections kept open by the server are reused between
+        chunks and calls, concurrent calls use their own connections"""
+        oResp = SenderResponse()
+        for bPacket in self._lbPackets(loMetrics):
+            while self.ltIdle and self.ltIdle[-1][0].at_eof():
+                self.ltIdle.pop()[1].close()
+            bReused = bool(self.ltIdle)
+            tConn = self.ltIdle.pop() if bReused else await self._tConnectAsync()
+            try:
+                try:
+                    dAnswer = await asyncio.wait_for(self._dExchangeAsync(tConn, bPacket), self.iTimeout)
+                except ConnectionError as e:
+                    tConn[1].close()
+                    if not bReused:
+                        raise
+                    # the server closed an idle connection without reading the data: send again
+                    oLog.debug('Connection to Zabbix server {} is closed ({}), reconnecting'.format(self.sServer, e))
+                    tConn = await self._tConnectAsync()
+                    dAnswer = await asyncio.wait_for(self._dExchangeAsync(tConn, bPacket), self.iTimeout)
+            except BaseException:
+                tConn[1].close()
+                raise
+            self.ltIdle.append(tConn)
+            oResp._Add(dAnswer)
+        return oResp
+
+    def __repr__(self):
+        return "Zabbix trapper sender {0}:{1}, compression {2}, stats {3}".format(
+            self.sServer, self.iPort, self.bCompress, self.dStats)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide registry of authenticated Zabbix API sessions.
+One session per (Zabbix URL, user): one login, one HTTP keep-alive connection
+and a cache of host IDs shared by all interface objects. Sessions are logged out at exit.
+"""
+
+from logging import getLogger
+from pyzabbix.api import ZabbixAPI, ZabbixAPIException
+from urllib.parse import urlsplit
+from local import ZABBIX_API_TIMEOUT
+from zabbixAsync import ZabbixAsyncAPI, _bSessionExpired
+from zabbixLimiter import _oGetLimiter
+import http.client
+import threading
+import atexit
+import json
+
+oLog = getLogger(__name__)
+
+
+class ZabbixSession(ZabbixAPI):
+    """ZabbixAPI that keeps its HTTP connections open between requests and caches host IDs.
+    Requests pass through the adaptive limiter of the Zabbix URL (zabbixLimiter): threads sharing
+    a session send up to the limiter's window of requests at once, each over its own keep-alive
+    connection from a pool"""
+    def __init__(self, sURL, sUser, sPassword, iTimeout=ZABBIX_API_TIMEOUT):
+        # these attributes are needed for login in ZabbixAPI.__init__
+        oURL = urlsplit(sURL.rstrip('/') + '/api_jsonrpc.php')
+        self.bHTTPS = (oURL.scheme == 'https')
+        self.sNetLoc = oURL.netloc
+        self.sPath = oURL.path
+        self.iTimeout = iTimeout
+        self.loIdle = []    # idle keep-alive connections
+        self.iRequestID = 0
+        self.oLock = threading.RLock()     # request IDs and the pool, not held during requests
+        self.dHosts = {}    # host name -> list of host dictionaries from 'host.get'
+        self.sUser = sUser
+        self.sPassword = sPassword
+        self.oLimiter = _oGetLimiter(sURL)
+        super().__init__(url=sURL.rstrip('/'), user=sUser, password=sPassword)
+        return
+
+    def _oConnect(self):
+        if self.bHTTPS:
+            return http.client.HTTPSConnection(self.sNetLoc, timeout=self.iTimeout)
+        return http.client.HTTPConnection(self.sNetLoc, timeout=self.iTimeout)
+
+    def _Close(self):
+        """close the idle connections"""
+        with self.oLock:
+            loIdle = self.loIdle
+            self.loIdle = []
+        for oConn in loIdle:
+            oConn.close()
+        return
+
+    def _bPost(self, bData):
+        """POST the data over a pooled keep-alive connection, returns the response body"""
+        dHeaders = {'Content-Type': 'application/json-rpc',
+                    'Connection': 'keep-alive'}
+        if self.use_basic_auth:
+            dHeaders['Authorization'] = "Basic {}".format(self.base64_cred)
+        with self.oLock:
+            oConn = self.loIdle.pop() if self.loIdle else None
+        bReused = oConn is not None
+        if not bReused:
+            oConn = self._oConnect()
+        try:
+            try:
+                oConn.request('POST', self.sPath, body=bData, headers=dHeaders)
+                oResp = oConn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest):
+                if not bReused:
+                    raise
+                # the server closed an idle connection, open a new one and try again
+                oLog.debug('Zabbix API connection to {} is closed, reconnecting'.format(self.sNetLoc))
+                oConn.close()
+                oConn = self._oConnect()
+                oConn.request('POST', self.sPath, body=bData, headers=dHeaders)
+                oResp = oConn.getresponse()
+            bRet = oResp.read()
+        except BaseException:
+            oConn.close()
+            raise
+        if oResp.status != 200:
+            oConn.close()
+            raise ZabbixAPIException('HTTP error {} {} from {}'.format(oResp.status, oResp.reason, self.sNetLoc))
+        if oResp.will_close:
+            oConn.close()
+        else:
+            with self.oLock:
+                self.loIdle.append(oConn)
+        return bRet
+
+    def do_request(self, method, params=None):
+        """Make request to Zabbix API, the same interface as ZabbixAPI.do_request.
+        A session expired on the server (long-running daemon) is logged in again"""
+        try:
+            return self._dRequest(method, params)
+        except ZabbixAPIException as e:
+            if method in ('user.login', 'user.logout') or not _bSessionExpired(e):
+                raise
+        oLog.info('Zabbix API session of {} is expired, logging in again'.format(self.sUser))
+        self._login(self.sUser, self.sPassword)
+        return self._dRequest(method, params)
+
+    def _dRequest(self, method, params):
+        with self.oLock:
+            self.iRequestID += 1
+            dRequest = {'jsonrpc': '2.0',
+                        'method': method,
+                        'params': params or {},
+                        'id': self.iRequestID}
+            if self.auth and (method not in ('apiinfo.version', 'user.login')):
+                dRequest['auth'] = self.auth
+        # outside of the lock: the limiter decides how many requests are in flight
+        fStart = self.oLimiter._fAcquire()
+        bError = True
+        try:
+            bResp = self._bPost(json.dumps(dRequest).encode('utf-8'))
+            bError = False
+        finally:
+            self.oLimiter._Release(fStart, bError)
+        try:
+            dRes = json.loads(bResp.decode('utf-8'))
+        except ValueError as e:
+            raise ZabbixAPIException("Unable to parse json: {}".format(e))
+        if 'error' in dRes:
+            dErr = dRes['error'].copy()
+            dErr.update({'json': str(dRequest)})
+            raise ZabbixAPIException(dErr)
+        return dRes
+
+    def _lFindHosts(self, sHostName):
+        """returns a list of hosts named sHostName, known hosts are cached"""
+        if sHostName not in self.dHosts:
+            lHosts = self.host.get(filter={'host': sHostName})
+            if not lHosts:
+                # don't remember unknown hosts, they can be created later
+                return lHosts
+            self.dHosts[sHostName] = lHosts
+        return self.dHosts[sHostName]
+
+    def _Logout(self):
+        """log out from Zabbix and close the connections"""
+        try:
+            self._logout()
+        except (ZabbixAPIException, OSError) as e:
+            oLog.info('Zabbix logout error: {}'.format(e))
+        self._Close()
+        return
+
+
+# (URL, user) -> session
+dSessions = {}
+oSessionsLock = threading.Lock()
+
+
+def _oGetSession(sURL, sUser, sPassword, bAsync=False):
+    """returns the (only) session for Zabbix at sURL with a given user, logging in on first use.
+    bAsync: a new session uses asyncio client with a pool of connections (zabbixAsync.ZabbixAsyncAPI)"""
+    tKey = (sURL.rstrip('/'), sUser)
+    with oSessionsLock:
+        if tKey not in dSessions:
+            if bAsync:
+                dSessions[tKey] = ZabbixAsyncAPI(sURL, sUser, sPassword)
+            else:
+                dSessions[tKey] = ZabbixSession(sURL, sUser, sPassword)
+            oLog.debug('New Zabbix API session: {} as {}'.format(tKey[0], sUser))
+        return dSessions[tKey]
+
+
+def _LogoutAll():
+    """log out of all the sessions"""
+    with oSessionsLock:
+        for oSession in dSessions.values():
+            oSession._Logout()
+        dSessions.clear()
+    return
+
+
+atexit.register(_LogoutAll)
+
+# vim: expandtab : softtabstop=4 : tabstop=4 : shiftwidth=4